@@ -0,0 +1,294 @@
+"""Per-service alert rules evaluated on every metrics sample.
+
+Rules come from the `alerts` list of each service in services.yaml:
+
+    alerts:
+      - name: cpu-spin
+        metric: cpu_percent
+        above: 95
+        clear: 80          # hysteresis: stays active until back under 80
+        for: 120           # seconds the condition must hold before firing
+      - name: memory-leak
+        metric: memory_mb
+        type: rate         # MB per minute, smoothed over `window` seconds
+        above: 2
+        window: 900
+        for: 1800
+      - name: cpu-anomaly
+        metric: cpu_percent
+        type: zscore       # deviations from an EWMA baseline
+        above: 4
+        window: 3600
+
+Every rule keeps a constant amount of state (last value, EWMA mean and
+variance), so a sample costs O(1) per rule regardless of window length.
+"""
+
+import math
+from collections import deque
+from datetime import datetime
+from typing import Deque, Dict, Iterable, List, Optional, Tuple
+
+from .config import logger, load_config_cached, get_all_services
+from .metricstore import METRIC_FIELDS
+from .broadcast import ALERTS_BROADCAST
+
+SEVERITIES = ("warning", "critical")
+DEFAULT_WINDOWS = {"threshold": 0, "rate": 300, "zscore": 3600}
+DEFAULT_ZSCORE = 3.0
+DEFAULT_MIN_STD = 1.0
+RECENT_EVENTS = 200
+
+
+def _iso(epoch: int) -> str:
+    return datetime.fromtimestamp(epoch).isoformat()
+
+
+class AlertRule:
+    """State machine ok -> pending -> firing -> ok over one signal per sample.
+
+    The signal is the raw value for threshold rules; subclasses derive it
+    from running state. A pending rule drops back to ok as soon as the
+    trigger condition stops holding; a firing rule only returns to ok once
+    the signal crosses `clear`, which defaults to the trigger bound.
+    """
+
+    type = "threshold"
+
+    def __init__(self, service: str, spec: Dict):
+        self.service = service
+        self.spec = spec
+        self.metric = spec["metric"]
+        if self.metric not in METRIC_FIELDS:
+            raise ValueError(f"unknown metric {self.metric!r}")
+        self.name = str(spec.get("name") or f"{self.metric}-{self.type}")
+        self.severity = spec.get("severity", "warning")
+        if self.severity not in SEVERITIES:
+            raise ValueError(f"unknown severity {self.severity!r}")
+        self.for_seconds = float(spec.get("for") or 0)
+        self.window = float(spec.get("window") or DEFAULT_WINDOWS[self.type])
+        above, below = spec.get("above"), spec.get("below")
+        if above is None and below is None:
+            if self.type != "zscore":
+                raise ValueError("one of 'above' or 'below' is required")
+            above = DEFAULT_ZSCORE
+        if above is not None and below is not None:
+            raise ValueError("'above' and 'below' are mutually exclusive")
+        self.upward = above is not None
+        self.bound = float(above if self.upward else below)
+        clear = float(spec["clear"]) if spec.get("clear") is not None else self.bound
+        # A clear level on the wrong side of the bound would never resolve
+        self.clear = min(clear, self.bound) if self.upward else max(clear, self.bound)
+        self.state = "ok"
+        self.since: Optional[int] = None
+        self.signal_value: Optional[float] = None
+        self.started: Optional[int] = None
+
+    @property
+    def key(self) -> str:
+        return f"{self.service}/{self.name}"
+
+    def signal(self, epoch: int, value: float) -> Optional[float]:
+        return value
+
+    def reset(self):
+        self.state = "ok"
+        self.since = None
+        self.signal_value = None
+        self.started = None
+
+    def _warm(self, epoch: int) -> bool:
+        if self.started is None:
+            self.started = epoch
+        return epoch - self.started >= self.window
+
+    def _triggered(self, signal: float) -> bool:
+        return signal > self.bound if self.upward else signal < self.bound
+
+    def _cleared(self, signal: float) -> bool:
+        return signal <= self.clear if self.upward else signal >= self.clear
+
+    def evaluate(self, epoch: int, value: float) -> Optional[str]:
+        """Feed one sample; returns "firing" or "resolved" on a transition."""
+        signal = self.signal(epoch, value)
+        if signal is None:
+            return None
+        self.signal_value = signal
+        if self.state == "firing":
+            if self._cleared(signal):
+                self.state, self.since = "ok", None
+                return "resolved"
+            return None
+        if not self._triggered(signal):
+            # The `for` timer needs the trigger condition itself to hold
+            self.state, self.since = "ok", None
+            return None
+        if self.state == "ok":
+            self.state, self.since = "pending", epoch
+        if epoch - self.since >= self.for_seconds:
+            self.state = "firing"
+            return "firing"
+        return None
+
+    def as_dict(self) -> Dict:
+        return {
+            "service": self.service,
+            "rule": self.name,
+            "metric": self.metric,
+            "type": self.type,
+            "severity": self.severity,
+            "state": self.state,
+            "value": round(self.signal_value, 3) if self.signal_value is not None else None,
+            "above" if self.upward else "below": self.bound,
+            "clear": self.clear,
+            "since": _iso(self.since) if self.since is not None else None,
+        }
+
+
+class RateRule(AlertRule):
+    """Change per minute, smoothed with an EWMA over `window` seconds."""
+
+    type = "rate"
+
+    def __init__(self, service: str, spec: Dict):
+        super().__init__(service, spec)
+        self.reset()
+
+    def reset(self):
+        super().reset()
+        self._last: Optional[Tuple[int, float]] = None
+        self._rate = 0.0
+
+    def signal(self, epoch: int, value: float) -> Optional[float]:
+        last, self._last = self._last, (epoch, value)
+        if last is None or epoch <= last[0]:
+            self._warm(epoch)
+            return None
+        dt = epoch - last[0]
+        alpha = 1 - math.exp(-dt / self.window) if self.window > 0 else 1.0
+        self._rate += alpha * ((value - last[1]) * 60 / dt - self._rate)
+        return self._rate if self._warm(epoch) else None
+
+
+class ZScoreRule(AlertRule):
+    """Distance from an EWMA mean in EWMA standard deviations."""
+
+    type = "zscore"
+
+    def __init__(self, service: str, spec: Dict):
+        super().__init__(service, spec)
+        self.min_std = float(spec.get("min_std") or DEFAULT_MIN_STD)
+        self.reset()
+
+    def reset(self):
+        super().reset()
+        self._last_epoch: Optional[int] = None
+        self._mean: Optional[float] = None
+        self._var = 0.0
+
+    def signal(self, epoch: int, value: float) -> Optional[float]:
+        if self._mean is None:
+            self._mean, self._last_epoch = value, epoch
+            self._warm(epoch)
+            return None
+        dt = epoch - self._last_epoch
+        if dt <= 0:
+            return None
+        self._last_epoch = epoch
+        diff = value - self._mean
+        # Score against the baseline before this sample moves it
+        z = diff / max(math.sqrt(self._var), self.min_std)
+        alpha = 1 - math.exp(-dt / self.window) if self.window > 0 else 1.0
+        increment = alpha * diff
+        self._mean += increment
+        self._var = (1 - alpha) * (self._var + diff * increment)
+        return z if self._warm(epoch) else None
+
+
+_RULE_CLASSES = {cls.type: cls for cls in (AlertRule, RateRule, ZScoreRule)}
+
+
+def build_rule(service: str, spec: Dict) -> AlertRule:
+    """Raises ValueError for an invalid rule spec."""
+    if not isinstance(spec, dict) or not spec.get("metric"):
+        raise ValueError("a rule needs a 'metric'")
+    rule_type = spec.get("type", "threshold")
+    cls = _RULE_CLASSES.get(rule_type)
+    if cls is None:
+        raise ValueError(f"unknown rule type {rule_type!r}")
+    try:
+        return cls(service, spec)
+    except (TypeError, KeyError) as e:
+        raise ValueError(str(e))
+
+
+class AlertEngine:
+    """Rules of every service, rebuilt when services.yaml changes."""
+
+    def __init__(self):
+        self.rules: Dict[str, List[AlertRule]] = {}
+        self.recent: Deque[Dict] = deque(maxlen=RECENT_EVENTS)
+        self._config: Optional[dict] = None
+
+    def _sync_rules(self):
+        config = load_config_cached()
+        if config is self._config:
+            return
+        self._config = config
+        previous = {rule.key: rule for rules in self.rules.values() for rule in rules}
+        rules: Dict[str, List[AlertRule]] = {}
+        for svc in get_all_services(config):
+            name = svc.get("name")
+            if not name:
+                continue
+            for spec in svc.get("alerts") or []:
+                try:
+                    rule = build_rule(name, spec)
+                except ValueError as e:
+                    logger.warning(f"Ignoring alert rule of {name}: {e}")
+                    continue
+                old = previous.get(rule.key)
+                # Unchanged rules keep their baselines and pending/firing state
+                rules.setdefault(name, []).append(old if old is not None and old.spec == spec else rule)
+        self.rules = rules
+
+    def evaluate(self, epoch: int, samples: Dict[str, Dict[str, float]], running: Iterable[str]) -> List[Dict]:
+        """Feed one sampler tick; returns the firing/resolved events it caused.
+
+        Rules of services that are not running are reset: a stopped service is
+        reported by its health, and its zeroed samples must not skew baselines.
+        """
+        self._sync_rules()
+        running = set(running)
+        events = []
+        for service, rules in self.rules.items():
+            values = samples.get(service)
+            for rule in rules:
+                if values is None or service not in running:
+                    if rule.state == "firing":
+                        # Report the last reading, not the blank reset state
+                        events.append({**rule.as_dict(), "state": "ok", "event": "resolved", "at": _iso(epoch)})
+                    rule.reset()
+                    continue
+                transition = rule.evaluate(epoch, values.get(rule.metric, 0.0))
+                if transition:
+                    events.append({**rule.as_dict(), "event": transition, "at": _iso(epoch)})
+        for event in events:
+            self.recent.append(event)
+            if event["event"] == "firing":
+                logger.warning(f"Alert {event['service']}/{event['rule']} firing: "
+                               f"{event['metric']} {event['type']} = {event['value']}")
+            else:
+                logger.info(f"Alert {event['service']}/{event['rule']} resolved")
+        if events:
+            ALERTS_BROADCAST.publish(events)
+        return events
+
+    def active(self) -> List[Dict]:
+        """Pending and firing alerts, firing first."""
+        items = [rule.as_dict() for rules in self.rules.values() for rule in rules if rule.state != "ok"]
+        items.sort(key=lambda item: (item["state"] != "firing", item["severity"] != "critical", item["service"]))
+        return items
+
+
+ALERT_ENGINE = AlertEngine()
@@ -4,7 +4,9 @@ from pathlib import Path
 from typing import Dict, List, Optional
 
 import asyncio
+import hmac
 import json
+import math
 import sys
 import uuid
 
@@ -21,14 +23,14 @@ if "--config" in sys.argv:
 
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Query, Depends, UploadFile, File, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, StreamingResponse
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 
 from .config import (
     RUN_DIR, LOGS_DIR, logger,
-    load_config, save_config, get_all_services,
-    METRICS_HISTORY, MAX_METRICS_HISTORY_POINTS,
-    UPDATE_TASKS, update_run_dir, CONFIG_FILE
+    load_config, load_config_cached, save_config, get_all_services,
+    METRICS_HISTORY, MAX_METRICS_HISTORY_POINTS, METRICS_INTERVAL_SECONDS, DASHBOARD_REFRESH_SECONDS,
+    UPDATE_TASKS, update_run_dir, CONFIG_FILE, METRICS_TOKEN
 )
 from .auth import (
     init_auth_db, authenticate_user, create_access_token, decode_token,
@@ -47,13 +49,30 @@ from .models import (
     BackupInfo,
 )
 from .services import (
-    get_service_status, get_system_metrics, get_disk_partitions,
-    get_service_info, build_process_tree, get_system_info,
+    get_disk_partitions, get_service_info, get_process_tree_payload, get_system_info,
 )
+from .snapshot import DASHBOARD_SNAPSHOT
+from .query import query_services, split_csv, MAX_PAGE_SIZE
+from .hub import SUBSCRIPTIONS, HUB_QUEUE_SIZE, offer
 from .logs import (
     get_log_chain, read_chained_log_lines, rotate_log_if_needed,
 )
-from .tasks import metrics_sampler, system_metrics_persist_loop, log_maintenance, load_system_metrics_history
+from .tasks import (
+    metrics_sampler, system_metrics_persist_loop, log_maintenance,
+    dashboard_producer, system_metrics_sampler, restore_metrics_history, metrics_archive_compactor,
+    save_metrics_rollups,
+    SAMPLER_STATS,
+)
+from .heartbeat import heartbeat_prober, HEARTBEAT_POOL
+from .inotify import LOGS_WATCHER
+from .registry import PID_REGISTRY
+from .logtail import LOG_TAILER
+from .metricsarchive import METRICS_ARCHIVE
+from .broadcast import METRICS_BROADCAST
+from .alerts import ALERT_ENGINE
+from .exposition import CONTENT_TYPE as OPENMETRICS_CONTENT_TYPE, LOOP_MONITOR, RequestStatsMiddleware, render_openmetrics
+from .metricstore import METRIC_FIELDS, align_series, rank_services, sum_series
+from .systemstore import SYSTEM_METRICS_STORE
 from .scheduled import _parse_cron, _calc_next_restart
 from .audit import append_audit_log, read_audit_logs
 from .update import list_backups, rollback_to_backup, perform_update
@@ -64,10 +83,25 @@ from .config import build_dependency_graph, get_reverse_dependents
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     init_auth_db()
+    PID_REGISTRY.start()
+    LOG_TAILER.start()
+    LOGS_WATCHER.start()
+    asyncio.create_task(system_metrics_sampler())
+    asyncio.create_task(heartbeat_prober())
+    asyncio.create_task(dashboard_producer())
     asyncio.create_task(metrics_sampler())
+    asyncio.create_task(restore_metrics_history())
+    asyncio.create_task(metrics_archive_compactor())
+    asyncio.create_task(LOOP_MONITOR.run())
     asyncio.create_task(system_metrics_persist_loop())
     asyncio.create_task(log_maintenance())
     yield
+    HEARTBEAT_POOL.close()
+    LOGS_WATCHER.stop()
+    LOG_TAILER.stop()
+    PID_REGISTRY.stop()
+    await save_metrics_rollups()
+    METRICS_ARCHIVE.close()
 
 
 app = FastAPI(
@@ -86,6 +120,7 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(RequestStatsMiddleware)
 
 
 @app.post("/api/login", response_model=LoginResponse)
@@ -227,9 +262,31 @@ async def delete_user(user_id: int, current_user: dict = Depends(get_current_use
 
 
 @app.get("/api/services")
-async def list_services(current_user: dict = Depends(get_current_user)):
-    services = get_all_services()
-    return {"services": services}
+async def list_services(
+    health: Optional[str] = Query(None, description="Comma-separated health values"),
+    name: Optional[str] = Query(None, description="Name prefix, or glob with * ? ["),
+    depends_on: Optional[str] = Query(None, description="Only services depending on this one"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None),
+    current_user: dict = Depends(get_current_user),
+):
+    services = get_all_services(load_config_cached())
+    if not any((health, name, depends_on, fields, limit, cursor)):
+        return {"services": services}
+    health_of = None
+    if health:
+        snapshot = await DASHBOARD_SNAPSHOT.get()
+        healths = {svc.name: svc.health for svc in snapshot.services}
+        health_of = lambda svc: healths.get(svc.get("name"))
+    try:
+        page, total, next_cursor = query_services(
+            services, health=health, health_of=health_of, name=name,
+            depends_on=depends_on, fields=fields, limit=limit, cursor=cursor,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"services": page, "total": total, "next_cursor": next_cursor}
 
 
 @app.get("/api/services/graph")
@@ -308,99 +365,132 @@ async def set_scheduled_restart(req: ScheduledRestartRequest, current_user: dict
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.get("/api/status", response_model=PlatformStatus)
-async def get_status(current_user: dict = Depends(get_current_user)) -> PlatformStatus:
-    try:
-        config = load_config()
-        services_status = []
-        for service_cfg in config.get("services", []):
-            service_name = service_cfg.get("name", "unknown")
-            pidfile = LOGS_DIR / f"{service_name}.pid"
-            logfile = LOGS_DIR / f"{service_name}.log"
-            heartbeat = service_cfg.get("heartbeat")
-            services_status.append(
-                get_service_status(
-                    service_name,
-                    pidfile,
-                    logfile,
-                    heartbeat,
-                    scheduled_restart_cfg=service_cfg.get("scheduled_restart"),
-                    depends_on=service_cfg.get("depends_on", []),
-                )
-            )
+def _weak_etag_match(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison (RFC 9110 8.8.3.2) of an If-None-Match list against `etag`."""
+    if not if_none_match:
+        return False
+    opaque = etag.removeprefix("W/")
+    return any(tag == "*" or tag.removeprefix("W/") == opaque
+               for tag in (tag.strip() for tag in if_none_match.split(",")))
+
+
+async def _snapshot_response(request: Request, kind: str, since: Optional[int], timeout: float) -> Response:
+    """Serve the shared snapshot with a weak ETag, 304 when unchanged, optional long-poll.
+
+    `since` is a content version (X-Content-Version of an earlier response);
+    the request blocks until the content moves past it or `timeout` passes.
+    """
+    await DASHBOARD_SNAPSHOT.get()
+    if since is not None:
+        await DASHBOARD_SNAPSHOT.wait_for_content_change(kind, since, timeout)
+    etag = DASHBOARD_SNAPSHOT.etags[kind]
+    headers = {
+        "ETag": etag,
+        "X-Content-Version": str(DASHBOARD_SNAPSHOT.content_versions[kind]),
+        "Cache-Control": "no-cache",
+    }
+    if _weak_etag_match(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    body = DASHBOARD_SNAPSHOT.status_json if kind == "dashboard" else DASHBOARD_SNAPSHOT.platform_json()
+    return Response(content=body, media_type="application/json", headers=headers)
 
-        if any(s.health == "abnormal" for s in services_status):
-            overall_status = "abnormal"
-        elif any(s.health == "running" for s in services_status):
-            overall_status = "running"
-        else:
-            overall_status = "stopped"
 
-        return PlatformStatus(
-            status=overall_status,
-            services=services_status,
-            timestamp=datetime.now().isoformat()
+@app.get("/api/status", response_model=PlatformStatus)
+async def get_status(
+    request: Request,
+    since: Optional[int] = Query(None, ge=0),
+    timeout: float = Query(25.0, ge=1, le=60),
+    health: Optional[str] = Query(None, description="Comma-separated health values"),
+    name: Optional[str] = Query(None, description="Name prefix, or glob with * ? ["),
+    depends_on: Optional[str] = Query(None, description="Only services depending on this one"),
+    fields: Optional[str] = Query(None, description="Comma-separated service fields to return"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None),
+    current_user: dict = Depends(get_current_user),
+):
+    """Status of all services.
+
+    Without query filters the full snapshot is served with ETag/long-poll
+    support. With health/name/depends_on/fields/limit/cursor the matching
+    services are returned, projected and paged, with `total` and `next_cursor`.
+    """
+    try:
+        if not any((health, name, depends_on, fields, limit, cursor)):
+            return await _snapshot_response(request, "status", since, timeout)
+        await DASHBOARD_SNAPSHOT.get()
+        dump = DASHBOARD_SNAPSHOT.dump
+        page, total, next_cursor = query_services(
+            dump["services"], health=health, name=name, depends_on=depends_on,
+            fields=fields, limit=limit, cursor=cursor,
         )
+        return JSONResponse({
+            "status": dump["status"],
+            "services": page,
+            "timestamp": dump["timestamp"],
+            "version": dump["version"],
+            "total": total,
+            "next_cursor": next_cursor,
+        })
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error getting status: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
-async def build_dashboard_status() -> DashboardStatus:
-    config = load_config()
-    services_status = []
-    for service_cfg in config.get("services", []):
-        service_name = service_cfg.get("name", "unknown")
-        pidfile = LOGS_DIR / f"{service_name}.pid"
-        logfile = LOGS_DIR / f"{service_name}.log"
-        heartbeat = service_cfg.get("heartbeat")
-        services_status.append(
-            get_service_status(
-                service_name,
-                pidfile,
-                logfile,
-                heartbeat,
-                scheduled_restart_cfg=service_cfg.get("scheduled_restart"),
-                depends_on=service_cfg.get("depends_on", []),
-            )
-        )
-    metrics = get_system_metrics()
-
-    if any(s.health == "abnormal" for s in services_status):
-        overall_status = "abnormal"
-    elif any(s.health == "running" for s in services_status):
-        overall_status = "running"
-    else:
-        overall_status = "stopped"
-
-    return DashboardStatus(
-        status=overall_status,
-        services=services_status,
-        metrics=metrics,
-        timestamp=datetime.now().isoformat()
-    )
-
-
 @app.get("/api/dashboard", response_model=DashboardStatus)
-async def get_dashboard_status(current_user: dict = Depends(get_current_user)) -> DashboardStatus:
-    return await build_dashboard_status()
+async def get_dashboard_status(
+    request: Request,
+    since: Optional[int] = Query(None, ge=0),
+    timeout: float = Query(25.0, ge=1, le=60),
+    current_user: dict = Depends(get_current_user),
+):
+    return await _snapshot_response(request, "dashboard", since, timeout)
 
 
 @app.get("/api/dashboard/sse")
-async def dashboard_sse(request: Request, token: Optional[str] = Query(None)):
+async def dashboard_sse(
+    request: Request,
+    token: Optional[str] = Query(None),
+    mode: str = Query("full", pattern="^(full|delta)$"),
+    keyframe_seconds: int = Query(30, ge=2, le=3600),
+):
+    """Stream dashboard snapshots.
+
+    mode=full sends every snapshot in full. mode=delta sends a keyframe on
+    connect and every `keyframe_seconds`, and in between only what changed,
+    tagged with `seq`/`prev` so clients can detect gaps and reconnect.
+    """
     get_user_from_request(request, token)
+    loop = asyncio.get_running_loop()
 
     async def event_generator():
+        try:
+            await DASHBOARD_SNAPSHOT.get()
+        except Exception as e:
+            logger.error(f"SSE dashboard error: {e}")
+            return
+        sent_version = 0
+        last_keyframe_at = 0.0
         while True:
             if await request.is_disconnected():
                 break
-            try:
-                status = await build_dashboard_status()
-                yield f"data: {status.model_dump_json()}\n\n"
-            except Exception as e:
-                logger.error(f"SSE dashboard error: {e}")
-                break
-            await asyncio.sleep(2)
+            version = DASHBOARD_SNAPSHOT.version
+            if version > sent_version:
+                if mode == "full":
+                    payload = DASHBOARD_SNAPSHOT.status_json
+                else:
+                    payload = None
+                    now = loop.time()
+                    # A skipped version cannot be bridged by a single delta, so resend a keyframe.
+                    if version == sent_version + 1 and now - last_keyframe_at < keyframe_seconds:
+                        payload = DASHBOARD_SNAPSHOT.delta_message()
+                    if payload is None:
+                        payload = DASHBOARD_SNAPSHOT.keyframe_message()
+                        last_keyframe_at = now
+                sent_version = version
+                yield f"data: {payload}\n\n"
+            await DASHBOARD_SNAPSHOT.wait_for_update(sent_version, timeout=DASHBOARD_REFRESH_SECONDS * 5)
     return StreamingResponse(event_generator(), media_type="text/event-stream")
 
 
@@ -494,6 +584,7 @@ async def control_service(control: ServiceControl, current_user: dict = Depends(
         try:
             logger.info(f"Control action: {control.action} service={control.service} user={current_user['username']}")
             result = await _run_service_command(control.action, control.service)
+            DASHBOARD_SNAPSHOT.request_refresh()
             append_audit_log(user=current_user["username"], role=current_user.get("role", "admin"), action=control.action, target=control.service or "all")
             return result
         except HTTPException:
@@ -534,6 +625,7 @@ async def batch_control_services(batch: BatchServiceControl, current_user: dict
                 return {"service": service_name, "status": "failed", "message": str(e)}
 
     results = await asyncio.gather(*[_control_one(s) for s in batch.services])
+    DASHBOARD_SNAPSHOT.request_refresh()
     succeeded = sum(1 for r in results if r.get("status") == "success")
     skipped = sum(1 for r in results if r.get("status") == "skipped")
     failed = sum(1 for r in results if r.get("status") == "failed")
@@ -783,6 +875,15 @@ async def get_log_level_counts(
     return {"service": service, "counts": counts}
 
 
+def _parse_history_epoch(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace('Z', '')).timestamp()
+    except Exception:
+        return None
+
+
 @app.get("/api/metrics/history")
 async def get_metrics_history(
     service: str = Query(...),
@@ -793,47 +894,113 @@ async def get_metrics_history(
     current_user: dict = Depends(get_current_user)
 ) -> Dict:
     try:
-        history = list(METRICS_HISTORY.get(service, []))
-        def _parse_iso_timestamp(value: Optional[str]) -> Optional[datetime]:
-            if not value:
-                return None
-            try:
-                safe = value.replace('Z', '')
-                return datetime.fromisoformat(safe)
-            except Exception:
-                return None
-        start_dt = _parse_iso_timestamp(start)
-        end_dt = _parse_iso_timestamp(end)
-        if start_dt or end_dt:
-            filtered = []
-            for point in history:
-                ts = _parse_iso_timestamp(point.get("timestamp"))
-                if not ts:
-                    continue
-                if start_dt and ts < start_dt:
-                    continue
-                if end_dt and ts > end_dt:
-                    continue
-                filtered.append(point)
-            history = filtered
-        if step_seconds and step_seconds > 0:
-            buckets: Dict[int, Dict] = {}
-            for point in history:
-                ts = _parse_iso_timestamp(point.get("timestamp"))
-                if not ts:
-                    continue
-                bucket = int(ts.timestamp() // step_seconds)
-                buckets[bucket] = point
-            history = [buckets[key] for key in sorted(buckets.keys())]
-        if limit and len(history) > limit:
-            history = history[-limit:]
-        return {"service": service, "interval_seconds": 10, "points": history, "count": len(history)}
+        store = METRICS_HISTORY.get(service)
+        start_epoch = _parse_history_epoch(start)
+        end_epoch = _parse_history_epoch(end)
+        # The store bisects its epoch columns and answers from the coarsest rollup
+        # tier that satisfies step_seconds; dicts are built only for the result.
+        if store is None:
+            return {"service": service, "interval_seconds": METRICS_INTERVAL_SECONDS, "tier": "raw", "points": [], "count": 0}
+        if step_seconds <= 0 and not store.covers(start_epoch):
+            # Raw points older than the in-memory window come from the on-disk archive
+            history = await asyncio.to_thread(METRICS_ARCHIVE.points, service, start_epoch, end_epoch, limit)
+            if history:
+                return {"service": service, "interval_seconds": METRICS_INTERVAL_SECONDS, "tier": "archive", "points": history, "count": len(history)}
+        history, interval, tier = store.query(start_epoch, end_epoch, step_seconds, limit)
+        return {"service": service, "interval_seconds": interval, "tier": tier, "points": history, "count": len(history)}
     except Exception as e:
         logger.error(f"Failed to get metrics history: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
-_RANGE_SECONDS = {"1h": 3600, "6h": 6*3600, "24h": 24*3600, "7d": 7*24*3600, "30d": 30*24*3600}
+@app.get("/api/metrics/history/batch")
+async def get_metrics_history_batch(
+    services: str = Query("all"),
+    start: Optional[str] = Query(None),
+    end: Optional[str] = Query(None),
+    step_seconds: int = Query(0, ge=0),
+    fields: Optional[str] = Query(None),
+    aggregate: Optional[str] = Query(None),
+    top: int = Query(0, ge=0),
+    top_by: str = Query("cpu_percent"),
+    current_user: dict = Depends(get_current_user)
+) -> Dict:
+    """Aligned history of many services on one time grid.
+
+    - services: comma-separated names, or "all"
+    - start/end: ISO timestamps (default: the last hour)
+    - step_seconds: bucket width; default keeps the grid under MAX_METRICS_HISTORY_POINTS
+    - fields: metrics to return (default all)
+    - aggregate: fields to also sum across the returned services
+    - top/top_by: keep only the N services with the highest mean of `top_by`
+    """
+    known = [svc.get("name") for svc in get_all_services(load_config_cached()) if svc.get("name")]
+    names = known if services.strip() == "all" else split_csv(services)
+    unknown = [name for name in names if name not in METRICS_HISTORY]
+    names = [name for name in names if name in METRICS_HISTORY]
+    keep = split_csv(fields) or list(METRIC_FIELDS)
+    summed = split_csv(aggregate)
+    bad = [f for f in keep + summed + [top_by] if f not in METRIC_FIELDS]
+    if bad:
+        raise HTTPException(status_code=400, detail=f"Unknown metric field(s): {', '.join(bad)}")
+
+    end_epoch = int(_parse_history_epoch(end) or datetime.now().timestamp())
+    start_epoch = int(_parse_history_epoch(start) or end_epoch - 3600)
+    if start_epoch > end_epoch:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    span = end_epoch - start_epoch
+    if step_seconds <= 0:
+        step_seconds = max(1, math.ceil(span / MAX_METRICS_HISTORY_POINTS / METRICS_INTERVAL_SECONDS)) * METRICS_INTERVAL_SECONDS
+    if span // step_seconds + 1 > MAX_METRICS_HISTORY_POINTS:
+        raise HTTPException(status_code=400, detail=f"Range/step would exceed {MAX_METRICS_HISTORY_POINTS} buckets")
+
+    # Top-N ranking needs `top_by` even when the caller did not ask for it
+    columns = keep + [f for f in summed + ([top_by] if top else []) if f not in keep]
+    # Hundreds of services x buckets is too much work for the event loop. A sample
+    # appended meanwhile can at worst be missing from the newest bucket.
+    grid, series = await asyncio.to_thread(
+        align_series, {name: METRICS_HISTORY[name] for name in names},
+        start_epoch, end_epoch, step_seconds, columns,
+    )
+    ranking = None
+    if top:
+        ranking = rank_services(series, top_by)[:top]
+        series = {name: series[name] for name, _ in ranking}
+    aggregates = {"sum": {field: sum_series(series, field, len(grid)) for field in summed}} if summed else {}
+    for name in series:
+        series[name] = {field: series[name][field] for field in keep}
+
+    response = {
+        "services": list(series),
+        "unknown": unknown,
+        "step_seconds": step_seconds,
+        "timestamps": [datetime.fromtimestamp(bucket).isoformat() for bucket in grid],
+        "series": series,
+        "aggregates": aggregates,
+    }
+    if ranking is not None:
+        response["top"] = [{"service": name, top_by: value} for name, value in ranking]
+    return response
+
+
+@app.get("/api/metrics/sampler")
+async def get_metrics_sampler_stats(current_user: dict = Depends(get_current_user)) -> Dict:
+    """Per-tick timing of the per-service metrics sampler."""
+    return SAMPLER_STATS.as_dict()
+
+
+@app.get("/api/alerts")
+async def get_alerts(
+    service: Optional[str] = Query(None),
+    current_user: dict = Depends(get_current_user),
+) -> Dict:
+    """Pending/firing alerts and the most recent firing/resolved events, newest first."""
+    active = ALERT_ENGINE.active()
+    recent = list(reversed(ALERT_ENGINE.recent))
+    if service:
+        active = [item for item in active if item["service"] == service]
+        recent = [item for item in recent if item["service"] == service]
+    return {"active": active, "recent": recent}
 
 
 @app.get("/api/system-metrics/history")
@@ -842,22 +1009,7 @@ async def get_system_metrics_history(
     current_user: dict = Depends(get_current_user),
 ) -> Dict:
     try:
-        entries = load_system_metrics_history()
-        now = datetime.now()
-        if range != "all" and range in _RANGE_SECONDS:
-            cutoff = now - timedelta(seconds=_RANGE_SECONDS[range])
-            def _parse_iso(value: Optional[str]) -> Optional[datetime]:
-                if not value:
-                    return None
-                try:
-                    return datetime.fromisoformat(value.replace('Z', ''))
-                except Exception:
-                    return None
-            entries = [e for e in entries if _parse_iso(e.get("t")) and _parse_iso(e.get("t")) >= cutoff]
-        max_points = 500
-        if len(entries) > max_points:
-            step = len(entries) // max_points
-            entries = entries[::step]
+        entries = await asyncio.to_thread(SYSTEM_METRICS_STORE.history, range)
         return {"range": range, "points": entries, "count": len(entries)}
     except Exception as e:
         logger.error(f"Failed to get system metrics history: {e}")
@@ -868,18 +1020,19 @@ async def get_system_metrics_history(
 async def metrics_sse(request: Request, service: str = Query(...), token: Optional[str] = Query(None)):
     get_user_from_request(request, token)
     async def event_generator():
+        # Current point first, then each sample as the sampler publishes it.
+        # StreamingResponse cancels this generator when the client disconnects.
+        seen = METRICS_BROADCAST.version
+        latest = METRICS_HISTORY.get(service)
+        point = latest.last() if latest else None
+        if point:
+            yield f"data: {json.dumps(point)}\n\n"
         while True:
-            if await request.is_disconnected():
-                break
-            try:
-                latest = METRICS_HISTORY.get(service, [])
-                point = latest[-1] if latest else None
+            seen, ticks = await METRICS_BROADCAST.wait(seen)
+            for points in ticks:
+                point = points.get(service)
                 if point:
                     yield f"data: {json.dumps(point)}\n\n"
-            except Exception as e:
-                logger.error(f"SSE metrics error: {e}")
-                break
-            await asyncio.sleep(10)
     return StreamingResponse(event_generator(), media_type="text/event-stream")
 
 
@@ -898,35 +1051,7 @@ def get_process_tree(
     service: str = Query(...),
     current_user: dict = Depends(get_current_user)
 ):
-    pidfile = LOGS_DIR / f"{service}.pid"
-    pid = None
-    if pidfile.exists():
-        try:
-            pid = int(pidfile.read_text().strip())
-        except Exception:
-            pid = None
-    if not pid:
-        return {"service": service, "pid": None, "tree": None, "flat": []}
-
-    tree = build_process_tree(pid)
-    if not tree:
-        return {"service": service, "pid": pid, "tree": None, "flat": []}
-
-    flat = []
-    def _flatten(node, depth=0):
-        flat.append({
-            "pid": node["pid"], "ppid": node["ppid"], "depth": depth,
-            "name": node["name"], "cmdline": node["cmdline"], "status": node["status"],
-            "cpu_percent": node["cpu_percent"], "memory_mb": node["memory_mb"],
-            "memory_percent": node["memory_percent"], "read_bytes": node["read_bytes"],
-            "write_bytes": node["write_bytes"], "num_threads": node["num_threads"],
-            "create_time": node["create_time"],
-        })
-        for child in node.get("children", []):
-            _flatten(child, depth + 1)
-    _flatten(tree)
-
-    return {"service": service, "pid": pid, "tree": tree, "flat": flat}
+    return get_process_tree_payload(service)
 
 
 @app.post("/api/process-tree/kill")
@@ -1153,6 +1278,70 @@ async def websocket_logs(websocket: WebSocket, service: str):
             pass
 
 
+@app.websocket("/api/ws")
+async def websocket_subscriptions(websocket: WebSocket):
+    """One authenticated socket multiplexing several live topics.
+
+    Client messages: {"action": "subscribe" | "unsubscribe", "topic": "..."} and
+    {"action": "ping"}. Topics: dashboard, alerts, metrics:<svc>, logs:<svc>,
+    process-tree:<svc>. Server messages are {"topic": ..., "data": ...} for topic
+    data and {"type": "subscribed" | "unsubscribed" | "error" | "pong", ...} otherwise.
+    """
+    token = websocket.query_params.get("token")
+    if not token:
+        await websocket.close(code=1008)
+        return
+    try:
+        decode_token(token)
+    except HTTPException:
+        await websocket.close(code=1008)
+        return
+
+    await websocket.accept()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=HUB_QUEUE_SIZE)
+    topics = set()
+
+    async def _sender():
+        while True:
+            await websocket.send_text(await queue.get())
+
+    send_task = asyncio.create_task(_sender())
+    try:
+        while True:
+            data = await websocket.receive_json()
+            action = data.get("action") if isinstance(data, dict) else None
+            topic = str(data.get("topic") or "") if isinstance(data, dict) else ""
+            if action == "subscribe":
+                try:
+                    SUBSCRIPTIONS.validate(topic)
+                except ValueError as e:
+                    offer(queue, json.dumps({"type": "error", "topic": topic, "detail": str(e)}))
+                    continue
+                offer(queue, json.dumps({"type": "subscribed", "topic": topic}))
+                await SUBSCRIPTIONS.subscribe(topic, queue)
+                topics.add(topic)
+            elif action == "unsubscribe":
+                SUBSCRIPTIONS.unsubscribe(topic, queue)
+                topics.discard(topic)
+                offer(queue, json.dumps({"type": "unsubscribed", "topic": topic}))
+            elif action == "ping":
+                offer(queue, '{"type":"pong"}')
+            else:
+                offer(queue, json.dumps({"type": "error", "detail": f"unknown action: {action}"}))
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logger.warning(f"Subscription WebSocket error: {e}")
+    finally:
+        for topic in topics:
+            SUBSCRIPTIONS.unsubscribe(topic, queue)
+        send_task.cancel()
+        try:
+            await websocket.close(code=1000)
+        except Exception:
+            pass
+
+
 # ---- WebShell Terminal (pty) ----
 
 @app.websocket("/api/ws/terminal")
@@ -1302,6 +1491,19 @@ async def websocket_terminal(websocket: WebSocket, token: Optional[str] = Query(
         logger.info(f"WebShell terminal closed for user={user['username']}")
 
 
+@app.get("/metrics", include_in_schema=False)
+async def openmetrics(request: Request):
+    """Prometheus scrape target, rendered from cached state only.
+
+    Accepts `Authorization: Bearer <METRICS_TOKEN>` when that variable is set,
+    otherwise (or additionally) a normal user token.
+    """
+    auth_header = request.headers.get('authorization') or ''
+    if not (METRICS_TOKEN and hmac.compare_digest(auth_header.encode(), f"Bearer {METRICS_TOKEN}".encode())):
+        get_user_from_request(request)
+    return Response(render_openmetrics(), media_type=OPENMETRICS_CONTENT_TYPE)
+
+
 @app.get("/api/health")
 async def health_check():
     return {"status": "healthy", "timestamp": datetime.now().isoformat()}
@@ -0,0 +1,47 @@
+"""In-process broadcast of values published by background tasks.
+
+Waiters park on one shared asyncio.Event that is swapped out on every
+publish, so an idle subscriber costs nothing until the next value. The last
+few values are kept by version: a subscriber that was busy while two
+publishes happened still receives both, in order.
+"""
+
+import asyncio
+from collections import deque
+from typing import Any, Deque, List, Optional, Tuple
+
+BROADCAST_BACKLOG = 16
+
+
+class Broadcast:
+    def __init__(self, backlog: int = BROADCAST_BACKLOG):
+        self.version = 0
+        self._recent: Deque[Tuple[int, Any]] = deque(maxlen=backlog)
+        self._event: Optional[asyncio.Event] = None
+
+    def publish(self, value: Any):
+        """Store `value` as the next version and wake every waiter. Event-loop thread only."""
+        self.version += 1
+        self._recent.append((self.version, value))
+        event, self._event = self._event, None
+        if event is not None:
+            event.set()
+
+    def since(self, version: int) -> List[Any]:
+        """Values published after `version` that are still in the backlog, oldest first."""
+        return [value for v, value in self._recent if v > version]
+
+    async def wait(self, version: int) -> Tuple[int, List[Any]]:
+        """Block until something newer than `version` is published; returns (latest version, values)."""
+        while self.version <= version:
+            if self._event is None:
+                self._event = asyncio.Event()
+            await self._event.wait()
+        return self.version, self.since(version)
+
+
+# One value per sampler tick: {service: history point}
+METRICS_BROADCAST = Broadcast()
+
+# One value per sampler tick that changed an alert: [alert event, ...]
+ALERTS_BROADCAST = Broadcast()
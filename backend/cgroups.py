@@ -0,0 +1,162 @@
+"""cgroup v2 accounting for services started in cgroup mode.
+
+With `cgroup:` set in services.yaml, service_compose starts each service in
+<base>/service-compose/<name>. The kernel then keeps exact totals for the
+whole service — including short-lived and reparented children — so CPU,
+memory, io, task and major-fault figures are a few small file reads per
+service instead of a walk over its process tree. Files whose controller is
+not delegated are simply absent; callers fall back to per-process sums.
+"""
+
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from .proctable import PROC_DIR
+
+CGROUP_GROUP = "service-compose"        # must match service_compose.CGROUP_GROUP
+CPU_MIN_INTERVAL = 1.0
+
+_mount_cache: Dict = {"checked": False, "mount": None}
+
+
+def cgroup2_mount() -> Optional[Path]:
+    """Mount point of the cgroup v2 hierarchy (looked up once), or None."""
+    if not _mount_cache["checked"]:
+        try:
+            with open(f"{PROC_DIR}/mounts") as f:
+                for line in f:
+                    fields = line.split()
+                    if len(fields) > 2 and fields[2] == "cgroup2":
+                        _mount_cache["mount"] = Path(fields[1])
+                        break
+        except OSError:
+            pass
+        _mount_cache["checked"] = True
+    return _mount_cache["mount"]
+
+
+def service_cgroup(service: str, pid: int) -> Optional[Path]:
+    """The dedicated cgroup `pid` runs in, or None if it is not in one for `service`."""
+    mount = cgroup2_mount()
+    if mount is None:
+        return None
+    try:
+        with open(f"{PROC_DIR}/{pid}/cgroup") as f:
+            for line in f:
+                if line.startswith("0::"):
+                    relative = line[3:].strip()
+                    break
+            else:
+                return None
+    except OSError:
+        return None
+    parts = Path(relative).parts
+    if parts[-2:] != (CGROUP_GROUP, service):
+        return None
+    return mount / relative.lstrip("/")
+
+
+def _read_keyed(path: Path) -> Dict[str, int]:
+    """Parse a flat "key value" file such as cpu.stat or memory.stat."""
+    values = {}
+    for line in path.read_text().splitlines():
+        key, _, value = line.partition(" ")
+        if value.isdigit():
+            values[key] = int(value)
+    return values
+
+
+def read_cgroup_stats(cgroup: Path) -> Dict[str, int]:
+    """Cumulative and current totals of `cgroup`; keys are missing when unavailable.
+
+    cpu_usec, memory_bytes, read_bytes, write_bytes, tasks, major_faults.
+    """
+    stats: Dict[str, int] = {}
+    try:
+        stats["cpu_usec"] = _read_keyed(cgroup / "cpu.stat")["usage_usec"]
+    except (OSError, KeyError):
+        pass
+    try:
+        stats["memory_bytes"] = int((cgroup / "memory.current").read_text())
+    except (OSError, ValueError):
+        pass
+    try:
+        stats["major_faults"] = _read_keyed(cgroup / "memory.stat")["pgmajfault"]
+    except (OSError, KeyError):
+        pass
+    try:
+        read_bytes = write_bytes = 0
+        # One line per device: "8:0 rbytes=... wbytes=... rios=... ..."
+        for line in (cgroup / "io.stat").read_text().splitlines():
+            for item in line.split()[1:]:
+                key, _, value = item.partition("=")
+                if key == "rbytes":
+                    read_bytes += int(value)
+                elif key == "wbytes":
+                    write_bytes += int(value)
+        stats["read_bytes"] = read_bytes
+        stats["write_bytes"] = write_bytes
+    except (OSError, ValueError):
+        pass
+    try:
+        stats["tasks"] = int((cgroup / "pids.current").read_text())
+    except (OSError, ValueError):
+        pass
+    return stats
+
+
+def cgroup_pids(cgroup: Path) -> List[int]:
+    try:
+        return [int(line) for line in (cgroup / "cgroup.procs").read_text().split()]
+    except (OSError, ValueError):
+        return []
+
+
+def _cgroup_id(cgroup: Path) -> Optional[int]:
+    """Inode of the cgroup directory; a cgroup recreated on restart gets a new one."""
+    try:
+        return cgroup.stat().st_ino
+    except OSError:
+        return None
+
+
+class CgroupCpuBaselines:
+    """Last (usage_usec, taken_at) per (cgroup, inode), like proctable.CpuBaselines per (pid, create_time).
+
+    A cgroup seen for the first time reports 0.0: unlike a process it has no
+    known creation time to average over.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: Dict[tuple, List[float]] = {}     # (cgroup, inode) -> [usage_usec, taken_at, percent]
+
+    def cpu_percent(self, cgroup: Path, usage_usec: int) -> float:
+        now = time.monotonic()
+        key = (cgroup, _cgroup_id(cgroup))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._prune()
+                self._entries[key] = [usage_usec, now, 0.0]
+                return 0.0
+            last_usec, since, percent = entry
+            elapsed = now - since
+            if elapsed < CPU_MIN_INTERVAL:
+                return percent
+            percent = max(usage_usec - last_usec, 0) / 1e6 / elapsed * 100
+            self._entries[key] = [usage_usec, now, percent]
+            return percent
+
+    def _prune(self):
+        """Forget cgroups that were removed or recreated; runs when a new one shows up."""
+        for key in [k for k in self._entries if _cgroup_id(k[0]) != k[1]]:
+            del self._entries[key]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+CGROUP_CPU_BASELINES = CgroupCpuBaselines()
@@ -3,12 +3,16 @@
 import json
 import logging
 import os
+from collections import OrderedDict
 from pathlib import Path
-from typing import Dict, List
-from collections import deque
-
+from typing import TYPE_CHECKING, Dict, List
 import yaml
 
+from .metricstore import MetricsHistory
+
+if TYPE_CHECKING:
+    from .logs import LogIndex      # logs imports this module
+
 # ---------- Paths ----------
 RUN_DIR = Path(__file__).resolve().parent.parent          # project root
 CONFIG_FILE = RUN_DIR / 'services.yaml'
@@ -49,7 +53,9 @@ LOGS_DIR = RUN_DIR / 'logs'
 _auth_db_env = os.getenv('AUTH_DB_PATH', '')
 AUTH_DB_PATH = Path(_auth_db_env) if _auth_db_env else RUN_DIR / 'auth.db'
 AUDIT_LOG_FILE = LOGS_DIR / 'audit.json'
-SYSTEM_METRICS_FILE = LOGS_DIR / 'system_metrics_history.json'
+SYSTEM_METRICS_FILE = LOGS_DIR / 'system_metrics_history.json'       # legacy, migrated on first use
+SYSTEM_METRICS_STORE_FILE = LOGS_DIR / 'system_metrics_history.bin'
+METRICS_ARCHIVE_DIR = LOGS_DIR / 'metrics'
 
 # ---------- Auth ----------
 SECRET_KEY = os.getenv('AUTH_SECRET_KEY', 'liuyuan_wsd')
@@ -60,10 +66,23 @@ ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv('ACCESS_TOKEN_EXPIRE_MINUTES', '480'
 METRICS_INTERVAL_SECONDS = 10
 METRICS_HISTORY_HOURS = 24
 MAX_METRICS_POINTS = int(METRICS_HISTORY_HOURS * 3600 / METRICS_INTERVAL_SECONDS)
-METRICS_HISTORY: Dict[str, deque] = {}
+METRICS_HISTORY: Dict[str, MetricsHistory] = {}
 METRICS_LAST_IO_READ: Dict[str, int] = {}
 METRICS_LAST_IO_WRITE: Dict[str, int] = {}
+METRICS_LAST_COUNTERS: Dict[str, Dict[str, int]] = {}     # service -> cumulative counters of the last tick
 MAX_METRICS_HISTORY_POINTS = 2000
+METRICS_RETENTION_DAYS = 30        # raw per-service points kept on disk
+METRICS_COMPACT_INTERVAL = 600
+METRICS_ROLLUP_SAVE_INTERVAL = 3600    # rollup tiers written to the archive; restarts replay raw points since
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')      # static bearer token accepted by /metrics
+
+# ---------- Dashboard ----------
+DASHBOARD_REFRESH_SECONDS = 2
+
+# ---------- Heartbeat ----------
+HEARTBEAT_DEFAULT_INTERVAL = 5.0
+HEARTBEAT_DEFAULT_TIMEOUT = 1.5
+HEARTBEAT_POOL_MAX_IDLE = 4        # idle keep-alive connections kept per origin
 
 # ---------- Logs ----------
 MAX_LOG_LINES = 500
@@ -72,12 +91,14 @@ MAX_LOG_BYTES = 10 * 1024 * 1024
 MAX_LOG_BACKUPS = 3
 MAX_TOTAL_LOG_BYTES = 500 * 1024 * 1024
 LOG_INDEX_STRIDE = 1000
-LOG_INDEX_CACHE: Dict[str, Dict] = {}
+LOG_INDEX_CACHE_SIZE = 128         # open log indexes kept (LRU); each holds an mmap, not a list
+LOG_INDEX_CACHE: "OrderedDict[str, LogIndex]" = OrderedDict()
 
 # ---------- Audit ----------
 AUDIT_LOG_MAX_ENTRIES = 5000
 
 # ---------- System Metrics ----------
+SYSTEM_METRICS_SAMPLE_INTERVAL = 2
 SYSTEM_METRICS_PERSIST_INTERVAL = 60
 SYSTEM_METRICS_MAX_DAYS = 30
 SYSTEM_METRICS_MAX_POINTS = SYSTEM_METRICS_MAX_DAYS * 24 * 60
@@ -110,7 +131,7 @@ def update_run_dir(services_conifg_path):
         run_dir = services_conifg.get("run_dir", None)
         if run_dir:
             resolved_run_dir = _resolve_path(run_dir, config_dir)
-            global RUN_DIR, CONFIG_FILE, LOGS_DIR, AUTH_DB_PATH, AUDIT_LOG_FILE, SYSTEM_METRICS_FILE
+            global RUN_DIR, CONFIG_FILE, LOGS_DIR, AUTH_DB_PATH, AUDIT_LOG_FILE, SYSTEM_METRICS_FILE, SYSTEM_METRICS_STORE_FILE, METRICS_ARCHIVE_DIR
             RUN_DIR = Path(resolved_run_dir)
             CONFIG_FILE = Path(services_conifg_path)
             LOGS_DIR = RUN_DIR / 'logs'
@@ -118,6 +139,8 @@ def update_run_dir(services_conifg_path):
                 AUTH_DB_PATH = RUN_DIR / 'auth.db'
             AUDIT_LOG_FILE = LOGS_DIR / 'audit.json'
             SYSTEM_METRICS_FILE = LOGS_DIR / 'system_metrics_history.json'
+            SYSTEM_METRICS_STORE_FILE = LOGS_DIR / 'system_metrics_history.bin'
+            METRICS_ARCHIVE_DIR = LOGS_DIR / 'metrics'
             LOGS_DIR.mkdir(exist_ok=True)
             logger.info(f"Updated run directory to: {RUN_DIR}")
 
@@ -135,6 +158,26 @@ def load_config() -> dict:
         return {}
 
 
+_config_cache: Dict = {"key": None, "config": {}}
+
+
+def load_config_cached() -> dict:
+    """Load config, re-parsing the file only when its mtime/size changed.
+
+    For hot read-only paths (status snapshot, background probers). The returned
+    dict is shared — never mutate it or pass it to save_config.
+    """
+    try:
+        stat = CONFIG_FILE.stat()
+        key = (str(CONFIG_FILE), stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        key = None
+    if key is None or key != _config_cache["key"]:
+        _config_cache["config"] = load_config()
+        _config_cache["key"] = key
+    return _config_cache["config"]
+
+
 def load_config_resolved() -> dict:
     """Load config with all relative paths resolved to absolute.
     
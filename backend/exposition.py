@@ -0,0 +1,253 @@
+"""OpenMetrics exposition for Prometheus scrapes of /metrics.
+
+Everything is rendered from state the background tasks already keep: the
+dashboard snapshot (health, restarts, heartbeat, system metrics), the last
+per-service history point, sampler timing, and the request and event-loop
+counters collected here. A scrape makes no psutil or /proc calls.
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from .config import METRICS_HISTORY
+from .snapshot import DASHBOARD_SNAPSHOT
+from .tasks import SAMPLER_STATS
+from .alerts import ALERT_ENGINE
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+PREFIX = "service_compose"
+HEALTH_STATES = ("running", "abnormal", "stopped")
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LOOP_LAG_INTERVAL = 0.5
+LOOP_LAG_WINDOW = 120               # samples kept for the max (one minute)
+
+# (history field, metric name, help, scale)
+_SERVICE_FIELDS = (
+    ("cpu_percent", "service_cpu_percent", "CPU usage of the service process tree, percent of one core", 1),
+    ("memory_mb", "service_memory_bytes", "Resident memory of the service process tree", 1024 * 1024),
+    ("read_mb_s", "service_io_read_bytes_per_second", "Disk read rate of the service process tree", 1024 * 1024),
+    ("write_mb_s", "service_io_write_bytes_per_second", "Disk write rate of the service process tree", 1024 * 1024),
+    ("open_fds", "service_open_fds", "Open file descriptors of the service process tree", 1),
+    ("threads", "service_threads", "Threads of the service process tree", 1),
+    ("tcp_connections", "service_tcp_connections", "Established TCP connections of the service process tree", 1),
+    ("major_faults_s", "service_major_faults_per_second", "Major page faults per second", 1),
+    ("voluntary_ctx_switches_s", "service_voluntary_context_switches_per_second",
+     "Voluntary context switches per second", 1),
+    ("involuntary_ctx_switches_s", "service_involuntary_context_switches_per_second",
+     "Involuntary context switches per second", 1),
+)
+
+# (snapshot metrics key, metric name, help, scale)
+_SYSTEM_FIELDS = (
+    ("cpu_percent", "system_cpu_percent", "Host CPU usage, percent", 1),
+    ("cpu_count", "system_cpu_count", "Logical CPUs", 1),
+    ("memory_percent", "system_memory_percent", "Host memory usage, percent", 1),
+    ("memory_used", "system_memory_used_bytes", "Host memory in use", 1),
+    ("memory_total", "system_memory_total_bytes", "Host memory", 1),
+    ("disk_percent", "system_disk_percent", "Run directory disk usage, percent", 1),
+    ("disk_used", "system_disk_used_bytes", "Run directory disk used", 1),
+    ("disk_total", "system_disk_total_bytes", "Run directory disk size", 1),
+    ("net_upload_speed", "system_network_transmit_bytes_per_second", "Physical NIC upload rate", 1024 * 1024),
+    ("net_download_speed", "system_network_receive_bytes_per_second", "Physical NIC download rate", 1024 * 1024),
+    ("run_disk_read_speed", "system_disk_read_bytes_per_second", "Run directory disk read rate", 1024 * 1024),
+    ("run_disk_write_speed", "system_disk_write_bytes_per_second", "Run directory disk write rate", 1024 * 1024),
+)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _number(value: float) -> str:
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+def _scaled(value: float, scale: int) -> float:
+    """MB-based readings become whole bytes; everything else keeps 3 decimals."""
+    return round(value * scale) if scale != 1 else round(value, 3)
+
+
+class _Writer:
+    def __init__(self):
+        self.lines: List[str] = []
+
+    def family(self, name: str, kind: str, help_text: str):
+        self.lines.append(f"# TYPE {PREFIX}_{name} {kind}")
+        self.lines.append(f"# HELP {PREFIX}_{name} {help_text}")
+
+    def sample(self, name: str, value: float, labels: Optional[Dict[str, str]] = None):
+        self.lines.append(f"{PREFIX}_{name}{_labels(labels or {})} {_number(value)}")
+
+    def text(self) -> str:
+        return "\n".join(self.lines + ["# EOF", ""])
+
+
+class ApiStats:
+    """Request counts and latency histograms per (method, handler)."""
+
+    def __init__(self):
+        self.requests: Dict[Tuple[str, str, str], int] = {}
+        self.durations: Dict[Tuple[str, str], List] = {}     # key -> [bucket counts, sum, count]
+
+    def record(self, method: str, handler: str, status: int, seconds: float):
+        key = (method, handler, str(status))
+        self.requests[key] = self.requests.get(key, 0) + 1
+        entry = self.durations.get((method, handler))
+        if entry is None:
+            entry = self.durations[(method, handler)] = [[0] * len(DURATION_BUCKETS), 0.0, 0]
+        for i, bound in enumerate(DURATION_BUCKETS):
+            if seconds <= bound:
+                entry[0][i] += 1
+        entry[1] += seconds
+        entry[2] += 1
+
+
+class RequestStatsMiddleware:
+    """ASGI middleware feeding ApiStats; labels requests by endpoint function name."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = 500
+
+        async def _send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            # The router stores the matched endpoint in the shared scope
+            handler = getattr(scope.get("endpoint"), "__name__", "other")
+            API_STATS.record(scope["method"], handler, status, time.perf_counter() - started)
+
+
+class LoopLagMonitor:
+    """How late the event loop wakes a LOOP_LAG_INTERVAL sleep."""
+
+    def __init__(self):
+        self.lags: Deque[float] = deque(maxlen=LOOP_LAG_WINDOW)
+        self.samples = 0
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(LOOP_LAG_INTERVAL)
+            self.lags.append(max(loop.time() - started - LOOP_LAG_INTERVAL, 0.0))
+            self.samples += 1
+
+
+API_STATS = ApiStats()
+LOOP_MONITOR = LoopLagMonitor()
+
+
+def _render_services(out: _Writer, services: List[Dict]):
+    out.family("service_health", "stateset", "Health of each managed service")
+    for svc in services:
+        states = HEALTH_STATES if svc.get("health") in HEALTH_STATES else HEALTH_STATES + (svc.get("health"),)
+        for state in states:
+            out.sample("service_health", 1 if svc.get("health") == state else 0,
+                       {"service": svc["name"], f"{PREFIX}_service_health": state})
+    out.family("service_restarts", "counter", "Restarts performed by the manager")
+    for svc in services:
+        out.sample("service_restarts_total", svc.get("restart_count") or 0, {"service": svc["name"]})
+    out.family("service_uptime_seconds", "gauge", "Seconds since the service process started")
+    for svc in services:
+        if svc.get("uptime_seconds") is not None:
+            out.sample("service_uptime_seconds", svc["uptime_seconds"], {"service": svc["name"]})
+    out.family("service_heartbeat_latency_seconds", "gauge", "Latency of the last heartbeat probe")
+    for svc in services:
+        if svc.get("heartbeat_latency_ms") is not None:
+            out.sample("service_heartbeat_latency_seconds", svc["heartbeat_latency_ms"] / 1000, {"service": svc["name"]})
+    out.family("service_heartbeat_age_seconds", "gauge", "Age of the cached heartbeat result")
+    for svc in services:
+        if svc.get("heartbeat_age") is not None:
+            out.sample("service_heartbeat_age_seconds", svc["heartbeat_age"], {"service": svc["name"]})
+
+
+def _render_service_metrics(out: _Writer):
+    latest = {}
+    for name, history in list(METRICS_HISTORY.items()):
+        point = history.last()
+        if point:
+            latest[name] = point
+    for field, metric, help_text, scale in _SERVICE_FIELDS:
+        out.family(metric, "gauge", help_text)
+        for name, point in latest.items():
+            out.sample(metric, _scaled(point.get(field, 0.0), scale), {"service": name})
+
+
+def _render_alerts(out: _Writer):
+    out.family("alert_firing", "gauge", "1 while an alert rule is firing, 0 while pending")
+    for alert in ALERT_ENGINE.active():
+        out.sample("alert_firing", 1 if alert["state"] == "firing" else 0,
+                   {"service": alert["service"], "rule": alert["rule"], "severity": alert["severity"]})
+
+
+def _render_system(out: _Writer, metrics: Dict):
+    for key, metric, help_text, scale in _SYSTEM_FIELDS:
+        if metrics.get(key) is None:
+            continue
+        out.family(metric, "gauge", help_text)
+        out.sample(metric, _scaled(metrics[key], scale))
+
+
+def _render_api(out: _Writer):
+    out.family("http_requests", "counter", "HTTP requests served by the API")
+    for (method, handler, status), count in sorted(API_STATS.requests.items()):
+        out.sample("http_requests_total", count, {"method": method, "handler": handler, "status": status})
+    out.family("http_request_duration_seconds", "histogram", "Time to serve an HTTP request (whole stream for SSE)")
+    for (method, handler), (buckets, total, count) in sorted(API_STATS.durations.items()):
+        labels = {"method": method, "handler": handler}
+        for bound, bucket_count in zip(DURATION_BUCKETS, buckets):
+            out.sample("http_request_duration_seconds_bucket", bucket_count, {**labels, "le": repr(float(bound))})
+        out.sample("http_request_duration_seconds_bucket", count, {**labels, "le": "+Inf"})
+        out.sample("http_request_duration_seconds_sum", round(total, 6), labels)
+        out.sample("http_request_duration_seconds_count", count, labels)
+
+
+def _render_runtime(out: _Writer):
+    lags = list(LOOP_MONITOR.lags)
+    out.family("event_loop_lag_seconds", "gauge", "Delay of the last event loop wake-up")
+    out.sample("event_loop_lag_seconds", round(lags[-1], 6) if lags else 0)
+    out.family("event_loop_lag_max_seconds", "gauge", "Largest event loop wake-up delay over the last minute")
+    out.sample("event_loop_lag_max_seconds", round(max(lags), 6) if lags else 0)
+
+    out.family("sampler_ticks", "counter", "Per-service metrics sampler passes")
+    out.sample("sampler_ticks_total", SAMPLER_STATS.ticks)
+    out.family("sampler_missed_ticks", "counter", "Sampler deadlines skipped because a pass overran")
+    out.sample("sampler_missed_ticks_total", SAMPLER_STATS.missed_ticks)
+    out.family("sampler_duration_seconds", "gauge", "Duration of the last sampler pass")
+    out.sample("sampler_duration_seconds", round(SAMPLER_STATS.durations[-1], 6) if SAMPLER_STATS.durations else 0)
+
+
+def render_openmetrics() -> str:
+    out = _Writer()
+    dump = DASHBOARD_SNAPSHOT.dump
+    if dump is not None:
+        _render_services(out, dump.get("services") or [])
+    _render_service_metrics(out)
+    _render_alerts(out)
+    if dump is not None:
+        _render_system(out, dump.get("metrics") or {})
+    _render_api(out)
+    _render_runtime(out)
+    return out.text()
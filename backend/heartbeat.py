@@ -0,0 +1,309 @@
+"""Asynchronous heartbeat prober: concurrent probes over pooled keep-alive connections.
+
+The prober runs as a background task and caches the last result per service;
+status builders only read HEARTBEAT_RESULTS and never perform network IO.
+"""
+
+import asyncio
+import ssl
+import time
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urljoin, urlsplit
+
+from .config import (
+    LOGS_DIR, logger,
+    load_config_cached, get_all_services,
+    HEARTBEAT_DEFAULT_INTERVAL, HEARTBEAT_DEFAULT_TIMEOUT, HEARTBEAT_POOL_MAX_IDLE,
+)
+
+MOCK_OK_URLS = {"mock", "simulate", "mock://ok", "simulate://ok"}
+MOCK_FAIL_URLS = {"mock://fail", "simulate://fail"}
+
+_MAX_BODY_BYTES = 64 * 1024     # larger bodies are not drained; the connection is dropped instead
+_MAX_REDIRECTS = 10             # same limit as urllib.request
+_REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+
+# {service: {"pid", "url", "ok", "reason", "latency_ms", "checked_at", "stale_after"}}
+HEARTBEAT_RESULTS: Dict[str, Dict] = {}
+
+
+def check_mock_heartbeat(heartbeat_url: Optional[str]) -> Optional[Tuple[bool, Optional[str]]]:
+    """Resolve heartbeats that need no network IO. Returns None for real URLs."""
+    if not heartbeat_url:
+        return False, "missing"
+    if heartbeat_url in MOCK_OK_URLS:
+        return True, None
+    if heartbeat_url in MOCK_FAIL_URLS:
+        return False, "mock_fail"
+    return None
+
+
+def get_heartbeat_result(name: str, pid: int) -> Tuple[bool, Optional[str], Optional[float], Optional[float]]:
+    """Return (ok, reason, age_seconds, latency_ms) from the cached probe of `name`."""
+    result = HEARTBEAT_RESULTS.get(name)
+    if not result or result.get("pid") != pid:
+        return False, "pending", None, None
+    age = round(time.time() - result["checked_at"], 1)
+    if age > result["stale_after"]:
+        return False, "stale", age, result.get("latency_ms")
+    return result["ok"], result["reason"], age, result.get("latency_ms")
+
+
+# ---------- HTTP connection pool ----------
+
+class _PooledConnection:
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+
+    def close(self):
+        try:
+            self.writer.close()
+        except Exception:
+            pass
+
+
+class HeartbeatConnectionPool:
+    """Minimal HTTP/1.1 GET client keeping idle keep-alive connections per origin."""
+
+    def __init__(self, max_idle: int = HEARTBEAT_POOL_MAX_IDLE):
+        self.max_idle = max_idle
+        self._idle: Dict[Tuple[str, str, int], List[_PooledConnection]] = {}
+        self._ssl_context: Optional[ssl.SSLContext] = None
+
+    def _get_ssl_context(self) -> ssl.SSLContext:
+        if self._ssl_context is None:
+            self._ssl_context = ssl.create_default_context()
+        return self._ssl_context
+
+    async def _open(self, scheme: str, host: str, port: int) -> _PooledConnection:
+        ssl_ctx = self._get_ssl_context() if scheme == "https" else None
+        reader, writer = await asyncio.open_connection(host, port, ssl=ssl_ctx)
+        return _PooledConnection(reader, writer)
+
+    def _acquire_idle(self, key) -> Optional[_PooledConnection]:
+        idle = self._idle.get(key)
+        while idle:
+            conn = idle.pop()
+            if conn.reader.at_eof() or conn.writer.is_closing():
+                conn.close()
+                continue
+            return conn
+        return None
+
+    def _release(self, key, conn: _PooledConnection):
+        idle = self._idle.setdefault(key, [])
+        if len(idle) >= self.max_idle:
+            conn.close()
+            return
+        idle.append(conn)
+
+    def close(self):
+        for conns in self._idle.values():
+            for conn in conns:
+                conn.close()
+        self._idle.clear()
+
+    async def get_status(self, url: str, timeout: float) -> int:
+        """GET `url` and return the final HTTP status code, following redirects.
+
+        Redirects are followed like urllib did, over pooled connections and
+        within the one `timeout` budget. Raises ValueError on a bad URL.
+        """
+        async def _follow() -> int:
+            current = url
+            for _ in range(_MAX_REDIRECTS + 1):
+                status, location = await self._get_once(current)
+                if status not in _REDIRECT_STATUSES or not location:
+                    return status
+                current = urljoin(current, location)
+            return status
+
+        return await asyncio.wait_for(_follow(), timeout=timeout)
+
+    async def _get_once(self, url: str) -> Tuple[int, Optional[str]]:
+        """One GET of `url`; returns (status, Location header)."""
+        parts = urlsplit(url)
+        scheme = parts.scheme.lower()
+        if scheme not in ("http", "https") or not parts.hostname:
+            raise ValueError(f"unsupported heartbeat url: {url}")
+        port = parts.port or (443 if scheme == "https" else 80)
+        key = (scheme, parts.hostname, port)
+        target = parts.path or "/"
+        if parts.query:
+            target += "?" + parts.query
+        # netloc keeps IPv6 brackets; drop any userinfo
+        host_header = parts.netloc.rpartition("@")[2]
+        request = (
+            f"GET {target} HTTP/1.1\r\n"
+            f"Host: {host_header}\r\n"
+            f"User-Agent: service-compose-heartbeat\r\n"
+            f"Accept: */*\r\n"
+            f"Connection: keep-alive\r\n\r\n"
+        ).encode("latin-1")
+
+        async def _attempt(conn: _PooledConnection) -> Tuple[int, bool, Optional[str]]:
+            conn.writer.write(request)
+            await conn.writer.drain()
+            return await self._read_response(conn.reader)
+
+        conn = self._acquire_idle(key)
+        if conn is not None:
+            try:
+                status, keep_alive, location = await _attempt(conn)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                # The server closed the idle connection; retry once on a fresh one.
+                conn.close()
+                conn = None
+            except BaseException:
+                conn.close()
+                raise
+        if conn is None:
+            conn = await self._open(scheme, parts.hostname, port)
+            try:
+                status, keep_alive, location = await _attempt(conn)
+            except BaseException:
+                conn.close()
+                raise
+        if keep_alive:
+            self._release(key, conn)
+        else:
+            conn.close()
+        return status, location
+
+    @staticmethod
+    async def _read_response(reader: asyncio.StreamReader) -> Tuple[int, bool, Optional[str]]:
+        """Read one response. Returns (status, connection_reusable, Location header)."""
+        status_line = await reader.readuntil(b"\r\n")
+        parts = status_line.decode("latin-1").split(" ", 2)
+        if len(parts) < 2 or not parts[0].startswith("HTTP/"):
+            raise ConnectionError("malformed status line")
+        try:
+            status = int(parts[1])
+        except ValueError:
+            raise ConnectionError("malformed status code")
+        http10 = parts[0] == "HTTP/1.0"
+        headers: Dict[str, str] = {}
+        while True:
+            line = await reader.readuntil(b"\r\n")
+            if line == b"\r\n":
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        connection = headers.get("connection", "").lower()
+        keep_alive = "close" not in connection and (not http10 or "keep-alive" in connection)
+        location = headers.get("location")
+
+        if status in (204, 304) or 100 <= status < 200:
+            return status, keep_alive, location
+        if "chunked" in headers.get("transfer-encoding", "").lower():
+            drained = 0
+            while True:
+                size_line = await reader.readuntil(b"\r\n")
+                size = int(size_line.split(b";", 1)[0].strip() or b"0", 16)
+                if size == 0:
+                    # Trailers end with an empty line
+                    while await reader.readuntil(b"\r\n") != b"\r\n":
+                        pass
+                    break
+                drained += size
+                if drained > _MAX_BODY_BYTES:
+                    return status, False, location
+                await reader.readexactly(size + 2)
+            return status, keep_alive, location
+        if "content-length" in headers:
+            length = int(headers["content-length"])
+            if length > _MAX_BODY_BYTES:
+                return status, False, location
+            await reader.readexactly(length)
+            return status, keep_alive, location
+        # No framing: body runs until close, so the connection cannot be reused.
+        return status, False, location
+
+
+HEARTBEAT_POOL = HeartbeatConnectionPool()
+
+
+async def probe_heartbeat(url: str, timeout: float) -> Tuple[bool, Optional[str], Optional[float]]:
+    """Probe one URL. Returns (ok, reason, latency_ms)."""
+    started = time.perf_counter()
+    try:
+        status = await HEARTBEAT_POOL.get_status(url, timeout)
+    except asyncio.TimeoutError:
+        return False, "timeout", None
+    except ValueError:
+        return False, "invalid_url", None
+    except Exception:
+        return False, "connection_error", None
+    latency_ms = round((time.perf_counter() - started) * 1000, 1)
+    if status == 200:
+        return True, None, latency_ms
+    return False, f"http_status_{status}", latency_ms
+
+
+# ---------- Background prober ----------
+
+def _heartbeat_settings(service_cfg: dict) -> Tuple[float, float]:
+    try:
+        interval = float(service_cfg.get("heartbeat_interval") or HEARTBEAT_DEFAULT_INTERVAL)
+    except (TypeError, ValueError):
+        interval = HEARTBEAT_DEFAULT_INTERVAL
+    try:
+        timeout = float(service_cfg.get("heartbeat_timeout") or HEARTBEAT_DEFAULT_TIMEOUT)
+    except (TypeError, ValueError):
+        timeout = HEARTBEAT_DEFAULT_TIMEOUT
+    return max(interval, 0.5), max(timeout, 0.1)
+
+
+async def _probe_service(name: str, pid: int, url: str, interval: float, timeout: float):
+    ok, reason, latency_ms = await probe_heartbeat(url, timeout)
+    HEARTBEAT_RESULTS[name] = {
+        "pid": pid,
+        "url": url,
+        "ok": ok,
+        "reason": reason,
+        "latency_ms": latency_ms,
+        "checked_at": time.time(),
+        # A result older than this is reported as stale rather than trusted
+        "stale_after": interval * 3 + timeout,
+    }
+
+
+async def heartbeat_prober():
+    """Probe every running service with a real heartbeat URL on its own interval."""
+    from .services import get_pid, is_process_running
+
+    logger.info("Heartbeat prober started")
+    next_due: Dict[str, float] = {}
+    in_flight: Dict[str, asyncio.Task] = {}
+    while True:
+        try:
+            now = time.monotonic()
+            seen = set()
+            for service_cfg in get_all_services(load_config_cached()):
+                name = service_cfg.get("name")
+                url = service_cfg.get("heartbeat")
+                if not name or check_mock_heartbeat(url) is not None:
+                    continue
+                seen.add(name)
+                pid = get_pid(LOGS_DIR / f"{name}.pid")
+                if not pid or not is_process_running(pid):
+                    HEARTBEAT_RESULTS.pop(name, None)
+                    next_due.pop(name, None)
+                    continue
+                cached = HEARTBEAT_RESULTS.get(name)
+                restarted = cached is not None and (cached.get("pid") != pid or cached.get("url") != url)
+                if name in in_flight or (not restarted and now < next_due.get(name, 0)):
+                    continue
+                interval, timeout = _heartbeat_settings(service_cfg)
+                next_due[name] = now + interval
+                task = asyncio.create_task(_probe_service(name, pid, url, interval, timeout))
+                in_flight[name] = task
+                task.add_done_callback(lambda _t, n=name: in_flight.pop(n, None))
+            for name in list(HEARTBEAT_RESULTS):
+                if name not in seen:
+                    HEARTBEAT_RESULTS.pop(name, None)
+        except Exception as e:
+            logger.warning(f"Heartbeat prober error: {e}")
+        await asyncio.sleep(0.5)
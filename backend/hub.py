@@ -0,0 +1,248 @@
+"""Topic hub behind the multiplexed /api/ws WebSocket.
+
+Each topic ("dashboard", "alerts", "metrics:<svc>", "logs:<svc>",
+"process-tree:<svc>")
+has at most one producer task, started with its first subscriber and
+cancelled with its last. A produced message is framed once as
+{"topic": ..., "data": ...} and the same string is queued to every
+subscribed connection, so per-message cost does not grow with the number
+of browser tabs watching the same thing.
+"""
+
+import asyncio
+import json
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from .config import (
+    LOGS_DIR, logger,
+    load_config_cached, get_all_services,
+    METRICS_HISTORY,
+)
+from .services import extract_log_level, get_process_tree_payload
+from .snapshot import DASHBOARD_SNAPSHOT
+from .broadcast import METRICS_BROADCAST, ALERTS_BROADCAST
+from .alerts import ALERT_ENGINE
+
+HUB_QUEUE_SIZE = 256                # per-connection backlog before old messages are dropped
+DASHBOARD_KEYFRAME_SECONDS = 30
+LOG_POLL_SECONDS = 0.5
+LOG_BATCH_MAX_BYTES = 256 * 1024
+PROCESS_TREE_INTERVAL = 3.0
+
+Producer = Callable[[Optional[str]], AsyncIterator[str]]
+Initial = Callable[[Optional[str]], Awaitable[List[str]]]
+
+
+def offer(queue: asyncio.Queue, message: str):
+    """Queue `message`, dropping the oldest one if the consumer has fallen behind."""
+    try:
+        queue.put_nowait(message)
+    except asyncio.QueueFull:
+        try:
+            queue.get_nowait()
+        except asyncio.QueueEmpty:
+            pass
+        queue.put_nowait(message)
+
+
+def frame(topic: str, payload: str) -> str:
+    return f'{{"topic":{json.dumps(topic)},"data":{payload}}}'
+
+
+class _Topic:
+    def __init__(self, name: str):
+        self.name = name
+        self.subscribers: Set[asyncio.Queue] = set()
+        self.task: Optional[asyncio.Task] = None
+
+
+class SubscriptionHub:
+    def __init__(self):
+        self._specs: Dict[str, Tuple[Producer, Optional[Initial], bool]] = {}
+        self._topics: Dict[str, _Topic] = {}
+
+    def register(self, kind: str, producer: Producer, initial: Optional[Initial] = None,
+                 per_service: bool = True):
+        self._specs[kind] = (producer, initial, per_service)
+
+    def _resolve(self, topic: str) -> Tuple[Producer, Optional[Initial], Optional[str]]:
+        kind, _, arg = topic.partition(":")
+        spec = self._specs.get(kind)
+        if spec is None:
+            raise ValueError(f"unknown topic: {topic}")
+        producer, initial, per_service = spec
+        if not per_service:
+            if arg:
+                raise ValueError(f"topic {kind} takes no service")
+            return producer, initial, None
+        names = {svc.get("name") for svc in get_all_services(load_config_cached())}
+        if arg not in names:
+            raise ValueError(f"unknown service: {arg}")
+        return producer, initial, arg
+
+    def validate(self, topic: str):
+        """Raise ValueError if `topic` names an unknown topic kind or service."""
+        self._resolve(topic)
+
+    async def subscribe(self, topic: str, queue: asyncio.Queue):
+        """Add `queue` to `topic`. Raises ValueError for unknown topics or services.
+
+        If sending the initial state fails or is cancelled, `queue` is removed again.
+        """
+        producer, initial, arg = self._resolve(topic)
+        entry = self._topics.get(topic)
+        if entry is None:
+            entry = self._topics[topic] = _Topic(topic)
+            entry.task = asyncio.create_task(self._run(entry, producer, arg))
+        if queue in entry.subscribers:
+            return
+        entry.subscribers.add(queue)
+        if initial is not None:
+            try:
+                payloads = await initial(arg)
+            except BaseException:
+                # Raised or cancelled: the caller never learns it subscribed
+                self.unsubscribe(topic, queue)
+                raise
+            for payload in payloads:
+                offer(queue, frame(topic, payload))
+
+    def unsubscribe(self, topic: str, queue: asyncio.Queue):
+        entry = self._topics.get(topic)
+        if entry is None:
+            return
+        entry.subscribers.discard(queue)
+        if not entry.subscribers:
+            entry.task.cancel()
+            del self._topics[topic]
+
+    async def _run(self, entry: _Topic, producer: Producer, arg: Optional[str]):
+        while True:
+            try:
+                async for payload in producer(arg):
+                    message = frame(entry.name, payload)
+                    for queue in list(entry.subscribers):
+                        offer(queue, message)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Topic {entry.name} producer error: {e}")
+            await asyncio.sleep(1.0)
+
+
+# ---------- Producers ----------
+
+async def _dashboard_initial(_arg) -> List[str]:
+    await DASHBOARD_SNAPSHOT.get()
+    return [DASHBOARD_SNAPSHOT.keyframe_message()]
+
+
+async def _dashboard_producer(_arg) -> AsyncIterator[str]:
+    """Same keyframe/delta protocol as /api/dashboard/sse?mode=delta."""
+    loop = asyncio.get_running_loop()
+    await DASHBOARD_SNAPSHOT.get()
+    sent_version = DASHBOARD_SNAPSHOT.version
+    last_keyframe_at = loop.time()
+    while True:
+        await DASHBOARD_SNAPSHOT.wait_for_update(sent_version, 30)
+        version = DASHBOARD_SNAPSHOT.version
+        if version <= sent_version:
+            continue
+        delta = DASHBOARD_SNAPSHOT.delta_message()
+        now = loop.time()
+        if version != sent_version + 1 or delta is None or now - last_keyframe_at >= DASHBOARD_KEYFRAME_SECONDS:
+            yield DASHBOARD_SNAPSHOT.keyframe_message()
+            last_keyframe_at = now
+        else:
+            yield delta
+        sent_version = version
+
+
+def _latest_metrics_point(service: str) -> Optional[Dict]:
+    history = METRICS_HISTORY.get(service)
+    return history.last() if history else None
+
+
+async def _metrics_initial(service) -> List[str]:
+    point = _latest_metrics_point(service)
+    return [json.dumps(point)] if point else []
+
+
+async def _metrics_producer(service) -> AsyncIterator[str]:
+    seen = METRICS_BROADCAST.version
+    while True:
+        seen, ticks = await METRICS_BROADCAST.wait(seen)
+        for points in ticks:
+            point = points.get(service)
+            if point:
+                yield json.dumps(point)
+
+
+async def _alerts_initial(_arg) -> List[str]:
+    return [json.dumps({"active": ALERT_ENGINE.active(), "events": []})]
+
+
+async def _alerts_producer(_arg) -> AsyncIterator[str]:
+    """Firing/resolved events as they happen, with the active set after them."""
+    seen = ALERTS_BROADCAST.version
+    while True:
+        seen, ticks = await ALERTS_BROADCAST.wait(seen)
+        events = [event for tick in ticks for event in tick]
+        yield json.dumps({"active": ALERT_ENGINE.active(), "events": events})
+
+
+def _read_new_log_lines(log_file, position: int) -> Tuple[int, List[Dict]]:
+    try:
+        size = log_file.stat().st_size
+    except FileNotFoundError:
+        return 0, []
+    if size < position:
+        position = 0        # truncated or rotated
+    if size == position:
+        return position, []
+    # Skip ahead if a burst outran us; a live tail only needs the recent part.
+    start = max(position, size - LOG_BATCH_MAX_BYTES)
+    with open(log_file, 'rb') as f:
+        f.seek(start)
+        data = f.read(size - start)
+    # Hold back an unterminated last line until it is complete
+    end = data.rfind(b"\n") + 1
+    if end == 0:
+        return position, []
+    lines = []
+    for raw in data[:end].decode('utf-8', errors='ignore').splitlines():
+        if raw.strip():
+            lines.append({
+                "raw": raw.rstrip(),
+                "level": extract_log_level(raw),
+                "timestamp": raw[:19] if len(raw) > 19 else "",
+            })
+    return start + end, lines
+
+
+async def _logs_producer(service) -> AsyncIterator[str]:
+    log_file = LOGS_DIR / f"{service}.log"
+    try:
+        position = log_file.stat().st_size
+    except FileNotFoundError:
+        position = 0
+    while True:
+        await asyncio.sleep(LOG_POLL_SECONDS)
+        position, lines = await asyncio.to_thread(_read_new_log_lines, log_file, position)
+        if lines:
+            yield json.dumps({"type": "logs", "service": service, "lines": lines}, ensure_ascii=False)
+
+
+async def _process_tree_producer(service) -> AsyncIterator[str]:
+    while True:
+        payload = await asyncio.to_thread(get_process_tree_payload, service)
+        yield json.dumps(payload, ensure_ascii=False)
+        await asyncio.sleep(PROCESS_TREE_INTERVAL)
+
+
+SUBSCRIPTIONS = SubscriptionHub()
+SUBSCRIPTIONS.register("dashboard", _dashboard_producer, _dashboard_initial, per_service=False)
+SUBSCRIPTIONS.register("alerts", _alerts_producer, _alerts_initial, per_service=False)
+SUBSCRIPTIONS.register("metrics", _metrics_producer, _metrics_initial)
+SUBSCRIPTIONS.register("logs", _logs_producer)
+SUBSCRIPTIONS.register("process-tree", _process_tree_producer)
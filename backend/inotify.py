@@ -0,0 +1,159 @@
+"""Minimal inotify directory watcher (ctypes, Linux) with a polling fallback.
+
+Subscribers are called on the event loop with the name of the file that
+changed, or with None when they should rescan everything (queue overflow,
+watch lost, or polling mode on platforms without inotify).
+"""
+
+import asyncio
+import ctypes
+import ctypes.util
+import os
+import struct
+from pathlib import Path
+from typing import Callable, List, Optional
+
+from .config import LOGS_DIR, logger
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+_EVENT_HEADER = struct.Struct("iIII")     # wd, mask, cookie, len
+
+POLL_INTERVAL_SECONDS = 1.0
+
+_libc = None
+
+
+def _load_libc():
+    global _libc
+    if _libc is None:
+        _libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+    return _libc
+
+
+class DirectoryWatcher:
+    """Watch one directory and fan file events out to subscribers."""
+
+    def __init__(self, directory: Path, mask: int):
+        self.directory = directory
+        self.mask = mask
+        self._subscribers: List[Callable[[Optional[str]], None]] = []
+        self._fd: Optional[int] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._poll_task: Optional[asyncio.Task] = None
+
+    @property
+    def using_inotify(self) -> bool:
+        return self._fd is not None
+
+    def subscribe(self, callback: Callable[[Optional[str]], None]):
+        self._subscribers.append(callback)
+
+    def add_mask(self, mask: int):
+        """Widen the watch mask (e.g. a later subscriber also needs IN_MODIFY)."""
+        self.mask |= mask
+        if self._fd is not None:
+            self._add_watch()
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        try:
+            libc = _load_libc()
+            fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if fd < 0:
+                raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+            self._fd = fd
+            self._add_watch()
+            self._loop.add_reader(fd, self._on_readable)
+            logger.info(f"Watching {self.directory} with inotify")
+        except Exception as e:
+            logger.info(f"inotify unavailable ({e}), polling {self.directory} every {POLL_INTERVAL_SECONDS}s")
+            self._close_fd()
+            self._poll_task = asyncio.create_task(self._poll_loop())
+
+    def stop(self):
+        if self._poll_task:
+            self._poll_task.cancel()
+            self._poll_task = None
+        self._close_fd()
+
+    def _close_fd(self):
+        if self._fd is None:
+            return
+        try:
+            if self._loop:
+                self._loop.remove_reader(self._fd)
+        except Exception:
+            pass
+        os.close(self._fd)
+        self._fd = None
+
+    def _add_watch(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        wd = _load_libc().inotify_add_watch(
+            self._fd, os.fsencode(str(self.directory)),
+            self.mask | IN_DELETE_SELF | IN_MOVE_SELF,
+        )
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {self.directory}")
+
+    def _dispatch(self, name: Optional[str]):
+        for callback in self._subscribers:
+            try:
+                callback(name)
+            except Exception as e:
+                logger.warning(f"Directory watcher callback error: {e}")
+
+    def _on_readable(self):
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            logger.warning(f"inotify read error: {e}")
+            return
+        names = []
+        rescan = False
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            _wd, mask, _cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            raw_name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            if mask & (IN_Q_OVERFLOW | IN_IGNORED | IN_DELETE_SELF | IN_MOVE_SELF):
+                rescan = True
+                if mask & (IN_IGNORED | IN_DELETE_SELF | IN_MOVE_SELF):
+                    # Directory went away; watch it again once it is recreated
+                    try:
+                        self._add_watch()
+                    except Exception as e:
+                        logger.warning(f"Failed to re-watch {self.directory}: {e}")
+            elif raw_name:
+                name = os.fsdecode(raw_name)
+                if name not in names:
+                    names.append(name)
+        if rescan:
+            self._dispatch(None)
+            return
+        for name in names:
+            self._dispatch(name)
+
+    async def _poll_loop(self):
+        while True:
+            await asyncio.sleep(POLL_INTERVAL_SECONDS)
+            self._dispatch(None)
+
+
+# Shared watcher on the logs directory (pidfiles, stop flags, manager pidfiles)
+LOGS_WATCHER = DirectoryWatcher(LOGS_DIR, IN_CLOSE_WRITE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO)
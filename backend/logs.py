@@ -1,14 +1,17 @@
 """Log reading, rotation, and maintenance utilities."""
 
-import json
+import mmap
+import os
 import shutil
+import struct
+import threading
 from collections import deque
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import List, Optional, Tuple
 
 from .config import (
-    LOGS_DIR, LOG_INDEX_STRIDE, LOG_INDEX_CACHE, logger,
+    LOGS_DIR, LOG_INDEX_STRIDE, LOG_INDEX_CACHE, LOG_INDEX_CACHE_SIZE, logger,
     MAX_LOG_BYTES, MAX_LOG_BACKUPS, MAX_TOTAL_LOG_BYTES,
 )
 from .services import extract_log_level
@@ -38,47 +41,192 @@ def get_log_chain(service: str) -> List[Path]:
 
 # ---------- Index ----------
 
-def load_log_index(log_file: Path) -> Dict:
-    key = str(log_file)
-    try:
-        stat = log_file.stat()
-    except Exception:
-        return {"stride": LOG_INDEX_STRIDE, "offsets": [0], "total_lines": 0, "size": 0, "mtime": 0}
-    cached = LOG_INDEX_CACHE.get(key)
-    if cached and cached.get("mtime") == stat.st_mtime and cached.get("size") == stat.st_size:
-        return cached
-    idx_path = log_file.with_suffix(log_file.suffix + ".idx")
-    if idx_path.exists():
-        try:
-            data = json.loads(idx_path.read_text(encoding="utf-8"))
-            if data.get("mtime") == stat.st_mtime and data.get("size") == stat.st_size and data.get("stride") == LOG_INDEX_STRIDE:
-                LOG_INDEX_CACHE[key] = data
-                return data
-        except Exception:
-            pass
-    offsets = [0]
-    total_lines = 0
+LOG_INDEX_CHUNK = 1024 * 1024
+LOG_INDEX_MAGIC = b"SCLI"
+LOG_INDEX_VERSION = 1
+# magic, version, stride, log inode, log size, indexed bytes, complete lines, offset count;
+# followed by `count` little-endian uint64 byte offsets, one per stride lines
+_INDEX_HEADER = struct.Struct("<4sIIQQQQQ")
+_INDEX_OFFSET = struct.Struct("<Q")
+
+_index_lock = threading.Lock()
+
+
+class LogIndex:
+    """Line index of one log file: the byte offset of every stride-th line.
+
+    Offsets persisted in the .idx sidecar are read straight from an mmap of
+    it, so opening the index of a huge log costs one header read; `tail`
+    holds offsets not written to the sidecar (only if writing it failed).
+    """
+
+    __slots__ = ("stride", "inode", "size", "indexed", "lines", "total_lines", "_mm", "_stored", "_tail")
+
+    def __init__(self, stride: int, inode: int, size: int, indexed: int, lines: int,
+                 mm: Optional[mmap.mmap] = None, stored: int = 0, tail: Optional[List[int]] = None):
+        self.stride = stride
+        self.inode = inode
+        self.size = size                # log bytes covered
+        self.indexed = indexed          # byte after the last complete line
+        self.lines = lines              # complete lines
+        # A trailing partial line still counts until the next extension completes it
+        self.total_lines = lines + (1 if size > indexed else 0)
+        self._mm = mm
+        self._stored = stored
+        self._tail = tail if tail is not None else []
+
+    def __len__(self) -> int:
+        return self._stored + len(self._tail)
+
+    def offset(self, bucket: int) -> int:
+        if bucket < self._stored:
+            return _INDEX_OFFSET.unpack_from(self._mm, _INDEX_HEADER.size + bucket * _INDEX_OFFSET.size)[0]
+        return self._tail[bucket - self._stored]
+
+    def header(self, count: int) -> bytes:
+        return _INDEX_HEADER.pack(LOG_INDEX_MAGIC, LOG_INDEX_VERSION, self.stride, self.inode,
+                                  self.size, self.indexed, self.lines, count)
+
+
+def _empty_index(inode: int = 0) -> LogIndex:
+    return LogIndex(LOG_INDEX_STRIDE, inode, 0, 0, 0, tail=[0])
+
+
+def _extend_index(log_file: Path, base: LogIndex, size: int) -> Tuple[LogIndex, List[int]]:
+    """Index the bytes of `log_file` after base.indexed; returns the new index and its new offsets.
+
+    Only complete lines are indexed, so a partial last line is read again
+    from base.indexed once it is complete.
+    """
+    stride = base.stride
+    new_offsets: List[int] = []
+    lines = base.lines
+    indexed = position = base.indexed
     with open(log_file, "rb") as f:
-        while True:
-            line = f.readline()
-            if not line:
+        f.seek(position)
+        while position < size:
+            chunk = f.read(min(LOG_INDEX_CHUNK, size - position))
+            if not chunk:
                 break
-            total_lines += 1
-            if total_lines % LOG_INDEX_STRIDE == 0:
-                offsets.append(f.tell())
-    data = {
-        "stride": LOG_INDEX_STRIDE,
-        "offsets": offsets,
-        "total_lines": total_lines,
-        "size": stat.st_size,
-        "mtime": stat.st_mtime,
-    }
+            count = chunk.count(b"\n")
+            if count:
+                needed = stride - lines % stride
+                pos = -1
+                while count >= needed:
+                    for _ in range(needed):
+                        pos = chunk.find(b"\n", pos + 1)
+                    lines += needed
+                    count -= needed
+                    new_offsets.append(position + pos + 1)
+                    needed = stride
+                lines += count
+                indexed = position + chunk.rfind(b"\n") + 1
+            position += len(chunk)
+    index = LogIndex(stride, base.inode, position, indexed, lines, base._mm, base._stored, base._tail + new_offsets)
+    return index, new_offsets
+
+
+def _index_extends(log_file: Path, index: LogIndex, stat) -> bool:
+    """Whether `index` describes a prefix of the file: same inode, not truncated.
+
+    A log truncated and regrown past the indexed size between two requests
+    is caught by checking that the last indexed byte is still a newline.
+    """
+    if index.stride != LOG_INDEX_STRIDE or index.inode != stat.st_ino:
+        return False
+    if stat.st_size < index.size or index.indexed > stat.st_size:
+        return False
+    if index.indexed == 0:
+        return True
+    try:
+        with open(log_file, "rb") as f:
+            f.seek(index.indexed - 1)
+            return f.read(1) == b"\n"
+    except OSError:
+        return False
+
+
+def _open_index_file(idx_path: Path) -> Optional[LogIndex]:
+    """Map an .idx sidecar; None if it is missing, from an older format, or corrupt."""
     try:
-        idx_path.write_text(json.dumps(data), encoding="utf-8")
+        with open(idx_path, "rb") as f:
+            length = os.fstat(f.fileno()).st_size
+            if length < _INDEX_HEADER.size + _INDEX_OFFSET.size:
+                return None
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    magic, version, stride, inode, size, indexed, lines, count = _INDEX_HEADER.unpack_from(mm)
+    if (magic != LOG_INDEX_MAGIC or version != LOG_INDEX_VERSION or count < 1 or indexed > size
+            or length < _INDEX_HEADER.size + count * _INDEX_OFFSET.size):
+        mm.close()
+        return None
+    return LogIndex(stride, inode, size, indexed, lines, mm, count)
+
+
+def _write_index_file(idx_path: Path, index: LogIndex, new_offsets: List[int], append: bool) -> LogIndex:
+    """Persist `index` and return it re-mapped from the sidecar (or as is, if writing fails).
+
+    `append` adds `new_offsets` after the stored ones and rewrites the
+    header in place; otherwise the sidecar is replaced as a whole.
+    """
+    count = len(index)
+    try:
+        if append:
+            with open(idx_path, "r+b") as f:
+                start = _INDEX_HEADER.size + (count - len(new_offsets)) * _INDEX_OFFSET.size
+                os.pwrite(f.fileno(), struct.pack(f"<{len(new_offsets)}Q", *new_offsets), start)
+                os.pwrite(f.fileno(), index.header(count), 0)
+        else:
+            tmp_path = idx_path.with_name(idx_path.name + ".tmp")
+            with open(tmp_path, "wb") as f:
+                f.write(index.header(count))
+                f.write(struct.pack(f"<{count}Q", *(index.offset(i) for i in range(count))))
+            os.replace(tmp_path, idx_path)
+    except OSError:
+        return index
+    return _open_index_file(idx_path) or index
+
+
+def _cache_put(key: str, index: LogIndex):
+    LOG_INDEX_CACHE[key] = index
+    LOG_INDEX_CACHE.move_to_end(key)
+    while len(LOG_INDEX_CACHE) > LOG_INDEX_CACHE_SIZE:
+        LOG_INDEX_CACHE.popitem(last=False)
+
+
+def load_log_index(log_file: Path) -> LogIndex:
+    """Line index of `log_file`, extended over appended bytes rather than rebuilt.
+
+    A full rescan happens only for a new file (inode change, e.g. rotation)
+    or a truncated one. New stride offsets are appended to the .idx sidecar;
+    a sidecar that lags behind the log is extended like the cache.
+    """
+    key = str(log_file)
+    try:
+        stat = log_file.stat()
     except Exception:
-        pass
-    LOG_INDEX_CACHE[key] = data
-    return data
+        return _empty_index()
+    with _index_lock:
+        cached = LOG_INDEX_CACHE.get(key)
+        if cached is not None and cached.inode == stat.st_ino and cached.size == stat.st_size:
+            LOG_INDEX_CACHE.move_to_end(key)
+            return cached
+        idx_path = log_file.with_suffix(log_file.suffix + ".idx")
+        base = None
+        if cached is not None and _index_extends(log_file, cached, stat):
+            base = cached
+        else:
+            stored = _open_index_file(idx_path)
+            if stored is not None and _index_extends(log_file, stored, stat):
+                base = stored
+        index, new_offsets = _extend_index(log_file, base or _empty_index(stat.st_ino), stat.st_size)
+        if base is None or new_offsets:
+            # Offsets only held in memory (a failed earlier write) force a full rewrite
+            append = base is not None and base._mm is not None and not base._tail
+            index = _write_index_file(idx_path, index, new_offsets, append)
+        _cache_put(key, index)
+        return index
 
 
 # ---------- Chained read ----------
@@ -87,8 +235,7 @@ def get_chained_total_lines(chain: List[Path]) -> Tuple[int, List[Tuple[Path, in
     total = 0
     file_lines = []
     for f in chain:
-        idx = load_log_index(f)
-        n = idx.get("total_lines", 0)
+        n = load_log_index(f).total_lines
         file_lines.append((f, n))
         total += n
     return total, file_lines
@@ -96,16 +243,15 @@ def get_chained_total_lines(chain: List[Path]) -> Tuple[int, List[Tuple[Path, in
 
 def read_log_lines(log_file: Path, start_line: int, max_lines: int) -> Tuple[List[Tuple[int, str]], int]:
     index = load_log_index(log_file)
-    total_lines = index.get("total_lines", 0)
+    total_lines = index.total_lines
     if total_lines <= 0:
         return [], 0
     if start_line < 0:
         start_line = max(total_lines + start_line, 0)
     start_line = min(start_line, total_lines)
-    stride = index.get("stride", LOG_INDEX_STRIDE)
-    offsets = index.get("offsets", [0])
-    bucket = start_line // stride
-    byte_offset = offsets[bucket] if bucket < len(offsets) else 0
+    stride = index.stride
+    bucket = min(start_line // stride, len(index) - 1)
+    byte_offset = index.offset(bucket)
     current_line = bucket * stride
     results: List[Tuple[int, str]] = []
     with open(log_file, "rb") as f:
@@ -0,0 +1,146 @@
+"""Shared tailer that keeps the last non-empty line of every service log.
+
+Log writes mark a file dirty through LOGS_WATCHER (IN_MODIFY); a flush task
+then reads only the bytes appended since the previous flush. Status builders
+read LOG_TAILER.last_line() and never open log files themselves.
+"""
+
+import asyncio
+import os
+from pathlib import Path
+from typing import Dict, Optional, Set
+
+from .config import LOGS_DIR, logger
+from .inotify import LOGS_WATCHER, IN_MODIFY
+
+TAIL_BYTES = 500            # same window the status builder used to read
+MAX_LINE_CHARS = 100
+FLUSH_INTERVAL_SECONDS = 0.5
+
+
+def last_line_of(data: bytes) -> Optional[str]:
+    """Last non-empty line in `data`, stripped and cut to MAX_LINE_CHARS."""
+    content = data.decode('utf-8', errors='ignore')
+    for line in reversed(content.split('\n')):
+        if line.strip():
+            return line.strip()[:MAX_LINE_CHARS]
+    return None
+
+
+def read_last_log_line(log_file: Path) -> Optional[str]:
+    """Read the tail of `log_file` directly (used when the tailer is not running)."""
+    try:
+        if log_file.exists() and log_file.stat().st_size > 0:
+            with open(log_file, 'rb') as f:
+                f.seek(0, 2)
+                read_size = min(TAIL_BYTES, f.tell())
+                f.seek(-read_size, 2)
+                return last_line_of(f.read())
+    except Exception:
+        pass
+    return None
+
+
+class _TailState:
+    __slots__ = ("inode", "offset", "tail", "last_line")
+
+    def __init__(self):
+        self.inode = None
+        self.offset = 0
+        self.tail = b""
+        self.last_line: Optional[str] = None
+
+
+class LogTailer:
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self.active = False
+        self._states: Dict[str, _TailState] = {}    # log file name -> state
+        self._dirty: Set[str] = set()
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def start(self):
+        LOGS_WATCHER.add_mask(IN_MODIFY)
+        LOGS_WATCHER.subscribe(self._on_file_event)
+        self._mark_all_dirty()
+        self._flush(self._take_dirty())
+        self.active = True
+        self._flush_task = asyncio.create_task(self._flush_loop())
+
+    def stop(self):
+        self.active = False
+        if self._flush_task:
+            self._flush_task.cancel()
+            self._flush_task = None
+
+    def covers(self, log_file: Path) -> bool:
+        return self.active and log_file.parent == self.directory
+
+    def last_line(self, log_file: Path) -> Optional[str]:
+        state = self._states.get(log_file.name)
+        return state.last_line if state else None
+
+    def _on_file_event(self, filename: Optional[str]):
+        if filename is None:
+            self._mark_all_dirty()
+        elif filename.endswith(".log"):
+            self._dirty.add(filename)
+
+    def _mark_all_dirty(self):
+        self._dirty.update(list(self._states))
+        try:
+            self._dirty.update(n for n in os.listdir(self.directory) if n.endswith(".log"))
+        except FileNotFoundError:
+            pass
+
+    def _take_dirty(self) -> Set[str]:
+        dirty, self._dirty = self._dirty, set()
+        return dirty
+
+    def _flush(self, dirty: Set[str]):
+        for filename in dirty:
+            try:
+                self._update(filename)
+            except Exception as e:
+                logger.debug(f"Log tailer failed on {filename}: {e}")
+
+    def _update(self, filename: str):
+        path = self.directory / filename
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            self._states.pop(filename, None)
+            return
+        state = self._states.get(filename)
+        if state is None:
+            state = self._states[filename] = _TailState()
+        if state.inode != st.st_ino or st.st_size < state.offset:
+            # New, rotated or truncated file: start over from its tail
+            state.inode = st.st_ino
+            state.offset = 0
+            state.tail = b""
+        if st.st_size == state.offset:
+            if state.offset == 0:
+                state.last_line = None
+            return
+        start = max(state.offset, st.st_size - TAIL_BYTES)
+        with open(path, 'rb') as f:
+            f.seek(start)
+            data = f.read(st.st_size - start)
+        if start > state.offset:
+            state.tail = b""
+        state.tail = (state.tail + data)[-TAIL_BYTES:]
+        state.offset = start + len(data)
+        state.last_line = last_line_of(state.tail)
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(FLUSH_INTERVAL_SECONDS)
+            if self._dirty:
+                try:
+                    await asyncio.to_thread(self._flush, self._take_dirty())
+                except Exception as e:
+                    logger.warning(f"Log tailer flush error: {e}")
+
+
+LOG_TAILER = LogTailer(LOGS_DIR)
@@ -0,0 +1,429 @@
+"""On-disk archive of per-service metrics, kept across restarts.
+
+Layout under logs/metrics/<service>/:
+
+    head.bin        append-only fixed-width records written by the sampler
+    compacting.bin  a rotated head being folded into segments
+    <day>.seg       compressed blocks for one UTC day (<day> = its start epoch)
+    rollups.bin     the in-memory rollup tiers, saved periodically and on shutdown
+
+A segment is a sequence of blocks. Each block holds a run of points with
+epochs stored as delta-of-delta and every metric column stored as the XOR
+of consecutive float32 bit patterns, then zlib-compressed: at a steady
+10 s cadence both transforms are almost all zero bytes. Background
+compaction moves the head into segments, merges the blocks of finished
+days into one and drops days past retention. Segments are read through
+mmap and only blocks overlapping the requested range are decoded.
+
+On startup only the last day of raw points is read back; the rollup tiers
+come from rollups.bin, so restoring does not decode the whole retention.
+"""
+
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from .config import METRICS_ARCHIVE_DIR, METRICS_RETENTION_DAYS
+from .metricstore import METRIC_FIELDS, _little_endian, _round
+
+SEGMENT_SECONDS = 24 * 3600
+
+# Files record how many METRIC_FIELDS they hold; fields are only ever appended,
+# so older files decode with the newer columns read as 0.
+_HEAD_HEADER = struct.Struct("<4sI")                # magic, field count
+_HEAD_MAGIC = b"MSH1"
+_BLOCK_HEADER = struct.Struct("<4sIqqIH")           # magic, count, first, last, payload bytes, field count
+_BLOCK_MAGIC = b"MSB1"
+_HEAD = "head.bin"
+_COMPACTING = "compacting.bin"
+_ROLLUPS = "rollups.bin"
+_ROLLUPS_HEADER = struct.Struct("<4sq")             # magic, newest raw epoch folded into the tiers
+_ROLLUPS_MAGIC = b"MRL1"
+
+# (epochs, {field: values}) — oldest first
+Columns = Tuple[array, Dict[str, array]]
+
+
+def _empty() -> Columns:
+    return array("q"), {field: array("f") for field in METRIC_FIELDS}
+
+
+def _record(fields: int) -> struct.Struct:
+    return struct.Struct(f"<q{fields}f")           # epoch, then one float per field
+
+
+def encode_block(epochs: array, columns: Dict[str, array]) -> bytes:
+    """Header plus zlib(delta-of-delta epochs, XOR-ed float32 columns)."""
+    dod = array("q")
+    prev, prev_delta = epochs[0], 0
+    for epoch in epochs:
+        delta = epoch - prev
+        dod.append(delta - prev_delta)
+        prev, prev_delta = epoch, delta
+    parts = [_little_endian(dod).tobytes()]
+    for field in METRIC_FIELDS:
+        bits = array("I", _little_endian(columns[field]).tobytes())
+        xored = array("I", bits)
+        for i in range(len(bits) - 1, 0, -1):
+            xored[i] = bits[i] ^ bits[i - 1]
+        parts.append(xored.tobytes())
+    payload = zlib.compress(b"".join(parts), 6)
+    header = _BLOCK_HEADER.pack(_BLOCK_MAGIC, len(epochs), epochs[0], epochs[-1], len(payload), len(METRIC_FIELDS))
+    return header + payload
+
+
+def decode_block(count: int, first: int, payload: bytes, fields: int = len(METRIC_FIELDS)) -> Columns:
+    raw = zlib.decompress(payload)
+    dod = _little_endian(array("q", raw[:count * 8]))
+    epochs = array("q")
+    epoch, delta = first, 0
+    for d in dod:
+        delta += d
+        epoch += delta
+        epochs.append(epoch)
+    columns = {}
+    offset = count * 8
+    for field in METRIC_FIELDS[fields:]:
+        columns[field] = array("f", bytes(count * 4))
+    for field in METRIC_FIELDS[:fields]:
+        bits = _little_endian(array("I", raw[offset:offset + count * 4]))
+        for i in range(1, count):
+            bits[i] ^= bits[i - 1]
+        columns[field] = _little_endian(array("f", bits.tobytes()))
+        offset += count * 4
+    return epochs, columns
+
+
+def _scan_blocks(data) -> List[Tuple[int, int, int, int, int, int]]:
+    """(first, last, count, payload offset, payload bytes, fields) per block; stops at a torn tail."""
+    blocks = []
+    offset = 0
+    while offset + _BLOCK_HEADER.size <= len(data):
+        magic, count, first, last, size, fields = _BLOCK_HEADER.unpack_from(data, offset)
+        start = offset + _BLOCK_HEADER.size
+        if magic != _BLOCK_MAGIC or start + size > len(data) or fields > len(METRIC_FIELDS):
+            break
+        blocks.append((first, last, count, start, size, fields))
+        offset = start + size
+    return blocks
+
+
+def _read_records(path: Path) -> Columns:
+    epochs, columns = _empty()
+    try:
+        data = path.read_bytes()
+    except FileNotFoundError:
+        return epochs, columns
+    if len(data) < _HEAD_HEADER.size or data[:4] != _HEAD_MAGIC:
+        return epochs, columns
+    _, fields = _HEAD_HEADER.unpack_from(data)
+    if fields > len(METRIC_FIELDS):
+        return epochs, columns
+    data = data[_HEAD_HEADER.size:]
+    record = _record(fields)
+    data = data[:len(data) - len(data) % record.size]      # drop a torn last record
+    for epoch, *values in record.iter_unpack(data):
+        epochs.append(epoch)
+        for field, value in zip(METRIC_FIELDS, values):
+            columns[field].append(value)
+        for field in METRIC_FIELDS[fields:]:
+            columns[field].append(0.0)
+    return epochs, columns
+
+
+def _head_fields(path: Path) -> Optional[int]:
+    """Field count of an existing head file, None if it is missing or has no valid header."""
+    try:
+        with open(path, "rb") as f:
+            header = f.read(_HEAD_HEADER.size)
+    except FileNotFoundError:
+        return None
+    if header[:4] != _HEAD_MAGIC or len(header) < _HEAD_HEADER.size:
+        return None
+    return _HEAD_HEADER.unpack(header)[1]
+
+
+def _append_columns(dest: Columns, src: Columns, start: Optional[float], end: Optional[float]):
+    """Append the points of `src` within [start, end] that are newer than `dest`'s last."""
+    epochs = src[0]
+    lo = bisect_left(epochs, start) if start is not None else 0
+    if len(dest[0]):
+        lo = max(lo, bisect_right(epochs, dest[0][-1]))
+    hi = bisect_right(epochs, end) if end is not None else len(epochs)
+    if lo >= hi:
+        return
+    dest[0].extend(epochs[lo:hi])
+    for field in METRIC_FIELDS:
+        dest[1][field].extend(src[1][field][lo:hi])
+
+
+class MetricsArchive:
+    """Per-service head files and compressed day segments under `directory`."""
+
+    def __init__(self, directory: Path, retention_days: int):
+        self.directory = directory
+        self.retention_seconds = retention_days * 24 * 3600
+        self._lock = threading.Lock()      # compaction vs. reads of segments/rotated heads
+        self._heads: Dict[str, object] = {}
+        self._last_epoch: Dict[str, int] = {}
+        self._block_index: Dict[Path, Tuple[Tuple[int, int], List[Tuple]]] = {}
+        self._record = _record(len(METRIC_FIELDS))
+
+    def _service_dir(self, service: str) -> Path:
+        return self.directory / service
+
+    # ---------- Writing (event loop) ----------
+
+    def append(self, service: str, epoch: int, values: Dict[str, float]):
+        """Append one sample to the service's head file. Epochs must increase."""
+        if epoch <= self._last_epoch.get(service, -1):
+            return
+        head = self._heads.get(service)
+        if head is None:
+            head = self._heads[service] = self._open_head(service)
+        head.write(self._record.pack(epoch, *(values.get(field, 0.0) for field in METRIC_FIELDS)))
+        self._last_epoch[service] = epoch
+
+    def _open_head(self, service: str):
+        service_dir = self._service_dir(service)
+        service_dir.mkdir(parents=True, exist_ok=True)
+        path = service_dir / _HEAD
+        if _head_fields(path) == len(METRIC_FIELDS):
+            return open(path, "ab", buffering=0)
+        # Missing, torn before its header, or holding another field count: start a new head
+        head = open(path, "wb", buffering=0)
+        head.write(_HEAD_HEADER.pack(_HEAD_MAGIC, len(METRIC_FIELDS)))
+        return head
+
+    def rotate(self) -> List[str]:
+        """Move every head aside for compaction; returns the services rotated.
+
+        A head left over from an interrupted compaction is kept and compacted
+        first, new samples then go to a fresh head.
+        """
+        rotated = []
+        if not self.directory.exists():
+            return rotated
+        for service_dir in self.directory.iterdir():
+            if not service_dir.is_dir():
+                continue
+            service = service_dir.name
+            head = self._heads.pop(service, None)
+            if head is not None:
+                head.close()
+            if not (service_dir / _COMPACTING).exists() and (service_dir / _HEAD).exists():
+                os.replace(service_dir / _HEAD, service_dir / _COMPACTING)
+            rotated.append(service)
+        return rotated
+
+    def close(self):
+        for head in self._heads.values():
+            head.close()
+        self._heads.clear()
+
+    # ---------- Compaction (worker thread) ----------
+
+    def compact(self, services: List[str], now: Optional[float] = None):
+        """Fold rotated heads into day segments, merge finished days, apply retention."""
+        now = time.time() if now is None else now
+        for service in services:
+            service_dir = self._service_dir(service)
+            with self._lock:
+                self._compact_head(service_dir)
+                for path in self._segments(service_dir):
+                    day = int(path.stem)
+                    if day + SEGMENT_SECONDS <= now - self.retention_seconds:
+                        path.unlink()
+                        self._block_index.pop(path, None)
+                    elif day + SEGMENT_SECONDS <= now:
+                        self._merge_segment(path)
+
+    def _compact_head(self, service_dir: Path):
+        pending = service_dir / _COMPACTING
+        epochs, columns = _read_records(pending)
+        if len(epochs):
+            # After a crash between writing blocks and unlinking, skip what is already archived
+            i = 0
+            segments = self._segments(service_dir)
+            blocks = self._blocks(segments[-1]) if segments else []
+            if blocks:
+                i = bisect_right(epochs, blocks[-1][1])
+            while i < len(epochs):
+                day = epochs[i] - epochs[i] % SEGMENT_SECONDS
+                j = bisect_left(epochs, day + SEGMENT_SECONDS, i)
+                block = encode_block(epochs[i:j], {f: columns[f][i:j] for f in METRIC_FIELDS})
+                path = service_dir / f"{day}.seg"
+                with open(path, "ab") as f:
+                    f.write(block)
+                    f.flush()
+                    os.fsync(f.fileno())
+                i = j
+        if pending.exists():
+            pending.unlink()
+
+    def _merge_segment(self, path: Path):
+        blocks = self._blocks(path)
+        if len(blocks) <= 1:
+            return
+        merged = _empty()
+        self._read_segment(path, merged, None, None)
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "wb") as f:
+            f.write(encode_block(*merged))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    # ---------- Reading (worker thread) ----------
+
+    @staticmethod
+    def _segments(service_dir: Path) -> List[Path]:
+        return sorted(service_dir.glob("*.seg"), key=lambda p: int(p.stem))
+
+    def _blocks(self, path: Path) -> List[Tuple]:
+        """Block index of a segment, cached until the file changes."""
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            return []
+        key = (st.st_size, st.st_mtime_ns)
+        cached = self._block_index.get(path)
+        if cached and cached[0] == key:
+            return cached[1]
+        if st.st_size == 0:
+            blocks = []
+        else:
+            with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                blocks = _scan_blocks(data)
+        self._block_index[path] = (key, blocks)
+        return blocks
+
+    def _read_segment(self, path: Path, dest: Columns, start: Optional[float], end: Optional[float]):
+        blocks = self._blocks(path)
+        if not blocks:
+            return
+        lo = bisect_left([b[1] for b in blocks], start) if start is not None else 0
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            for first, last, count, offset, size, fields in blocks[lo:]:
+                if end is not None and first > end:
+                    break
+                _append_columns(dest, decode_block(count, first, data[offset:offset + size], fields), start, end)
+
+    def read(self, service: str, start: Optional[float] = None, end: Optional[float] = None,
+             limit: int = 0) -> Columns:
+        """Archived points of `service` with start <= epoch <= end, oldest first.
+
+        With a `limit` only the newest `limit` of them are returned, and
+        blocks older than those are not decoded.
+        """
+        service_dir = self._service_dir(service)
+        if not service_dir.is_dir():
+            return _empty()
+        with self._lock:
+            if limit:
+                return self._read_newest(service_dir, start, end, limit)
+            result = _empty()
+            for path in self._segments(service_dir):
+                day = int(path.stem)
+                if start is not None and day + SEGMENT_SECONDS <= start:
+                    continue
+                if end is not None and day > end:
+                    break
+                self._read_segment(path, result, start, end)
+            for name in (_COMPACTING, _HEAD):
+                _append_columns(result, _read_records(service_dir / name), start, end)
+        return result
+
+    def _read_newest(self, service_dir: Path, start: Optional[float], end: Optional[float], limit: int) -> Columns:
+        """read() with a limit: walk heads, then segment blocks, newest first until `limit` points."""
+        chunks: List[Columns] = []
+        held, oldest = 0, None
+
+        def take(chunk: Columns) -> bool:
+            nonlocal held, oldest
+            epochs = chunk[0]
+            lo = bisect_left(epochs, start) if start is not None else 0
+            hi = bisect_right(epochs, end) if end is not None else len(epochs)
+            if oldest is not None:
+                hi = min(hi, bisect_left(epochs, oldest))     # overlap left by an interrupted compaction
+            if lo < hi:
+                chunks.append(chunk)
+                held += hi - lo
+                oldest = epochs[lo]
+            return held >= limit
+
+        done = take(_read_records(service_dir / _HEAD)) or take(_read_records(service_dir / _COMPACTING))
+        for path in reversed(self._segments(service_dir) if not done else []):
+            day = int(path.stem)
+            if end is not None and day > end:
+                continue
+            if start is not None and day + SEGMENT_SECONDS <= start:
+                break
+            blocks = self._blocks(path)
+            with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                for first, last, count, offset, size, fields in reversed(blocks):
+                    if end is not None and first > end:
+                        continue
+                    if start is not None and last < start:
+                        break
+                    if take(decode_block(count, first, data[offset:offset + size], fields)):
+                        done = True
+                        break
+            if done:
+                break
+        result = _empty()
+        for chunk in reversed(chunks):
+            _append_columns(result, chunk, start, end)
+        if len(result[0]) > limit:
+            cut = len(result[0]) - limit
+            result = result[0][cut:], {field: column[cut:] for field, column in result[1].items()}
+        return result
+
+    def points(self, service: str, start: Optional[float], end: Optional[float], limit: int) -> List[Dict]:
+        """API-shaped points, newest `limit` of the range."""
+        epochs, columns = self.read(service, start, end, limit)
+        return [
+            {"timestamp": datetime.fromtimestamp(epochs[i]).isoformat(),
+             **{field: _round(field, columns[field][i]) for field in METRIC_FIELDS}}
+            for i in range(len(epochs))
+        ]
+
+    # ---------- Rollup tiers ----------
+
+    def save_rollups(self, service: str, rolled_up_to: int, image: bytes):
+        """Replace the saved tiers of `service` (worker thread).
+
+        `image` is MetricsHistory.rollups_bytes(), `rolled_up_to` the newest
+        raw epoch folded into it.
+        """
+        service_dir = self._service_dir(service)
+        service_dir.mkdir(parents=True, exist_ok=True)
+        path = service_dir / _ROLLUPS
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "wb") as f:
+            f.write(_ROLLUPS_HEADER.pack(_ROLLUPS_MAGIC, rolled_up_to))
+            f.write(image)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    def load_rollups(self, service: str) -> Optional[Tuple[int, bytes]]:
+        """(rolled_up_to, image) as passed to save_rollups(), or None if nothing usable is saved."""
+        try:
+            data = (self._service_dir(service) / _ROLLUPS).read_bytes()
+        except FileNotFoundError:
+            return None
+        if len(data) < _ROLLUPS_HEADER.size or data[:4] != _ROLLUPS_MAGIC:
+            return None
+        return _ROLLUPS_HEADER.unpack_from(data)[1], data[_ROLLUPS_HEADER.size:]
+
+
+METRICS_ARCHIVE = MetricsArchive(METRICS_ARCHIVE_DIR, METRICS_RETENTION_DAYS)
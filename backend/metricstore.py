@@ -0,0 +1,483 @@
+"""Compact columnar storage for per-service metrics history.
+
+Each service keeps a fixed-capacity ring buffer of parallel arrays: epoch
+seconds as int64 and one float32 column per metric. A point costs 8 bytes
+plus 4 per metric instead of a dict with an ISO timestamp string and boxed
+values; dicts are only built when a range is serialized for the API.
+
+Next to the raw 10 s ring, the sampler maintains rollup tiers (1 min, 10 min,
+1 h) holding min/max/avg/last per bucket, updated incrementally on every
+append. Queries pick the coarsest tier that still satisfies the requested
+resolution, so long ranges cost the same as short ones. Older raw points
+live in the on-disk archive (metricsarchive.py), which also keeps a copy of
+the rollup tiers so a restart does not have to rebuild them from raw points.
+"""
+
+import struct
+import sys
+from abc import ABC, abstractmethod
+from array import array
+from bisect import bisect_left, bisect_right
+from collections.abc import Sequence
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+# New fields are only ever appended: archived blocks store columns in this order.
+METRIC_FIELDS = (
+    "cpu_percent", "memory_mb", "read_mb_s", "write_mb_s",
+    "open_fds", "threads", "tcp_connections",
+    "major_faults_s", "voluntary_ctx_switches_s", "involuntary_ctx_switches_s",
+)
+_FIELD_DECIMALS = {
+    "cpu_percent": 2, "memory_mb": 2, "read_mb_s": 3, "write_mb_s": 3,
+    "open_fds": 1, "threads": 1, "tcp_connections": 1,
+    "major_faults_s": 2, "voluntary_ctx_switches_s": 2, "involuntary_ctx_switches_s": 2,
+}
+
+# (bucket seconds, buckets kept, name)
+ROLLUP_TIERS = (
+    (60, 2 * 24 * 60, "1m"),        # 2 days
+    (600, 14 * 24 * 6, "10m"),      # 14 days
+    (3600, 90 * 24, "1h"),          # 90 days
+)
+
+
+# Serialized rollup ring: magic, step seconds, rows, field count; then the
+# epoch, count, min, max, avg and last columns, oldest row first.
+_ROLLUP_HEADER = struct.Struct("<4sIIH")
+_ROLLUP_MAGIC = b"MRR1"
+
+
+def _round(field: str, value: float) -> float:
+    return round(value, _FIELD_DECIMALS[field])
+
+
+def _little_endian(a: array) -> array:
+    if sys.byteorder != "little":
+        a = array(a.typecode, a)
+        a.byteswap()
+    return a
+
+
+class _EpochView(Sequence):
+    """Read-only logical view of a ring's epoch column, for bisect."""
+
+    def __init__(self, ring: "_Ring"):
+        self._ring = ring
+
+    def __len__(self) -> int:
+        return len(self._ring)
+
+    def __getitem__(self, index: int) -> int:
+        return self._ring.epoch_at(index)
+
+
+class _Ring(ABC):
+    """Index bookkeeping shared by the raw and rollup rings.
+
+    Columns grow with the data until `capacity`, then wrap. Epochs never
+    decrease along the ring, so time ranges are found by binary search.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._ts = array("q")
+        self._start = 0
+        self._len = 0
+        self._epochs = _EpochView(self)
+
+    def __len__(self) -> int:
+        return self._len
+
+    @abstractmethod
+    def _columns(self) -> List[array]:
+        """Every per-entry column except the epochs, in a fixed order."""
+
+    def _next_slot(self) -> int:
+        """Slot for a new entry; evicts the oldest entry once the ring is full."""
+        if self._len < self.capacity:
+            if len(self._ts) < self.capacity:
+                for column in [self._ts] + self._columns():
+                    column.append(0)
+            slot = (self._start + self._len) % self.capacity
+            self._len += 1
+        else:
+            slot = self._start
+            self._start = (self._start + 1) % self.capacity
+        return slot
+
+    def _slot(self, index: int) -> int:
+        return (self._start + index) % self.capacity
+
+    def epoch_at(self, index: int) -> int:
+        return self._ts[self._slot(index)]
+
+    def last_epoch(self) -> Optional[int]:
+        return self.epoch_at(self._len - 1) if self._len else None
+
+    def range_indices(self, start_epoch: Optional[float] = None, end_epoch: Optional[float] = None) -> range:
+        """Logical indices of entries with start_epoch <= epoch <= end_epoch, in O(log n)."""
+        lo = bisect_left(self._epochs, start_epoch) if start_epoch is not None else 0
+        hi = bisect_right(self._epochs, end_epoch) if end_epoch is not None else self._len
+        return range(lo, max(lo, hi))
+
+    def nbytes(self) -> int:
+        """Bytes held by the column arrays."""
+        return sum(c.itemsize * len(c) for c in [self._ts] + self._columns())
+
+    def _logical(self, column: array) -> array:
+        """Copy of a column in logical order (oldest first)."""
+        return column[self._start:self._len] + column[:self._start]
+
+
+class MetricsRingBuffer(_Ring):
+    """Fixed-capacity ring of raw (epoch, METRIC_FIELDS...) points, oldest first."""
+
+    def __init__(self, capacity: int):
+        super().__init__(capacity)
+        self._cols = {field: array("f") for field in METRIC_FIELDS}
+
+    def _columns(self) -> List[array]:
+        return list(self._cols.values())
+
+    def append(self, epoch: int, values: Dict[str, float]):
+        if self._len:
+            # Keep the column sorted even if the wall clock steps back
+            epoch = max(epoch, self.last_epoch())
+        slot = self._next_slot()
+        self._ts[slot] = epoch
+        for field, column in self._cols.items():
+            column[slot] = values.get(field, 0.0)
+
+    def point(self, index: int) -> Dict:
+        """The point at logical `index` (0 = oldest) as an API dict."""
+        slot = self._slot(index)
+        point = {"timestamp": datetime.fromtimestamp(self._ts[slot]).isoformat()}
+        for field, column in self._cols.items():
+            point[field] = _round(field, column[slot])
+        return point
+
+    def last(self) -> Optional[Dict]:
+        return self.point(self._len - 1) if self._len else None
+
+    def row(self, index: int) -> Tuple[int, int, Dict[str, Tuple[float, float, float, float]]]:
+        """(epoch, count, {field: (min, max, avg, last)}) — same shape as a rollup row."""
+        slot = self._slot(index)
+        return self._ts[slot], 1, {
+            field: (column[slot],) * 4 for field, column in self._cols.items()
+        }
+
+
+class RollupRing(_Ring):
+    """Ring of fixed-width time buckets with min/max/avg/last per metric."""
+
+    def __init__(self, step_seconds: int, capacity: int, name: str = ""):
+        super().__init__(capacity)
+        self.step_seconds = step_seconds
+        self.name = name or f"{step_seconds}s"
+        self._count = array("I")
+        self._min = {field: array("f") for field in METRIC_FIELDS}
+        self._max = {field: array("f") for field in METRIC_FIELDS}
+        self._avg = {field: array("f") for field in METRIC_FIELDS}
+        self._last = {field: array("f") for field in METRIC_FIELDS}
+
+    def _columns(self) -> List[array]:
+        columns = [self._count]
+        for group in (self._min, self._max, self._avg, self._last):
+            columns.extend(group.values())
+        return columns
+
+    def add(self, epoch: int, values: Dict[str, float]):
+        """Fold one raw point into its bucket, opening a new bucket when needed."""
+        bucket = epoch - epoch % self.step_seconds
+        if self._len and bucket <= self.last_epoch():
+            # Same bucket (or the clock stepped back): update the newest bucket in place
+            slot = self._slot(self._len - 1)
+            count = self._count[slot] + 1
+            self._count[slot] = count
+            for field in METRIC_FIELDS:
+                value = values.get(field, 0.0)
+                if value < self._min[field][slot]:
+                    self._min[field][slot] = value
+                if value > self._max[field][slot]:
+                    self._max[field][slot] = value
+                avg = self._avg[field][slot]
+                self._avg[field][slot] = avg + (value - avg) / count
+                self._last[field][slot] = value
+            return
+        slot = self._next_slot()
+        self._ts[slot] = bucket
+        self._count[slot] = 1
+        for field in METRIC_FIELDS:
+            value = values.get(field, 0.0)
+            self._min[field][slot] = value
+            self._max[field][slot] = value
+            self._avg[field][slot] = value
+            self._last[field][slot] = value
+
+    def extend(self, epochs: Sequence[int], columns: Dict[str, Sequence[float]]):
+        """Bulk `add` of sorted points, aggregating whole buckets at once."""
+        n = len(epochs)
+        # Only the newest `capacity` buckets can survive, skip the rest up front
+        oldest = epochs[-1] - epochs[-1] % self.step_seconds - (self.capacity - 1) * self.step_seconds if n else 0
+        i = bisect_left(epochs, oldest)
+        while i < n:
+            bucket = epochs[i] - epochs[i] % self.step_seconds
+            j = bisect_left(epochs, bucket + self.step_seconds, i)
+            if self._len and bucket <= self.last_epoch():
+                for k in range(i, j):
+                    self.add(epochs[k], {field: columns[field][k] for field in METRIC_FIELDS})
+                i = j
+                continue
+            slot = self._next_slot()
+            self._ts[slot] = bucket
+            self._count[slot] = j - i
+            for field in METRIC_FIELDS:
+                values = columns[field][i:j]
+                self._min[field][slot] = min(values)
+                self._max[field][slot] = max(values)
+                self._avg[field][slot] = sum(values) / (j - i)
+                self._last[field][slot] = values[-1]
+            i = j
+
+    def to_bytes(self) -> bytes:
+        parts = [_ROLLUP_HEADER.pack(_ROLLUP_MAGIC, self.step_seconds, self._len, len(METRIC_FIELDS))]
+        parts.extend(_little_endian(self._logical(column)).tobytes() for column in [self._ts] + self._columns())
+        return b"".join(parts)
+
+    def _install(self, columns: List[array]):
+        """Take over parsed to_bytes() columns, dropping rows beyond the capacity oldest first."""
+        fields = (len(columns) - 2) // 4
+        rows = len(columns[0])
+        keep = min(rows, self.capacity)
+        self._ts, self._count = columns[0][rows - keep:], columns[1][rows - keep:]
+        for g, group in enumerate((self._min, self._max, self._avg, self._last)):
+            for i, field in enumerate(METRIC_FIELDS):
+                # Fields the image predates read as 0
+                group[field] = columns[2 + g * fields + i][rows - keep:] if i < fields else array("f", bytes(keep * 4))
+        self._start, self._len = 0, keep
+
+    def row(self, index: int) -> Tuple[int, int, Dict[str, Tuple[float, float, float, float]]]:
+        slot = self._slot(index)
+        return self._ts[slot], self._count[slot], {
+            field: (self._min[field][slot], self._max[field][slot],
+                    self._avg[field][slot], self._last[field][slot])
+            for field in METRIC_FIELDS
+        }
+
+
+def _parse_rollup(data: bytes, offset: int) -> Tuple[int, List[array], int]:
+    """(step seconds, columns, offset after it) of the RollupRing.to_bytes() image at `offset`.
+
+    Raises ValueError for a truncated or foreign image.
+    """
+    if len(data) < offset + _ROLLUP_HEADER.size:
+        raise ValueError("truncated rollup header")
+    magic, step, rows, fields = _ROLLUP_HEADER.unpack_from(data, offset)
+    if magic != _ROLLUP_MAGIC or fields > len(METRIC_FIELDS):
+        raise ValueError("not a rollup image")
+    offset += _ROLLUP_HEADER.size
+    columns = [array("q"), array("I")] + [array("f") for _ in range(4 * fields)]
+    for column in columns:
+        size = rows * column.itemsize
+        if len(data) < offset + size:
+            raise ValueError("truncated rollup image")
+        column.frombytes(data[offset:offset + size])
+        if sys.byteorder != "little":
+            column.byteswap()
+        offset += size
+    return step, columns, offset
+
+
+def _aggregate_point(epoch: int, rows: List[Tuple]) -> Dict:
+    """Merge rollup-shaped rows (oldest first) into one API point with min/max/last."""
+    total = sum(count for _, count, _ in rows)
+    point = {"timestamp": datetime.fromtimestamp(epoch).isoformat()}
+    mins, maxs, lasts = {}, {}, {}
+    for field in METRIC_FIELDS:
+        point[field] = _round(field, sum(fields[field][2] * count for _, count, fields in rows) / total)
+        mins[field] = _round(field, min(fields[field][0] for _, _, fields in rows))
+        maxs[field] = _round(field, max(fields[field][1] for _, _, fields in rows))
+        lasts[field] = _round(field, rows[-1][2][field][3])
+    point.update({"min": mins, "max": maxs, "last": lasts, "samples": total})
+    return point
+
+
+def _group_rows(ring, indices: range, step: int, limit: int) -> List[Tuple[int, List[Tuple]]]:
+    """Rows of `indices` grouped into step-aligned buckets, oldest first; the newest `limit` buckets."""
+    groups: List[Tuple[int, List[Tuple]]] = []
+    for index in reversed(indices):
+        row = ring.row(index)
+        bucket = row[0] - row[0] % step
+        if groups and groups[-1][0] == bucket:
+            groups[-1][1].append(row)
+            continue
+        if limit and len(groups) >= limit:
+            break
+        groups.append((bucket, [row]))
+    return [(bucket, rows[::-1]) for bucket, rows in reversed(groups)]
+
+
+def align_series(histories: Dict[str, "MetricsHistory"], start_epoch: int, end_epoch: int, step: int,
+                 fields: Sequence[str]) -> Tuple[List[int], Dict[str, Dict[str, List[Optional[float]]]]]:
+    """Bucket starts from start to end plus, per service and field, a value or None per bucket."""
+    grid = list(range(start_epoch - start_epoch % step, end_epoch + 1, step))
+    position = {bucket: i for i, bucket in enumerate(grid)}
+    series = {}
+    for name, history in histories.items():
+        columns = {field: [None] * len(grid) for field in fields}
+        if grid:
+            for bucket, values in history.averages(grid[0], end_epoch, step, fields).items():
+                i = position.get(bucket)
+                if i is not None:
+                    for field in fields:
+                        columns[field][i] = values[field]
+        series[name] = columns
+    return grid, series
+
+
+def sum_series(series: Dict[str, Dict[str, List[Optional[float]]]], field: str, length: int) -> List[Optional[float]]:
+    """Per-bucket sum of `field` across services; None where no service has a value."""
+    totals: List[Optional[float]] = [None] * length
+    for columns in series.values():
+        for i, value in enumerate(columns[field]):
+            if value is not None:
+                totals[i] = value if totals[i] is None else totals[i] + value
+    return [_round(field, total) if total is not None else None for total in totals]
+
+
+def rank_services(series: Dict[str, Dict[str, List[Optional[float]]]], field: str) -> List[Tuple[str, float]]:
+    """(service, mean of `field` over its non-empty buckets), highest first."""
+    ranked = []
+    for name, columns in series.items():
+        values = [v for v in columns[field] if v is not None]
+        ranked.append((name, _round(field, sum(values) / len(values)) if values else 0.0))
+    ranked.sort(key=lambda item: item[1], reverse=True)
+    return ranked
+
+
+class MetricsHistory:
+    """Raw ring plus rollup tiers for one service."""
+
+    def __init__(self, raw_capacity: int, raw_interval: int, tiers=ROLLUP_TIERS):
+        self.raw = MetricsRingBuffer(raw_capacity)
+        self.raw_interval = raw_interval
+        self.tiers = [RollupRing(step, capacity, name) for step, capacity, name in tiers]
+
+    def __len__(self) -> int:
+        return len(self.raw)
+
+    def append(self, epoch: int, values: Dict[str, float]):
+        self.raw.append(epoch, values)
+        epoch = self.raw.last_epoch()
+        for tier in self.tiers:
+            tier.add(epoch, values)
+
+    def extend(self, epochs: Sequence[int], columns: Dict[str, Sequence[float]],
+               rolled_up_to: Optional[int] = None):
+        """Bulk-load sorted points newer than anything held, e.g. from the archive.
+
+        Points at or before `rolled_up_to` only go to the raw ring: the tiers
+        already hold them (see load_rollups()).
+        """
+        for i in range(max(0, len(epochs) - self.raw.capacity), len(epochs)):
+            self.raw.append(epochs[i], {field: columns[field][i] for field in METRIC_FIELDS})
+        if rolled_up_to is not None:
+            i = bisect_right(epochs, rolled_up_to)
+            epochs, columns = epochs[i:], {field: columns[field][i:] for field in METRIC_FIELDS}
+        for tier in self.tiers:
+            tier.extend(epochs, columns)
+
+    def rollups_bytes(self) -> bytes:
+        """Image of every rollup tier, for MetricsArchive.save_rollups()."""
+        return b"".join(tier.to_bytes() for tier in self.tiers)
+
+    def load_rollups(self, data: bytes):
+        """Replace the tiers with a rollups_bytes() image; tiers it lacks stay empty.
+
+        Raises ValueError for a damaged image.
+        """
+        tiers = {tier.step_seconds: tier for tier in self.tiers}
+        offset = 0
+        while offset < len(data):
+            step, columns, offset = _parse_rollup(data, offset)
+            if step in tiers:
+                tiers[step]._install(columns)
+
+    def covers(self, start_epoch: Optional[float]) -> bool:
+        """Whether the raw ring reaches back to `start_epoch`."""
+        return start_epoch is None or not len(self.raw) or start_epoch >= self.raw.epoch_at(0)
+
+    def last(self) -> Optional[Dict]:
+        return self.raw.last()
+
+    def _choose(self, start_epoch: Optional[float], step_seconds: int):
+        """Coarsest ring whose resolution is <= step_seconds.
+
+        Without a step the raw ring is used, unless the range starts before it
+        and a rollup still reaches back that far.
+        """
+        if step_seconds > 0:
+            chosen = self.raw
+            for tier in self.tiers:
+                if tier.step_seconds <= step_seconds and len(tier):
+                    chosen = tier
+            return chosen
+        if not self.covers(start_epoch):
+            for tier in self.tiers:
+                if len(tier) and tier.epoch_at(0) <= start_epoch:
+                    return tier
+            populated = [tier for tier in self.tiers if len(tier)]
+            if populated:
+                return populated[-1]
+        return self.raw
+
+    def query(self, start_epoch: Optional[float], end_epoch: Optional[float],
+              step_seconds: int, limit: int) -> Tuple[List[Dict], int, str]:
+        """Return (points, interval_seconds, tier name) for the newest `limit` buckets."""
+        ring = self._choose(start_epoch, step_seconds)
+        indices = ring.range_indices(start_epoch, end_epoch)
+        ring_step = ring.step_seconds if isinstance(ring, RollupRing) else self.raw_interval
+        name = ring.name if isinstance(ring, RollupRing) else "raw"
+
+        if ring is self.raw and step_seconds <= 0:
+            if limit and len(indices) > limit:
+                indices = indices[-limit:]
+            return [self.raw.point(i) for i in indices], self.raw_interval, name
+
+        step = max(step_seconds, ring_step)
+        points = [_aggregate_point(bucket, rows) for bucket, rows in _group_rows(ring, indices, step, limit)]
+        return points, step, name
+
+    def averages(self, start_epoch: Optional[float], end_epoch: Optional[float],
+                 step_seconds: int, fields: Sequence[str]) -> Dict[int, Dict[str, float]]:
+        """{bucket epoch: {field: mean}} at step_seconds resolution, for aligning services.
+
+        Reads the epoch/count/avg columns directly; building full rows is what
+        makes query() too slow to run for a hundred services at once.
+        """
+        ring = self._choose(start_epoch, step_seconds)
+        if isinstance(ring, RollupRing):
+            counts, means = ring._count, ring._avg
+        else:
+            counts, means = None, ring._cols
+        columns = [(field, means[field]) for field in fields]
+        sums: Dict[int, List[float]] = {}
+        for index in ring.range_indices(start_epoch, end_epoch):
+            slot = ring._slot(index)
+            epoch = ring._ts[slot]
+            bucket = epoch - epoch % step_seconds
+            weight = counts[slot] if counts is not None else 1
+            acc = sums.get(bucket)
+            if acc is None:
+                acc = sums[bucket] = [0] + [0.0] * len(columns)
+            acc[0] += weight
+            for k, (_, column) in enumerate(columns, 1):
+                acc[k] += column[slot] * weight
+        return {
+            bucket: {field: _round(field, acc[k] / acc[0]) for k, (field, _) in enumerate(columns, 1)}
+            for bucket, acc in sums.items()
+        }
+
+    def nbytes(self) -> int:
+        return self.raw.nbytes() + sum(tier.nbytes() for tier in self.tiers)
@@ -16,12 +16,15 @@ class ServiceStatus(BaseModel):
     last_log: Optional[str] = None
     scheduled_restart: Optional[Dict] = None
     depends_on: List[str] = []
+    heartbeat_age: Optional[float] = None         # seconds since the cached probe
+    heartbeat_latency_ms: Optional[float] = None
 
 
 class PlatformStatus(BaseModel):
     status: str
     services: List[ServiceStatus]
     timestamp: str
+    version: int = 0
 
 
 class LogEntry(BaseModel):
@@ -79,6 +82,7 @@ class DashboardStatus(BaseModel):
     services: List[ServiceStatus]
     metrics: SystemMetrics
     timestamp: str
+    version: int = 0
 
 
 class ServiceInfo(BaseModel):
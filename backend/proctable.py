@@ -0,0 +1,316 @@
+"""Per-tick process table built from a single scan of /proc.
+
+Resolving a service's process tree with psutil walks all of /proc once per
+service (children(recursive=True)). Instead, one scan per tick records
+pid -> ppid, create time, rss, cpu ticks, thread count and major faults for
+every process,
+and all consumers resolve their trees from that table.
+
+CPU% is measured against per-process baselines shared by every consumer
+(the metrics sampler, the process-tree view), keyed by (pid, create_time)
+so a recycled pid never inherits another process's ticks.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, Iterator, List, Optional
+
+import psutil
+
+PROC_DIR = "/proc"
+_CLK_TCK = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+# /proc/<pid>/stat state letters -> psutil status names
+_STATUS_NAMES = {
+    "R": "running", "S": "sleeping", "D": "disk-sleep", "Z": "zombie",
+    "T": "stopped", "t": "tracing-stop", "X": "dead", "x": "dead",
+    "I": "idle", "P": "parked", "W": "waking", "K": "wake-kill",
+}
+
+
+class ProcEntry:
+    __slots__ = ("pid", "ppid", "name", "status", "create_time", "rss",
+                 "cpu_time", "num_threads", "major_faults", "_io", "_ctx", "_fds")
+
+    def __init__(self, pid: int, ppid: int, name: str, status: str, create_time: float,
+                 rss: int, cpu_time: float, num_threads: int, major_faults: int = 0):
+        self.pid = pid
+        self.ppid = ppid
+        self.name = name
+        self.status = status
+        self.create_time = create_time      # epoch seconds
+        self.rss = rss                      # bytes
+        self.cpu_time = cpu_time            # user + system seconds
+        self.num_threads = num_threads
+        self.major_faults = major_faults    # cumulative
+        self._io = None
+        self._ctx = None
+        self._fds = None
+
+    def io(self) -> tuple:
+        """(read_bytes, write_bytes), read lazily — only tree members ever need it."""
+        if self._io is None:
+            self._io = _read_proc_io(self.pid)
+        return self._io
+
+    def ctx_switches(self) -> tuple:
+        """Cumulative (voluntary, involuntary) context switches, read lazily."""
+        if self._ctx is None:
+            self._ctx = _read_proc_ctx_switches(self.pid)
+        return self._ctx
+
+    def fds(self) -> tuple:
+        """(open fd count, socket inodes), read lazily."""
+        if self._fds is None:
+            self._fds = _read_proc_fds(self.pid)
+        return self._fds
+
+
+def _read_proc_io(pid: int) -> tuple:
+    read_bytes = write_bytes = 0
+    try:
+        with open(f"{PROC_DIR}/{pid}/io", "rb") as f:
+            for line in f:
+                if line.startswith(b"read_bytes:"):
+                    read_bytes = int(line.split()[1])
+                elif line.startswith(b"write_bytes:"):
+                    write_bytes = int(line.split()[1])
+    except Exception:
+        try:
+            io = psutil.Process(pid).io_counters()
+            read_bytes, write_bytes = io.read_bytes, io.write_bytes
+        except Exception:
+            pass
+    return read_bytes, write_bytes
+
+
+def _read_proc_ctx_switches(pid: int) -> tuple:
+    voluntary = involuntary = 0
+    try:
+        with open(f"{PROC_DIR}/{pid}/status", "rb") as f:
+            for line in f:
+                if line.startswith(b"voluntary_ctxt_switches:"):
+                    voluntary = int(line.split()[1])
+                elif line.startswith(b"nonvoluntary_ctxt_switches:"):
+                    involuntary = int(line.split()[1])
+    except Exception:
+        try:
+            ctx = psutil.Process(pid).num_ctx_switches()
+            voluntary, involuntary = ctx.voluntary, ctx.involuntary
+        except Exception:
+            pass
+    return voluntary, involuntary
+
+
+def _read_proc_fds(pid: int) -> tuple:
+    """One listdir plus one readlink per fd; sockets are kept for TCP counting."""
+    fd_dir = f"{PROC_DIR}/{pid}/fd"
+    sockets = set()
+    try:
+        names = os.listdir(fd_dir)
+    except Exception:
+        try:
+            return psutil.Process(pid).num_fds(), sockets
+        except Exception:
+            return 0, sockets
+    for name in names:
+        try:
+            target = os.readlink(f"{fd_dir}/{name}")
+        except OSError:
+            continue
+        if target.startswith("socket:["):
+            sockets.add(int(target[8:-1]))
+    return len(names), sockets
+
+
+def _read_established_tcp_inodes() -> set:
+    """Inodes of ESTABLISHED TCP sockets (v4 and v6) in this network namespace."""
+    inodes = set()
+    for path in (f"{PROC_DIR}/net/tcp", f"{PROC_DIR}/net/tcp6"):
+        try:
+            with open(path, "rb") as f:
+                next(f, None)       # header
+                for line in f:
+                    fields = line.split()
+                    if len(fields) > 9 and fields[3] == b"01":
+                        inodes.add(int(fields[9]))
+        except Exception:
+            continue
+    return inodes
+
+
+def _parse_stat(pid: int, data: bytes, boot_time: float) -> Optional[ProcEntry]:
+    # comm may contain spaces and parentheses, so split around the last ')'
+    lparen = data.find(b"(")
+    rparen = data.rfind(b")")
+    if lparen < 0 or rparen < 0:
+        return None
+    name = data[lparen + 1:rparen].decode("utf-8", errors="replace")
+    fields = data[rparen + 2:].split()
+    # fields[0] is stat field 3 (state); field N lives at fields[N - 3]
+    state = fields[0].decode()
+    return ProcEntry(
+        pid=pid,
+        ppid=int(fields[1]),
+        name=name,
+        status=_STATUS_NAMES.get(state, state),
+        create_time=boot_time + int(fields[19]) / _CLK_TCK,
+        rss=int(fields[21]) * _PAGE_SIZE,
+        cpu_time=(int(fields[11]) + int(fields[12])) / _CLK_TCK,
+        num_threads=int(fields[17]),
+        major_faults=int(fields[9]),
+    )
+
+
+def _scan_proc() -> Dict[int, ProcEntry]:
+    boot_time = psutil.boot_time()
+    procs: Dict[int, ProcEntry] = {}
+    for entry in os.listdir(PROC_DIR):
+        if not entry.isdigit():
+            continue
+        pid = int(entry)
+        try:
+            with open(f"{PROC_DIR}/{entry}/stat", "rb") as f:
+                data = f.read()
+            proc = _parse_stat(pid, data, boot_time)
+        except Exception:
+            continue    # exited mid-scan
+        if proc:
+            procs[pid] = proc
+    return procs
+
+
+def _scan_psutil() -> Dict[int, ProcEntry]:
+    """Fallback for platforms without a Linux-style /proc."""
+    procs: Dict[int, ProcEntry] = {}
+    attrs = ["pid", "ppid", "name", "status", "create_time", "memory_info", "cpu_times", "num_threads"]
+    for p in psutil.process_iter(attrs):
+        info = p.info
+        try:
+            cpu = info["cpu_times"]
+            procs[info["pid"]] = ProcEntry(
+                pid=info["pid"],
+                ppid=info["ppid"] or 0,
+                name=info["name"] or "",
+                status=info["status"] or "",
+                create_time=info["create_time"] or 0.0,
+                rss=info["memory_info"].rss if info["memory_info"] else 0,
+                cpu_time=(cpu.user + cpu.system) if cpu else 0.0,
+                num_threads=info["num_threads"] or 0,
+            )
+        except Exception:
+            continue
+    return procs
+
+
+class ProcessTable:
+    """Snapshot of every process on the host, with a ppid -> children index."""
+
+    def __init__(self, procs: Dict[int, ProcEntry], taken_at: float):
+        self.procs = procs
+        self.taken_at = taken_at        # time.monotonic() of the scan
+        self.children: Dict[int, List[int]] = {}
+        for proc in procs.values():
+            self.children.setdefault(proc.ppid, []).append(proc.pid)
+        self._tcp_inodes: Optional[set] = None
+
+    def tcp_inodes(self) -> set:
+        """Established TCP socket inodes, read once per table on first use."""
+        if self._tcp_inodes is None:
+            self._tcp_inodes = _read_established_tcp_inodes()
+        return self._tcp_inodes
+
+    def __contains__(self, pid: int) -> bool:
+        return pid in self.procs
+
+    def get(self, pid: int) -> Optional[ProcEntry]:
+        return self.procs.get(pid)
+
+    def iter_tree(self, pid: int) -> Iterator[ProcEntry]:
+        """Yield the process `pid` and all of its descendants (breadth-first)."""
+        root = self.procs.get(pid)
+        if root is None:
+            return
+        queue = deque([root])
+        while queue:
+            proc = queue.popleft()
+            yield proc
+            for child_pid in self.children.get(proc.pid, ()):
+                child = self.procs.get(child_pid)
+                if child is not None:
+                    queue.append(child)
+
+    def cpu_percent(self, proc: ProcEntry) -> float:
+        """CPU% of `proc` since its last shared baseline (see CpuBaselines)."""
+        return CPU_BASELINES.cpu_percent(proc, self.taken_at)
+
+
+class CpuBaselines:
+    """Last (cpu_time, taken_at) seen per (pid, create_time), shared across callers.
+
+    A measurement closer than MIN_INTERVAL to the baseline returns the previous
+    result instead of moving the baseline, so callers polling on different
+    cadences do not shrink each other's windows to nothing. A process seen for
+    the first time reports its lifetime average rather than 0.0.
+    """
+
+    MIN_INTERVAL = 1.0
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: Dict[tuple, List[float]] = {}     # key -> [cpu_time, taken_at, percent]
+
+    def cpu_percent(self, proc: ProcEntry, taken_at: float) -> float:
+        key = (proc.pid, proc.create_time)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                age = time.time() - proc.create_time
+                percent = proc.cpu_time / age * 100 if age > 0 else 0.0
+                self._entries[key] = [proc.cpu_time, taken_at, percent]
+                return percent
+            cpu_time, since, percent = entry
+            elapsed = taken_at - since
+            if elapsed < self.MIN_INTERVAL:
+                return percent
+            percent = max(proc.cpu_time - cpu_time, 0.0) / elapsed * 100
+            self._entries[key] = [proc.cpu_time, taken_at, percent]
+            return percent
+
+    def prune(self, procs: Dict[int, ProcEntry]):
+        """Forget processes that are gone from a full scan."""
+        with self._lock:
+            for key in [k for k in self._entries if k[0] not in procs or procs[k[0]].create_time != k[1]]:
+                del self._entries[key]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+CPU_BASELINES = CpuBaselines()
+
+
+def scan_process_table() -> ProcessTable:
+    """Build a fresh table with one pass over /proc."""
+    taken_at = time.monotonic()
+    procs = _scan_proc() if os.path.isdir(f"{PROC_DIR}/self") else _scan_psutil()
+    CPU_BASELINES.prune(procs)
+    return ProcessTable(procs, taken_at)
+
+
+_table_lock = threading.Lock()
+_table_cache: Optional[ProcessTable] = None
+
+
+def get_process_table(max_age: float = 1.0) -> ProcessTable:
+    """Return the shared table, rescanning only when it is older than `max_age` seconds."""
+    global _table_cache
+    with _table_lock:
+        table = _table_cache
+        if table is None or time.monotonic() - table.taken_at > max_age:
+            table = scan_process_table()
+            _table_cache = table
+        return table
@@ -0,0 +1,89 @@
+"""Filtering, field projection and cursor pagination for service listings."""
+
+import base64
+import fnmatch
+import json
+from typing import Callable, Dict, List, Optional, Tuple
+
+MAX_PAGE_SIZE = 1000
+
+
+def split_csv(value: Optional[str]) -> List[str]:
+    return [part.strip() for part in (value or "").split(",") if part.strip()]
+
+
+def encode_cursor(last_name: str) -> str:
+    return base64.urlsafe_b64encode(json.dumps({"after": last_name}).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> str:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return json.loads(base64.urlsafe_b64decode(padded.encode()))["after"]
+    except Exception:
+        raise ValueError("invalid cursor")
+
+
+def match_name(name: str, pattern: str) -> bool:
+    """Glob match when `pattern` has wildcards, prefix match otherwise."""
+    if any(ch in pattern for ch in "*?["):
+        return fnmatch.fnmatchcase(name, pattern)
+    return name.startswith(pattern)
+
+
+def query_services(
+    items: List[Dict],
+    health: Optional[str] = None,
+    health_of: Optional[Callable[[Dict], Optional[str]]] = None,
+    name: Optional[str] = None,
+    depends_on: Optional[str] = None,
+    fields: Optional[str] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+) -> Tuple[List[Dict], int, Optional[str]]:
+    """Filter, page and project service dicts. Returns (page, total_matched, next_cursor).
+
+    - health: comma-separated health values (running, abnormal, stopped, ...)
+    - name: name prefix, or a glob when it contains * ? [
+    - depends_on: only services that directly depend on this service
+    - fields: comma-separated fields to keep; "name" is always kept
+    - limit/cursor: page size and the next_cursor of the previous page
+    Raises ValueError for a malformed or stale cursor.
+    """
+    healths = set(split_csv(health))
+    if healths and health_of is None:
+        health_of = lambda item: item.get("health")
+
+    start = 0
+    if cursor:
+        # Resume after the cursor's position in the unfiltered list, so a page
+        # boundary survives the cursor service itself changing health.
+        after = decode_cursor(cursor)
+        positions = {item.get("name"): i for i, item in enumerate(items)}
+        if after not in positions:
+            raise ValueError("stale cursor: service no longer exists")
+        start = positions[after] + 1
+
+    total = 0
+    matched = []
+    for i, item in enumerate(items):
+        if healths and health_of(item) not in healths:
+            continue
+        if name and not match_name(item.get("name", ""), name):
+            continue
+        if depends_on and depends_on not in (item.get("depends_on") or []):
+            continue
+        total += 1
+        if i >= start:
+            matched.append(item)
+
+    next_cursor = None
+    if limit is not None and len(matched) > limit:
+        matched = matched[:limit]
+        next_cursor = encode_cursor(matched[-1].get("name", ""))
+
+    keep = split_csv(fields)
+    if keep:
+        keep = ["name"] + [f for f in keep if f != "name"]
+        matched = [{f: item[f] for f in keep if f in item} for item in matched]
+    return matched, total, next_cursor
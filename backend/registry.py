@@ -0,0 +1,164 @@
+"""In-memory registry of service pidfiles, stop flags, restart counts and manager-daemon pidfiles.
+
+The registry mirrors the *.pid / *.stop / *.restarts files in LOGS_DIR and is kept current
+by LOGS_WATCHER, so status builders never read pidfiles on the request path.
+Liveness of every registered pid is tracked with a pidfd (readable once the
+process exits); without pidfd support callers fall back to os.kill(pid, 0).
+"""
+
+import asyncio
+import os
+from pathlib import Path
+from typing import Dict, Optional, Set
+
+from .config import LOGS_DIR, logger
+from .inotify import LOGS_WATCHER
+
+
+def _read_count(path: Path) -> Optional[int]:
+    try:
+        content = path.read_text().strip()
+    except Exception:
+        return None
+    return int(content) if content.isdigit() else None
+
+
+class PidRegistry:
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self.active = False
+        self._pidfiles: Dict[str, int] = {}     # pidfile name -> pid
+        self._stop_flags: Set[str] = set()      # service names with a <name>.stop file
+        self._restarts: Dict[str, int] = {}     # service name -> count in <name>.restarts
+        self._pidfds: Dict[int, int] = {}       # live pid -> pidfd
+        self._exited: Set[int] = set()          # registered pids known to have exited
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def start(self):
+        """Load the directory once and follow it through LOGS_WATCHER from then on."""
+        self._loop = asyncio.get_running_loop()
+        LOGS_WATCHER.subscribe(self._on_file_event)
+        self.rescan()
+        self.active = True
+
+    def stop(self):
+        self.active = False
+        for pid in list(self._pidfds):
+            self._untrack(pid)
+
+    # ---------- lookups ----------
+
+    def covers(self, pidfile: Path) -> bool:
+        return self.active and pidfile.parent == self.directory
+
+    def get_pidfile(self, filename: str) -> Optional[int]:
+        return self._pidfiles.get(filename)
+
+    def get_service_pid(self, name: str) -> Optional[int]:
+        return self._pidfiles.get(f"{name}.pid")
+
+    def get_manager_pid(self, scope: str) -> Optional[int]:
+        """Pid of the manager daemon for `scope` ("all" or a service name)."""
+        return self._pidfiles.get(f"manager-{scope}.pid")
+
+    def is_stop_flagged(self, name: str) -> bool:
+        return name in self._stop_flags
+
+    def get_restart_count(self, name: str) -> int:
+        return self._restarts.get(name, 0)
+
+    def is_alive(self, pid: int) -> Optional[bool]:
+        """True/False for registered pids, None when the registry cannot tell."""
+        if pid in self._pidfds:
+            return True
+        if pid in self._exited:
+            return False
+        return None
+
+    # ---------- updates ----------
+
+    def rescan(self):
+        pidfiles: Dict[str, int] = {}
+        stop_flags: Set[str] = set()
+        restarts: Dict[str, int] = {}
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            names = []
+        for filename in names:
+            if filename.endswith(".pid"):
+                pid = _read_count(self.directory / filename)
+                if pid:
+                    pidfiles[filename] = pid
+            elif filename.endswith(".stop"):
+                stop_flags.add(filename[:-len(".stop")])
+            elif filename.endswith(".restarts"):
+                restarts[filename[:-len(".restarts")]] = _read_count(self.directory / filename) or 0
+        self._pidfiles = pidfiles
+        self._stop_flags = stop_flags
+        self._restarts = restarts
+        self._sync_liveness()
+
+    def _on_file_event(self, filename: Optional[str]):
+        if filename is None:
+            self.rescan()
+            return
+        path = self.directory / filename
+        if filename.endswith(".pid"):
+            pid = _read_count(path)
+            if pid:
+                self._pidfiles[filename] = pid
+                # A rewritten pidfile may name a reused pid that exited before; check it again
+                self._exited.discard(pid)
+            else:
+                self._pidfiles.pop(filename, None)
+            self._sync_liveness()
+        elif filename.endswith(".stop"):
+            name = filename[:-len(".stop")]
+            if path.exists():
+                self._stop_flags.add(name)
+            else:
+                self._stop_flags.discard(name)
+        elif filename.endswith(".restarts"):
+            self._restarts[filename[:-len(".restarts")]] = _read_count(path) or 0
+
+    def _sync_liveness(self):
+        wanted = set(self._pidfiles.values())
+        for pid in list(self._pidfds):
+            if pid not in wanted:
+                self._untrack(pid)
+        self._exited &= wanted
+        for pid in wanted:
+            if pid not in self._pidfds and pid not in self._exited:
+                self._track(pid)
+
+    def _track(self, pid: int):
+        if not hasattr(os, "pidfd_open") or self._loop is None:
+            return
+        try:
+            fd = os.pidfd_open(pid)
+        except ProcessLookupError:
+            self._exited.add(pid)
+            return
+        except OSError as e:
+            logger.debug(f"pidfd_open({pid}) failed: {e}")
+            return
+        self._pidfds[pid] = fd
+        self._loop.add_reader(fd, self._on_exit, pid)
+
+    def _untrack(self, pid: int):
+        fd = self._pidfds.pop(pid, None)
+        if fd is None:
+            return
+        try:
+            self._loop.remove_reader(fd)
+        except Exception:
+            pass
+        os.close(fd)
+
+    def _on_exit(self, pid: int):
+        self._untrack(pid)
+        self._exited.add(pid)
+
+
+PID_REGISTRY = PidRegistry(LOGS_DIR)
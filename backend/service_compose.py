@@ -132,6 +132,123 @@ def _resolve_path(path_str: str, base_dir: Path) -> str:
     return str((base_dir / p).resolve())
 
 
+# ---------- cgroup v2 mode ----------
+
+# Per-service cgroups live in <base>/service-compose/<name>; the API backend
+# recognises a service cgroup by this directory name (backend/cgroups.py).
+CGROUP_GROUP = 'service-compose'
+CGROUP_CONTROLLERS = ('memory', 'io', 'pids')
+# Leaf the manager moves into, next to CGROUP_GROUP, so its own cgroup holds no processes
+CGROUP_MANAGER_LEAF = 'service-compose-manager'
+
+
+def _cgroup2_mount():
+    """Mount point of the cgroup v2 hierarchy, or None."""
+    try:
+        with open('/proc/mounts') as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) > 2 and fields[2] == 'cgroup2':
+                    return Path(fields[1])
+    except OSError:
+        pass
+    return None
+
+
+def _own_cgroup(mount: Path):
+    """cgroup v2 directory of this process."""
+    try:
+        with open('/proc/self/cgroup') as f:
+            for line in f:
+                if line.startswith('0::'):
+                    return mount / line[3:].strip().lstrip('/')
+    except OSError:
+        pass
+    return None
+
+
+def _enable_controllers(path: Path, logger):
+    """Best-effort: a cgroup that holds processes itself refuses (EBUSY)."""
+    try:
+        available = (path / 'cgroup.controllers').read_text().split()
+    except OSError:
+        return
+    for controller in CGROUP_CONTROLLERS:
+        if controller not in available:
+            continue
+        try:
+            (path / 'cgroup.subtree_control').write_text(f'+{controller}')
+        except OSError as e:
+            logger.debug(f"Cannot enable {controller} controller in {path}: {e}")
+
+
+def _move_into_leaf(base: Path, logger):
+    """Move every process of `base` into <base>/CGROUP_MANAGER_LEAF.
+
+    Controllers can only be enabled below a cgroup without processes of its
+    own; with `cgroup: true` the base is where the manager (and whatever was
+    started alongside it) runs.
+    """
+    try:
+        pids = (base / 'cgroup.procs').read_text().split()
+    except OSError:
+        return
+    if not pids:
+        return
+    leaf = base / CGROUP_MANAGER_LEAF
+    try:
+        leaf.mkdir(exist_ok=True)
+    except OSError as e:
+        logger.warning(f"Cannot create {leaf} ({e}), services get CPU accounting only")
+        return
+    for pid in pids:
+        try:
+            (leaf / 'cgroup.procs').write_text(pid)
+        except OSError as e:
+            # Exited meanwhile, or not ours to move
+            logger.debug(f"Cannot move pid {pid} into {leaf}: {e}")
+
+
+def setup_cgroup_parent(setting, logger):
+    """Create the parent of the per-service cgroups.
+
+    `setting` is the top-level `cgroup` config value: true to nest under this
+    manager's own cgroup, or the path of a delegated cgroup v2 directory
+    (absolute, or relative to the cgroup v2 mount). Processes found in the
+    base cgroup, the manager itself with `true`, move into a leaf first.
+    Returns None when cgroup mode is off or unavailable; services are then
+    started and measured as plain process trees.
+    """
+    if not setting:
+        return None
+    mount = _cgroup2_mount()
+    if mount is None:
+        logger.warning("cgroup mode requested but no cgroup v2 hierarchy is mounted")
+        return None
+    # A relative path is taken from the hierarchy root
+    base = mount / setting if isinstance(setting, str) else _own_cgroup(mount)
+    if base is None:
+        logger.warning("cgroup mode requested but own cgroup is unknown")
+        return None
+    if base.name == CGROUP_MANAGER_LEAF:
+        # Moved there by an earlier start of this manager
+        base = base.parent
+    parent = base / CGROUP_GROUP
+    try:
+        parent.mkdir(exist_ok=True)
+    except OSError as e:
+        logger.warning(f"cgroup mode unavailable ({parent}: {e}), using process trees")
+        return None
+    # cpu.stat is always there; memory/io/pids need the controllers delegated.
+    # The root cgroup is exempt from the no-internal-processes rule.
+    if base != mount:
+        _move_into_leaf(base, logger)
+    _enable_controllers(base, logger)
+    _enable_controllers(parent, logger)
+    logger.info(f"cgroup mode: services run under {parent}")
+    return parent
+
+
 class ServiceProcess:
     """Manages a single service process with auto-restart, logging, and pid tracking."""
     
@@ -139,20 +256,23 @@ class ServiceProcess:
     RESTART_DELAYS = [1, 2, 4, 8, 16, 32, 60]
     MAX_RESTART_ATTEMPTS_PER_MINUTE = 5  # Prevent restart storms
     
-    def __init__(self, name, cmd, args, restart_on_exit=True):
+    def __init__(self, name, cmd, args, restart_on_exit=True, cgroup_parent=None):
         self.name = name
         self.cmd = cmd
         self.args = args or []
+        self.cgroup = cgroup_parent / name if cgroup_parent else None
         self.log_file = LOGS_DIR / f'{name}.log'
         self.pidfile = LOGS_DIR / f'{name}.pid'
         self.stopflag = LOGS_DIR / f'{name}.stop'   # cross-process stop signal
+        self.restartsfile = LOGS_DIR / f'{name}.restarts'   # cumulative auto-restarts, read by the API
         self.restart_on_exit = restart_on_exit
         self.process = None
         self._stop_requested = threading.Event()
         self._lock = threading.Lock()
         
-        # Restart tracking
+        # Restart tracking; restart_count is the backoff streak, reset on every start
         self.restart_count = 0
+        self.restarts_total = self._read_restarts()
         self.last_restart_time = None
         self.restart_times_this_minute = []  # timestamps of restarts in last minute
         
@@ -207,6 +327,21 @@ class ServiceProcess:
         except Exception as e:
             self.logger.error(f"Failed to remove pidfile: {e}")
 
+    def _read_restarts(self):
+        """Cumulative restart count kept across manager restarts."""
+        try:
+            content = self.restartsfile.read_text().strip()
+            return int(content) if content.isdigit() else 0
+        except OSError:
+            return 0
+
+    def _write_restarts(self):
+        try:
+            self.restartsfile.parent.mkdir(parents=True, exist_ok=True)
+            self.restartsfile.write_text(str(self.restarts_total))
+        except Exception as e:
+            self.logger.error(f"Failed to write restart count: {e}")
+
     def _write_stop_flag(self):
         """Write stop flag file to signal watcher threads (including in other
         daemon processes) that this service should NOT be auto-restarted."""
@@ -230,6 +365,37 @@ class ServiceProcess:
         """Check if stop flag exists (another process requested stop)."""
         return self.stopflag.exists()
 
+    def _prepare_cgroup(self):
+        """Create this service's cgroup; returns it, or None to start without one."""
+        if not self.cgroup:
+            return None
+        try:
+            self.cgroup.mkdir(exist_ok=True)
+            return self.cgroup
+        except OSError as e:
+            self.logger.warning(f"Cannot create cgroup {self.cgroup}: {e}, starting without it")
+            return None
+
+    def _cgroup_pids(self):
+        """PIDs in this service's cgroup, including children that left the process tree."""
+        if not self.cgroup:
+            return set()
+        try:
+            return {int(line) for line in (self.cgroup / 'cgroup.procs').read_text().split()}
+        except (OSError, ValueError):
+            return set()
+
+    def _remove_cgroup(self):
+        """Remove the (now empty) service cgroup; it is recreated on the next start."""
+        if not self.cgroup:
+            return
+        try:
+            self.cgroup.rmdir()
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            self.logger.debug(f"Failed to remove cgroup {self.cgroup}: {e}")
+
     def _read_pid_from_file(self):
         """Read PID from pidfile. Returns int or None."""
         try:
@@ -279,6 +445,9 @@ class ServiceProcess:
                 all_pids = {pid}
         else:
             all_pids = {pid}
+        # In cgroup mode the cgroup also holds daemonized children that were
+        # reparented away from the tree
+        all_pids |= self._cgroup_pids()
 
         # ---- Phase 1: SIGTERM to process group + every known PID ----
         # Kill the process group (covers children that stayed in the group)
@@ -328,6 +497,7 @@ class ServiceProcess:
                     all_pids.add(ch.pid)
             except (psutil.NoSuchProcess, psutil.AccessDenied):
                 pass
+        all_pids |= self._cgroup_pids()
 
         alive_pids = set()
         for cpid in all_pids:
@@ -356,6 +526,12 @@ class ServiceProcess:
                     os.kill(cpid, signal.SIGKILL)
                 except (ProcessLookupError, PermissionError):
                     pass
+            # cgroup.kill (Linux 5.14+) also catches anything forked meanwhile
+            if self.cgroup:
+                try:
+                    (self.cgroup / 'cgroup.kill').write_text('1')
+                except OSError:
+                    pass
 
         # ---- Final check ----
         time.sleep(0.5)
@@ -419,14 +595,26 @@ class ServiceProcess:
             LOGS_DIR.mkdir(exist_ok=True)
             cmd = [self.cmd] + self.args
             self.logger.info(f"Starting: {' '.join(cmd)}")
-            
+            cgroup = self._prepare_cgroup()
+
+            def _preexec():
+                # Own process group (for better signal handling); in cgroup
+                # mode join the service cgroup before exec, so every child
+                # is accounted to it from its first instruction
+                os.setsid()
+                if cgroup:
+                    try:
+                        with open(cgroup / 'cgroup.procs', 'w') as f:
+                            f.write(str(os.getpid()))
+                    except OSError:
+                        pass
+
             try:
-                # Start process in its own process group (for better signal handling)
                 self.process = subprocess.Popen(
                     cmd,
                     stdout=subprocess.PIPE,
                     stderr=subprocess.STDOUT,
-                    preexec_fn=os.setsid,
+                    preexec_fn=_preexec,
                     text=True,
                     bufsize=1  # line buffered
                 )
@@ -459,6 +647,7 @@ class ServiceProcess:
                     )
                     self._kill_pid(old_pid, timeout=timeout)
                     self._remove_pidfile()
+                    self._remove_cgroup()
                     self.logger.info("Residual process stopped via pidfile")
                 else:
                     self._remove_pidfile()
@@ -487,6 +676,7 @@ class ServiceProcess:
                 self.logger.error(f"Error stopping: {e}")
             finally:
                 self._remove_pidfile()
+                self._remove_cgroup()
 
     def _watch(self):
         """Watch the process and handle restart logic."""
@@ -529,6 +719,8 @@ class ServiceProcess:
                     break
                 
                 self.restart_count += 1
+                self.restarts_total += 1
+                self._write_restarts()
                 self.restart_times_this_minute.append(time.time())
                 delay = self._get_restart_delay()
                 
@@ -563,6 +755,7 @@ class Manager:
     def __init__(self, config_path=CONFIG_FILE):
         self.config_path = Path(config_path)
         self.run_dir = None
+        self.cgroup_setting = None
         self.logger = None
         self._load_config()
         self.services = []
@@ -576,6 +769,7 @@ class Manager:
             config_dir = self.config_path.resolve().parent
             cfg = _load_file(self.config_path)
             self.services_cfg = cfg.get('services', [])
+            self.cgroup_setting = cfg.get('cgroup')
             run_dir_raw = cfg.get('run_dir', None)
             # resolve relative run_dir
             if run_dir_raw:
@@ -598,12 +792,14 @@ class Manager:
         """Initialize service objects."""
         self.services = []
         self.services_map = {}
+        cgroup_parent = setup_cgroup_parent(self.cgroup_setting, self.logger)
         for s in self.services_cfg:
             sp = ServiceProcess(
                 s.get('name'),
                 s['cmd'],
                 s.get('args', []),
-                s.get('restart_on_exit', True)
+                s.get('restart_on_exit', True),
+                cgroup_parent,
             )
             self.services.append(sp)
             self.services_map[sp.name] = sp
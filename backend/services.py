@@ -1,8 +1,6 @@
 """Service status, heartbeat checking, process metrics."""
 
 import os
-import urllib.request
-import urllib.error
 from datetime import datetime
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple
@@ -11,11 +9,16 @@ import psutil
 
 from .config import (
     LOGS_DIR, RUN_DIR, logger,
-    load_config, get_all_services,
+    load_config, load_config_cached, get_all_services,
     METRICS_HISTORY, METRICS_LAST_IO_READ, METRICS_LAST_IO_WRITE,
     MAX_METRICS_POINTS, METRICS_INTERVAL_SECONDS,
 )
-from .models import ServiceStatus, SystemMetrics, DiskPartitionInfo, ServiceInfo
+from .heartbeat import check_mock_heartbeat, get_heartbeat_result
+from .registry import PID_REGISTRY
+from .logtail import LOG_TAILER, read_last_log_line
+from .proctable import ProcessTable, get_process_table
+from .cgroups import CGROUP_CPU_BASELINES, cgroup_pids, read_cgroup_stats, service_cgroup
+from .models import ServiceStatus, DashboardStatus, SystemMetrics, DiskPartitionInfo, ServiceInfo
 
 
 # ---------- System Info (static hardware / OS details) ----------
@@ -117,8 +120,7 @@ def _get_host_ip() -> str:
 
 
 def _build_network_info() -> list:
-    """Build network interfaces list with IP and real-time speed."""
-    _refresh_net_io_speed()
+    """Build network interfaces list with IP and the sampler's latest speed."""
     io_totals = _get_net_io_totals()
     nets = []
     try:
@@ -259,6 +261,8 @@ def get_system_info() -> dict:
 # ---------- PID ----------
 
 def get_pid(pidfile: Path) -> Optional[int]:
+    if PID_REGISTRY.covers(pidfile):
+        return PID_REGISTRY.get_pidfile(pidfile.name)
     try:
         if pidfile.exists():
             content = pidfile.read_text().strip()
@@ -269,7 +273,22 @@ def get_pid(pidfile: Path) -> Optional[int]:
     return None
 
 
+def get_restart_count(pidfile: Path) -> int:
+    """Auto-restarts the manager recorded in <name>.restarts next to the pidfile."""
+    name = pidfile.stem
+    if PID_REGISTRY.covers(pidfile):
+        return PID_REGISTRY.get_restart_count(name)
+    try:
+        content = pidfile.with_name(f"{name}.restarts").read_text().strip()
+        return int(content) if content.isdigit() else 0
+    except OSError:
+        return 0
+
+
 def is_process_running(pid: int) -> bool:
+    alive = PID_REGISTRY.is_alive(pid)
+    if alive is not None:
+        return alive
     try:
         os.kill(pid, 0)
         return True
@@ -277,45 +296,42 @@ def is_process_running(pid: int) -> bool:
         return False
 
 
-# ---------- Heartbeat ----------
-
-def _check_heartbeat(heartbeat_url: Optional[str]) -> Tuple[bool, Optional[str]]:
-    if not heartbeat_url:
-        return False, "missing"
-    if heartbeat_url in {"mock", "simulate", "mock://ok", "simulate://ok"}:
-        return True, None
-    if heartbeat_url in {"mock://fail", "simulate://fail"}:
-        return False, "mock_fail"
-    try:
-        req = urllib.request.Request(heartbeat_url, method="GET")
-        with urllib.request.urlopen(req, timeout=1.5) as response:
-            return response.status == 200, None if response.status == 200 else f"http_status_{response.status}"
-    except urllib.error.HTTPError as exc:
-        return False, f"http_status_{getattr(exc, 'code', 'unknown')}"
-    except urllib.error.URLError as exc:
-        reason = str(getattr(exc, "reason", "connection_error"))
-        if "timed out" in reason.lower():
-            return False, "timeout"
-        return False, "connection_error"
-    except ValueError:
-        return False, "invalid_url"
+# ---------- Service Status ----------
 
+def _format_uptime(create_time: float) -> Tuple[int, str]:
+    total_seconds = max(int(datetime.now().timestamp() - create_time), 0)
+    days, rem = divmod(total_seconds, 86400)
+    hours, rem = divmod(rem, 3600)
+    minutes, seconds = divmod(rem, 60)
+    return total_seconds, f"{days}d {hours}h {minutes}m {seconds}s"
 
-# ---------- Service Status ----------
 
 def get_service_status(
     name: str, pidfile: Path, log_file: Path,
     heartbeat_url: Optional[str] = None,
     scheduled_restart_cfg: Optional[Dict] = None,
     depends_on: Optional[List[str]] = None,
+    proc_table: Optional[ProcessTable] = None,
 ) -> ServiceStatus:
     pid = get_pid(pidfile)
     running_pid = pid is not None and is_process_running(pid)
-    heartbeat_ok, heartbeat_reason = _check_heartbeat(heartbeat_url) if running_pid else (False, "missing")
+    heartbeat_age = heartbeat_latency_ms = None
+    if not running_pid:
+        heartbeat_ok, heartbeat_reason = False, "missing"
+    else:
+        mock = check_mock_heartbeat(heartbeat_url)
+        if mock is not None:
+            heartbeat_ok, heartbeat_reason = mock
+        else:
+            heartbeat_ok, heartbeat_reason, heartbeat_age, heartbeat_latency_ms = get_heartbeat_result(name, pid)
 
     if running_pid and heartbeat_ok:
         health = "running"
         health_reason = None
+    elif running_pid and heartbeat_reason == "pending":
+        # Not probed yet for this pid (API start, service restart): unknown, not failed
+        health = "running"
+        health_reason = "pending"
     elif running_pid and not heartbeat_ok:
         health = "abnormal"
         health_reason = heartbeat_reason or "heartbeat_failed"
@@ -326,35 +342,14 @@ def get_service_status(
     uptime = None
     uptime_seconds = None
     if running_pid and pid:
-        try:
-            proc = psutil.Process(pid)
-            start_time = datetime.fromtimestamp(proc.create_time())
-            delta = datetime.now() - start_time
-            total_seconds = int(delta.total_seconds())
-            uptime_seconds = total_seconds
-            days, rem = divmod(total_seconds, 86400)
-            hours, rem = divmod(rem, 3600)
-            minutes, seconds = divmod(rem, 60)
-            uptime = f"{days}d {hours}h {minutes}m {seconds}s"
-        except Exception:
-            pass
+        proc = (proc_table or get_process_table()).get(pid)
+        if proc is not None:
+            uptime_seconds, uptime = _format_uptime(proc.create_time)
 
-    last_log = None
-    try:
-        if log_file.exists() and log_file.stat().st_size > 0:
-            with open(log_file, 'rb') as f:
-                f.seek(0, 2)
-                file_size = f.tell()
-                read_size = min(500, file_size)
-                f.seek(-read_size, 2)
-                content = f.read().decode('utf-8', errors='ignore')
-                lines = content.split('\n')
-                for line in reversed(lines):
-                    if line.strip():
-                        last_log = line.strip()[:100]
-                        break
-    except Exception:
-        pass
+    if LOG_TAILER.covers(log_file):
+        last_log = LOG_TAILER.last_line(log_file)
+    else:
+        last_log = read_last_log_line(log_file)
 
     sr_info = None
     if scheduled_restart_cfg:
@@ -377,6 +372,51 @@ def get_service_status(
         last_log=last_log,
         scheduled_restart=sr_info,
         depends_on=depends_on or [],
+        heartbeat_age=heartbeat_age,
+        heartbeat_latency_ms=heartbeat_latency_ms,
+        restart_count=get_restart_count(pidfile),
+    )
+
+
+def build_services_status(config: dict = None) -> List[ServiceStatus]:
+    """Build the status of every configured service from a single config load."""
+    if config is None:
+        config = load_config_cached()
+    proc_table = get_process_table()
+    services_status = []
+    for service_cfg in get_all_services(config):
+        service_name = service_cfg.get("name", "unknown")
+        services_status.append(
+            get_service_status(
+                service_name,
+                LOGS_DIR / f"{service_name}.pid",
+                LOGS_DIR / f"{service_name}.log",
+                service_cfg.get("heartbeat"),
+                scheduled_restart_cfg=service_cfg.get("scheduled_restart"),
+                depends_on=service_cfg.get("depends_on", []),
+                proc_table=proc_table,
+            )
+        )
+    return services_status
+
+
+def compute_overall_status(services_status: List[ServiceStatus]) -> str:
+    if any(s.health == "abnormal" for s in services_status):
+        return "abnormal"
+    if any(s.health == "running" for s in services_status):
+        return "running"
+    return "stopped"
+
+
+def build_dashboard_status() -> DashboardStatus:
+    """Compute a full dashboard status. Blocking — run it off the event loop."""
+    services_status = build_services_status()
+    metrics = get_system_metrics()
+    return DashboardStatus(
+        status=compute_overall_status(services_status),
+        services=services_status,
+        metrics=metrics,
+        timestamp=datetime.now().isoformat()
     )
 
 
@@ -394,10 +434,35 @@ def extract_log_level(log_line: str) -> str:
 
 
 # ---------- System Metrics ----------
+#
+# Sampled at a fixed cadence by tasks.system_metrics_sampler, which is the only
+# caller of sample_system_metrics(). Everything else reads the cached value, so
+# API paths never block and the net/disk rates cover stable sampling windows.
+
+_system_metrics_cache: Optional[SystemMetrics] = None
+
+
+def _empty_system_metrics() -> SystemMetrics:
+    return SystemMetrics(
+        cpu_percent=0.0, cpu_count=0, cpu_percents=[],
+        memory_percent=0.0, memory_used=0, memory_total=0,
+        disk_percent=0.0, disk_used=0, disk_total=0, disk_free=0,
+        net_upload_speed=0.0, net_download_speed=0.0,
+        run_disk_read_speed=0.0, run_disk_write_speed=0.0,
+        host_ip=_get_host_ip(),
+        timestamp=datetime.now().isoformat()
+    )
 
-def get_system_metrics() -> SystemMetrics:
+
+def sample_system_metrics() -> SystemMetrics:
+    """Take one system metrics sample and cache it.
+
+    cpu_percent(interval=None) and the net/disk rate trackers measure against
+    the previous call, so this must only be called on the sampler's cadence.
+    """
+    global _system_metrics_cache
     try:
-        cpu_percents = psutil.cpu_percent(interval=0.1, percpu=True)
+        cpu_percents = psutil.cpu_percent(interval=None, percpu=True)
         cpu_count = len(cpu_percents) if cpu_percents else psutil.cpu_count()
         cpu_percent = round(sum(cpu_percents) / cpu_count, 2) if cpu_percents and cpu_count else 0.0
         memory = psutil.virtual_memory()
@@ -415,7 +480,7 @@ def get_system_metrics() -> SystemMetrics:
         _refresh_disk_io_speed()
         run_read, run_write = _get_run_dir_disk_speed()
 
-        return SystemMetrics(
+        metrics = SystemMetrics(
             cpu_percent=round(cpu_percent, 2),
             cpu_count=cpu_count,
             cpu_percents=[round(v, 2) for v in cpu_percents] if cpu_percents else [],
@@ -435,15 +500,16 @@ def get_system_metrics() -> SystemMetrics:
         )
     except Exception as e:
         logger.error(f"Failed to get system metrics: {e}")
-        return SystemMetrics(
-            cpu_percent=0.0, cpu_count=0, cpu_percents=[],
-            memory_percent=0.0, memory_used=0, memory_total=0,
-            disk_percent=0.0, disk_used=0, disk_total=0, disk_free=0,
-            net_upload_speed=0.0, net_download_speed=0.0,
-            run_disk_read_speed=0.0, run_disk_write_speed=0.0,
-            host_ip=_get_host_ip(),
-            timestamp=datetime.now().isoformat()
-        )
+        metrics = _empty_system_metrics()
+    _system_metrics_cache = metrics
+    return metrics
+
+
+def get_system_metrics() -> SystemMetrics:
+    """Return the latest sampled system metrics without blocking."""
+    if _system_metrics_cache is None:
+        return _empty_system_metrics()
+    return _system_metrics_cache
 
 
 # ---------- Disk IO speed tracking ----------
@@ -537,7 +603,6 @@ def _get_run_dir_disk_speed() -> tuple:
 
 
 def get_disk_partitions() -> List[DiskPartitionInfo]:
-    _refresh_disk_io_speed()
     io_totals = _get_disk_io_totals()
     io_keys = set(_disk_io_speed.keys()) | set(io_totals.keys())
 
@@ -585,32 +650,54 @@ def get_disk_partitions() -> List[DiskPartitionInfo]:
 
 # ---------- Process Tree Metrics ----------
 
-def _get_process_tree_metrics(pid: int) -> Dict:
-    try:
-        proc = psutil.Process(pid)
-    except Exception:
-        return {"cpu_percent": 0.0, "memory_mb": 0.0, "read_bytes": 0, "write_bytes": 0}
-    processes = [proc]
-    try:
-        processes.extend(proc.children(recursive=True))
-    except Exception:
-        pass
-    total_cpu = total_mem = total_read = total_write = 0
-    for p in processes:
-        try: total_cpu += p.cpu_percent(interval=None)
-        except Exception: pass
-        try: total_mem += p.memory_info().rss
-        except Exception: pass
-        try:
-            io = p.io_counters()
-            total_read += getattr(io, "read_bytes", 0)
-            total_write += getattr(io, "write_bytes", 0)
-        except Exception: pass
+def _get_process_tree_metrics(pid: int, proc_table: ProcessTable, service: Optional[str] = None) -> Dict:
+    """Aggregate cpu/memory/io and fd/thread/scheduling counters over the process tree of `pid`.
+
+    When `service` runs in its own cgroup (cgroup mode), membership comes from
+    the cgroup instead of the tree, and every figure the cgroup accounts for
+    is read from it rather than summed per process.
+    """
+    cgroup = service_cgroup(service, pid) if service else None
+    stats = read_cgroup_stats(cgroup) if cgroup else {}
+    if cgroup:
+        members = [proc for proc in map(proc_table.get, cgroup_pids(cgroup)) if proc is not None]
+    else:
+        members = proc_table.iter_tree(pid)
+    total_cpu = 0.0
+    total_mem = total_read = total_write = 0
+    fds = threads = major_faults = voluntary = involuntary = 0
+    sockets = set()
+    for proc in members:
+        if "cpu_usec" not in stats:
+            total_cpu += proc_table.cpu_percent(proc)
+        total_mem += proc.rss
+        if "read_bytes" not in stats:
+            read_bytes, write_bytes = proc.io()
+            total_read += read_bytes
+            total_write += write_bytes
+        threads += proc.num_threads
+        major_faults += proc.major_faults
+        ctx = proc.ctx_switches()
+        voluntary += ctx[0]
+        involuntary += ctx[1]
+        fd_count, fd_sockets = proc.fds()
+        fds += fd_count
+        sockets |= fd_sockets
+    if "cpu_usec" in stats:
+        total_cpu = CGROUP_CPU_BASELINES.cpu_percent(cgroup, stats["cpu_usec"])
     return {
         "cpu_percent": round(total_cpu, 2),
-        "memory_mb": round(total_mem / (1024 * 1024), 2),
-        "read_bytes": total_read,
-        "write_bytes": total_write
+        # memory.current also counts page cache charged to the service
+        "memory_mb": round(stats.get("memory_bytes", total_mem) / (1024 * 1024), 2),
+        "read_bytes": stats.get("read_bytes", total_read),
+        "write_bytes": stats.get("write_bytes", total_write),
+        "open_fds": fds,
+        "threads": stats.get("tasks", threads),
+        # A socket shared by several processes of the tree counts once
+        "tcp_connections": len(sockets & proc_table.tcp_inodes()) if sockets else 0,
+        "major_faults": stats.get("major_faults", major_faults),
+        "voluntary_ctx_switches": voluntary,
+        "involuntary_ctx_switches": involuntary,
     }
 
 
@@ -619,20 +706,10 @@ def get_service_info(service_name: str) -> ServiceInfo:
     manifest = read_manifest(RUN_DIR / "deployments" / service_name)
     uptime = None
     uptime_seconds = None
-    try:
-        pidfile = LOGS_DIR / f"{service_name}.pid"
-        if pidfile.exists():
-            pid = int(pidfile.read_text().strip())
-            proc = psutil.Process(pid)
-            start_time = datetime.fromtimestamp(proc.create_time())
-            delta = datetime.now() - start_time
-            uptime_seconds = int(delta.total_seconds())
-            days, rem = divmod(uptime_seconds, 86400)
-            hours, rem = divmod(rem, 3600)
-            minutes, seconds = divmod(rem, 60)
-            uptime = f"{days}d {hours}h {minutes}m {seconds}s"
-    except Exception:
-        pass
+    pid = get_pid(LOGS_DIR / f"{service_name}.pid")
+    proc = get_process_table().get(pid) if pid else None
+    if proc is not None:
+        uptime_seconds, uptime = _format_uptime(proc.create_time)
     return ServiceInfo(
         name=service_name,
         version=manifest.get("version", "unknown"),
@@ -645,120 +722,76 @@ def get_service_info(service_name: str) -> ServiceInfo:
 
 # ---------- Process tree detail ----------
 
-def build_process_tree(pid: int) -> Optional[Dict]:
-    import time
-
-    try:
-        root = psutil.Process(pid)
-    except (psutil.NoSuchProcess, psutil.AccessDenied):
-        return None
-
-    # ------------------------------------------------------------------
-    # Phase 1 – collect ALL processes in the tree and "prime" cpu_percent.
-    # psutil.cpu_percent(interval=None) returns 0.0 on the FIRST call for
-    # a given Process object because it has no previous sample.  We must
-    # call it once, sleep, then call it AGAIN on the *same* objects.
-    # ------------------------------------------------------------------
-    all_procs: list[psutil.Process] = []
+def _read_cmdline(pid: int) -> str:
     try:
-        all_procs.append(root)
-        all_procs.extend(root.children(recursive=True))
+        with open(f"/proc/{pid}/cmdline", "rb") as f:
+            return f.read().replace(b"\0", b" ").decode("utf-8", errors="replace").strip()
     except Exception:
-        if not all_procs:
-            all_procs.append(root)
-
-    # First sample – just records a baseline (returns 0.0, ignored).
-    for p in all_procs:
         try:
-            p.cpu_percent(interval=None)
+            return " ".join(psutil.Process(pid).cmdline())
         except Exception:
-            pass
+            return ""
+
 
-    time.sleep(0.5)
+def build_process_tree(pid: int) -> Optional[Dict]:
+    # CPU% comes from the shared baselines, so one (possibly cached) table is enough
+    table = get_process_table()
+    if pid not in table:
+        return None
 
-    # ------------------------------------------------------------------
-    # Phase 2 – collect actual metrics.  cpu_percent now returns real
-    # values because these are the *same* Process instances we primed.
-    # ------------------------------------------------------------------
-    # Build a {pid: Process} map so the tree builder can reuse primed objs.
-    proc_map: dict[int, psutil.Process] = {p.pid: p for p in all_procs}
+    try:
+        mem_total = psutil.virtual_memory().total
+    except Exception:
+        mem_total = 0
 
-    def _collect(p: psutil.Process) -> Optional[Dict]:
+    def _collect(proc) -> Dict:
+        read_bytes, write_bytes = proc.io()
         info = {
-            "pid": p.pid, "ppid": None, "name": "", "cmdline": "",
-            "status": "", "cpu_percent": 0.0, "memory_mb": 0.0,
-            "memory_percent": 0.0, "read_bytes": 0, "write_bytes": 0,
-            "num_threads": 0, "create_time": None, "children": [],
+            "pid": proc.pid,
+            "ppid": proc.ppid,
+            "name": proc.name,
+            "cmdline": _read_cmdline(proc.pid) or proc.name,
+            "status": proc.status,
+            "cpu_percent": round(table.cpu_percent(proc), 2),
+            "memory_mb": round(proc.rss / (1024 * 1024), 2),
+            "memory_percent": round(proc.rss / mem_total * 100, 2) if mem_total else 0.0,
+            "read_bytes": read_bytes,
+            "write_bytes": write_bytes,
+            "num_threads": proc.num_threads,
+            "create_time": datetime.fromtimestamp(proc.create_time).isoformat(),
+            "children": [],
         }
-        try:
-            info["ppid"] = p.ppid()
-        except Exception:
-            pass
-        try:
-            info["name"] = p.name()
-        except Exception:
-            pass
-        try:
-            cmdline = p.cmdline()
-            info["cmdline"] = " ".join(cmdline) if cmdline else info["name"]
-        except Exception:
-            info["cmdline"] = info["name"]
-        try:
-            info["status"] = p.status()
-        except Exception:
-            pass
-
-        # CPU – second call on the same primed object → real value
-        try:
-            info["cpu_percent"] = round(p.cpu_percent(interval=None), 2)
-        except Exception:
-            pass
-
-        try:
-            info["memory_mb"] = round(p.memory_info().rss / (1024 * 1024), 2)
-        except Exception:
-            pass
-        try:
-            info["memory_percent"] = round(p.memory_percent(), 2)
-        except Exception:
-            pass
-
-        # IO counters
-        try:
-            io = p.io_counters()
-            info["read_bytes"] = getattr(io, "read_bytes", 0)
-            info["write_bytes"] = getattr(io, "write_bytes", 0)
-        except (psutil.AccessDenied, psutil.NoSuchProcess):
-            try:
-                with open(f"/proc/{p.pid}/io", "r") as f:
-                    for line in f:
-                        if line.startswith("read_bytes:"):
-                            info["read_bytes"] = int(line.split()[1])
-                        elif line.startswith("write_bytes:"):
-                            info["write_bytes"] = int(line.split()[1])
-            except Exception:
-                pass
-        except Exception:
-            pass
-
-        try:
-            info["num_threads"] = p.num_threads()
-        except Exception:
-            pass
-        try:
-            info["create_time"] = datetime.fromtimestamp(p.create_time()).isoformat()
-        except Exception:
-            pass
-
-        # Recurse into children – reuse primed Process objects from proc_map
-        try:
-            for child in p.children(recursive=False):
-                primed_child = proc_map.get(child.pid, child)
-                ci = _collect(primed_child)
-                if ci:
-                    info["children"].append(ci)
-        except Exception:
-            pass
+        for child_pid in sorted(table.children.get(proc.pid, ())):
+            child = table.get(child_pid)
+            if child is not None:
+                info["children"].append(_collect(child))
         return info
 
-    return _collect(root)
+    return _collect(table.get(pid))
+
+
+def get_process_tree_payload(service: str) -> Dict:
+    """Process tree of `service` as nested `tree` plus a depth-annotated `flat` list."""
+    pid = get_pid(LOGS_DIR / f"{service}.pid")
+    if not pid:
+        return {"service": service, "pid": None, "tree": None, "flat": []}
+
+    tree = build_process_tree(pid)
+    if not tree:
+        return {"service": service, "pid": pid, "tree": None, "flat": []}
+
+    flat = []
+    def _flatten(node, depth=0):
+        flat.append({
+            "pid": node["pid"], "ppid": node["ppid"], "depth": depth,
+            "name": node["name"], "cmdline": node["cmdline"], "status": node["status"],
+            "cpu_percent": node["cpu_percent"], "memory_mb": node["memory_mb"],
+            "memory_percent": node["memory_percent"], "read_bytes": node["read_bytes"],
+            "write_bytes": node["write_bytes"], "num_threads": node["num_threads"],
+            "create_time": node["create_time"],
+        })
+        for child in node.get("children", []):
+            _flatten(child, depth + 1)
+    _flatten(tree)
+
+    return {"service": service, "pid": pid, "tree": tree, "flat": flat}
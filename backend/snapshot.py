@@ -0,0 +1,259 @@
+"""Shared dashboard snapshot: one background producer, any number of readers."""
+
+import asyncio
+import hashlib
+import json
+import time
+from typing import Dict, Optional
+
+from .models import DashboardStatus, PlatformStatus
+from .services import build_dashboard_status
+
+# Fields that change on every tick while a service keeps running. Deltas only
+# carry them when the pid changes; clients extrapolate them until the next keyframe.
+VOLATILE_SERVICE_FIELDS = ("uptime", "uptime_seconds", "heartbeat_age", "heartbeat_latency_ms")
+
+# System metrics move on every sample. The dashboard fingerprint sees them
+# through a deadband: a field only counts as changed once it drifts a full
+# step from the value last fingerprinted, so an idle host revalidates to 304
+# and a reading hovering around a step boundary does not flap the ETag.
+PERCENT_STEP = 5.0                  # cpu/memory/disk percent and per-core cpu
+SIZE_STEP_RATIO = 0.01              # memory/disk used and free, as a fraction of the total
+RATE_FLOOR = 0.1                    # MB/s below which a rate counts as idle
+RATE_STEP_RATIO = 2.0               # a busy rate must halve or double to count
+_PERCENT_FIELDS = ("cpu_percent", "memory_percent", "disk_percent")
+_SIZE_FIELDS = (("memory_used", "memory_total"), ("disk_used", "disk_total"), ("disk_free", "disk_total"))
+_RATE_FIELDS = ("net_upload_speed", "net_download_speed", "run_disk_read_speed", "run_disk_write_speed")
+
+
+def _rate_moved(old: float, new: float) -> bool:
+    if old < RATE_FLOOR or new < RATE_FLOOR:
+        return (old < RATE_FLOOR) != (new < RATE_FLOOR)
+    return max(old, new) >= min(old, new) * RATE_STEP_RATIO
+
+
+def settle_metrics(reference: Optional[Dict], metrics: Dict) -> Dict:
+    """Metrics as the dashboard fingerprint sees them, given the previous view.
+
+    Fields that stayed within their deadband of `reference` keep the
+    reference value; anything else (and the timestamp, dropped) is taken
+    from `metrics`.
+    """
+    settled = {k: v for k, v in metrics.items() if k != "timestamp"}
+    if reference is None:
+        return settled
+    for key in _PERCENT_FIELDS:
+        if abs(metrics.get(key, 0.0) - reference.get(key, 0.0)) < PERCENT_STEP:
+            settled[key] = reference.get(key, 0.0)
+    cores, old_cores = metrics.get("cpu_percents") or [], reference.get("cpu_percents") or []
+    if len(cores) == len(old_cores):
+        settled["cpu_percents"] = [
+            old if abs(new - old) < PERCENT_STEP else new for old, new in zip(old_cores, cores)
+        ]
+    for key, total in _SIZE_FIELDS:
+        if metrics.get(total) == reference.get(total) and \
+                abs(metrics.get(key, 0) - reference.get(key, 0)) < metrics.get(total, 0) * SIZE_STEP_RATIO:
+            settled[key] = reference.get(key, 0)
+    for key in _RATE_FIELDS:
+        if not _rate_moved(reference.get(key, 0.0), metrics.get(key, 0.0)):
+            settled[key] = reference.get(key, 0.0)
+    return settled
+
+
+def content_fingerprint(dump: Dict, metrics: Optional[Dict] = None) -> str:
+    """Hash of a dashboard dump ignoring timestamps and per-tick volatile fields.
+
+    Two snapshots with the same fingerprint render identically on a client
+    that extrapolates uptime locally, so it is safe to answer them with 304.
+    `metrics`, the settle_metrics() view, is hashed along when given.
+    """
+    content = {
+        "status": dump["status"],
+        "services": [
+            {k: v for k, v in svc.items() if k not in VOLATILE_SERVICE_FIELDS}
+            for svc in dump["services"]
+        ],
+    }
+    if metrics is not None:
+        content["metrics"] = metrics
+    encoded = json.dumps(content, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.blake2b(encoded.encode(), digest_size=8).hexdigest()
+
+
+def diff_dashboard(prev: Dict, cur: Dict) -> Dict:
+    """Describe how dashboard dump `cur` differs from `prev` (both from model_dump())."""
+    delta: Dict = {"status": cur["status"], "timestamp": cur["timestamp"]}
+    prev_services = {s["name"]: s for s in prev["services"]}
+    cur_names = [s["name"] for s in cur["services"]]
+    changed: Dict[str, Dict] = {}
+    added = []
+    for svc in cur["services"]:
+        old = prev_services.get(svc["name"])
+        if old is None:
+            added.append(svc)
+            continue
+        restarted = old.get("pid") != svc.get("pid")
+        fields = {
+            key: value for key, value in svc.items()
+            if old.get(key) != value and (restarted or key not in VOLATILE_SERVICE_FIELDS)
+        }
+        if fields:
+            changed[svc["name"]] = fields
+    if changed:
+        delta["services"] = changed
+    if added:
+        delta["added"] = added
+    removed = [name for name in prev_services if name not in set(cur_names)]
+    if removed:
+        delta["removed"] = removed
+    if added or removed or cur_names != [s["name"] for s in prev["services"]]:
+        delta["order"] = cur_names
+    metrics = {key: value for key, value in cur["metrics"].items() if prev["metrics"].get(key) != value}
+    if metrics:
+        delta["metrics"] = metrics
+    return delta
+
+
+class DashboardSnapshotStore:
+    """Holds the latest DashboardStatus and wakes readers when a new one is published.
+
+    The producer publishes once per tick; HTTP handlers and SSE streams only
+    read the stored snapshot, so per-tick cost does not grow with the number
+    of connected clients.
+    """
+
+    def __init__(self):
+        self.status: Optional[DashboardStatus] = None
+        self.status_json: str = ""
+        self.version = 0
+        self._dump: Optional[Dict] = None
+        self._prev_dump: Optional[Dict] = None
+        self._keyframe_cache = (0, "")
+        self._delta_cache = (0, "")
+        self._platform_cache = (0, "")
+        # Content versions only move when the fingerprint changes, unlike `version`
+        # which moves every tick. "status" covers services, "dashboard" adds metrics.
+        self.etags: Dict[str, str] = {"status": "", "dashboard": ""}
+        self.content_versions: Dict[str, int] = {"status": 0, "dashboard": 0}
+        self._settled_metrics: Optional[Dict] = None
+        self._updated: Optional[asyncio.Event] = None
+        self._refresh: Optional[asyncio.Event] = None
+        self._build_lock: Optional[asyncio.Lock] = None
+
+    # Events are created lazily so they bind to the running loop, not the import-time one.
+    def _updated_event(self) -> asyncio.Event:
+        if self._updated is None:
+            self._updated = asyncio.Event()
+        return self._updated
+
+    def _refresh_event(self) -> asyncio.Event:
+        if self._refresh is None:
+            self._refresh = asyncio.Event()
+        return self._refresh
+
+    def publish(self, status: DashboardStatus):
+        self.version += 1
+        status.version = self.version
+        self.status = status
+        self.status_json = status.model_dump_json()
+        self._prev_dump = self._dump
+        self._dump = status.model_dump()
+        self._settled_metrics = settle_metrics(self._settled_metrics, self._dump["metrics"])
+        for kind, metrics in (("status", None), ("dashboard", self._settled_metrics)):
+            # Weak: equal fingerprints render the same, but the bodies are not byte-identical
+            etag = 'W/"%s"' % content_fingerprint(self._dump, metrics)
+            if etag != self.etags[kind]:
+                self.etags[kind] = etag
+                self.content_versions[kind] += 1
+        # Wake everyone waiting on this version, then arm a fresh event for the next one.
+        event = self._updated_event()
+        self._updated = asyncio.Event()
+        event.set()
+
+    @property
+    def dump(self) -> Optional[Dict]:
+        """model_dump() of the current snapshot. Shared — treat as read-only."""
+        return self._dump
+
+    def platform_json(self) -> str:
+        """PlatformStatus encoding of the current snapshot, encoded once per version."""
+        if self._platform_cache[0] != self.version:
+            self._platform_cache = (self.version, to_platform_status(self.status).model_dump_json())
+        return self._platform_cache[1]
+
+    def keyframe_message(self) -> str:
+        """Full snapshot framed for the delta protocol, encoded once per version."""
+        if self._keyframe_cache[0] != self.version:
+            message = f'{{"type":"keyframe","seq":{self.version},"data":{self.status_json}}}'
+            self._keyframe_cache = (self.version, message)
+        return self._keyframe_cache[1]
+
+    def delta_message(self) -> Optional[str]:
+        """Changes from the previous version to the current one, encoded once per version."""
+        if self._prev_dump is None or self._dump is None:
+            return None
+        if self._delta_cache[0] != self.version:
+            delta = {"type": "delta", "seq": self.version, "prev": self.version - 1}
+            delta.update(diff_dashboard(self._prev_dump, self._dump))
+            self._delta_cache = (self.version, json.dumps(delta, ensure_ascii=False, separators=(",", ":")))
+        return self._delta_cache[1]
+
+    async def wait_for_update(self, since: int, timeout: float) -> bool:
+        """Wait until a snapshot newer than `since` exists. Returns False on timeout."""
+        if self.version > since:
+            return True
+        try:
+            await asyncio.wait_for(self._updated_event().wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return False
+        return self.version > since
+
+    async def wait_for_content_change(self, kind: str, since: int, timeout: float) -> bool:
+        """Long-poll helper: wait until content version `kind` moves past `since`."""
+        deadline = time.monotonic() + timeout
+        while self.content_versions[kind] <= since:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not await self.wait_for_update(self.version, remaining):
+                return False
+        return True
+
+    def request_refresh(self):
+        """Ask the producer to build the next snapshot now instead of at the next tick."""
+        self._refresh_event().set()
+
+    async def wait_refresh(self, timeout: float):
+        event = self._refresh_event()
+        try:
+            await asyncio.wait_for(event.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+        event.clear()
+
+    async def refresh(self) -> DashboardStatus:
+        status = await asyncio.to_thread(build_dashboard_status)
+        self.publish(status)
+        return status
+
+    async def get(self) -> DashboardStatus:
+        """Return the current snapshot, building the first one if the producer has not yet."""
+        if self.status is not None:
+            return self.status
+        if self._build_lock is None:
+            self._build_lock = asyncio.Lock()
+        async with self._build_lock:
+            if self.status is None:
+                await self.refresh()
+        return self.status
+
+
+DASHBOARD_SNAPSHOT = DashboardSnapshotStore()
+
+
+def to_platform_status(status: DashboardStatus) -> PlatformStatus:
+    return PlatformStatus(
+        status=status.status,
+        services=status.services,
+        timestamp=status.timestamp,
+        version=status.version,
+    )
+
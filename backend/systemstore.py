@@ -0,0 +1,181 @@
+"""Append-only store for the persisted system CPU/memory trend.
+
+Points are 16-byte (epoch, cpu %, mem %) records appended to one file, so
+persisting a sample is a single write instead of rewriting the whole
+history. Range reads mmap the file and binary-search the epoch column.
+The 24h/7d/30d views the UI asks for are served from rollups kept up to
+date on every append, each sized to at most MAX_POINTS buckets.
+"""
+
+import json
+import math
+import mmap
+import os
+import struct
+import threading
+from collections import deque
+from collections.abc import Sequence
+from bisect import bisect_left
+from datetime import datetime
+from pathlib import Path
+from typing import Deque, Dict, List, Optional
+
+from .config import (
+    logger,
+    SYSTEM_METRICS_FILE, SYSTEM_METRICS_STORE_FILE, SYSTEM_METRICS_MAX_POINTS, SYSTEM_METRICS_PERSIST_INTERVAL,
+)
+
+RANGE_SECONDS = {"1h": 3600, "6h": 6*3600, "24h": 24*3600, "7d": 7*24*3600, "30d": 30*24*3600}
+MAX_POINTS = 500
+
+_RECORD = struct.Struct("<qff")         # epoch, cpu %, memory %
+
+
+def _point(epoch: int, cpu: float, mem: float) -> Dict:
+    return {"t": datetime.fromtimestamp(epoch).isoformat(), "c": round(cpu, 1), "m": round(mem, 1)}
+
+
+class _RecordEpochs(Sequence):
+    """Epoch column of a mapped record file, for bisect."""
+
+    def __init__(self, data, count: int):
+        self._data = data
+        self._count = count
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, index: int) -> int:
+        return _RECORD.unpack_from(self._data, index * _RECORD.size)[0]
+
+
+class _Rollup:
+    """Running averages over fixed buckets, keeping just enough to cover one range."""
+
+    def __init__(self, range_seconds: int, interval: int):
+        self.range_seconds = range_seconds
+        self.bucket_seconds = max(interval, math.ceil(range_seconds / MAX_POINTS / interval) * interval)
+        self.buckets: Deque[List] = deque(maxlen=range_seconds // self.bucket_seconds + 1)
+
+    def add(self, epoch: int, cpu: float, mem: float):
+        bucket = epoch - epoch % self.bucket_seconds
+        if self.buckets and self.buckets[-1][0] >= bucket:
+            entry = self.buckets[-1]
+            entry[1] += 1
+            entry[2] += cpu
+            entry[3] += mem
+        else:
+            self.buckets.append([bucket, 1, cpu, mem])
+
+    def points(self, now: float) -> List[Dict]:
+        cutoff = now - self.range_seconds
+        return [_point(b, c / n, m / n) for b, n, c, m in self.buckets if b + self.bucket_seconds > cutoff]
+
+
+class SystemMetricsStore:
+    """Fixed-width record file plus rollups; loaded (and migrated) on first use."""
+
+    def __init__(self, path: Path, legacy_json: Path, max_points: int, interval: int):
+        self.path = path
+        self.legacy_json = legacy_json
+        self.max_points = max_points
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._count = 0
+        self._last_epoch = 0
+        # Ranges that would exceed MAX_POINTS raw records get a rollup
+        self._rollups = {
+            name: _Rollup(seconds, interval)
+            for name, seconds in RANGE_SECONDS.items() if seconds // interval > MAX_POINTS
+        }
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if not self.path.exists() and self.legacy_json.exists():
+            self._migrate()
+        self._compact_if_needed(force=True)
+        data = self.path.read_bytes() if self.path.exists() else b""
+        self._count = len(data) // _RECORD.size
+        for epoch, cpu, mem in _RECORD.iter_unpack(data[:self._count * _RECORD.size]):
+            self._remember(epoch, cpu, mem)
+        self._loaded = True
+
+    def _migrate(self):
+        """Convert the old JSON list of {"t", "c", "m"} into records."""
+        try:
+            entries = json.loads(self.legacy_json.read_text(encoding="utf-8"))
+        except Exception as e:
+            logger.warning(f"System metrics migration skipped: {e}")
+            return
+        records = []
+        for entry in entries if isinstance(entries, list) else []:
+            try:
+                epoch = int(datetime.fromisoformat(entry["t"].replace('Z', '')).timestamp())
+                records.append(_RECORD.pack(epoch, float(entry.get("c", 0)), float(entry.get("m", 0))))
+            except Exception:
+                continue
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_bytes(b"".join(records))
+        os.replace(tmp, self.path)
+        self.legacy_json.rename(self.legacy_json.with_name(self.legacy_json.name + ".migrated"))
+        logger.info(f"Migrated {len(records)} system metrics points to {self.path.name}")
+
+    def _compact_if_needed(self, force: bool = False):
+        """Drop records beyond max_points once the file has grown 25% past it."""
+        try:
+            size = self.path.stat().st_size
+        except FileNotFoundError:
+            return
+        count = size // _RECORD.size
+        if count <= self.max_points * (1 if force else 1.25):
+            return
+        with open(self.path, "rb") as f:
+            f.seek((count - self.max_points) * _RECORD.size)
+            data = f.read(self.max_points * _RECORD.size)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, self.path)
+        self._count = self.max_points
+
+    def _remember(self, epoch: int, cpu: float, mem: float):
+        self._last_epoch = epoch
+        for rollup in self._rollups.values():
+            rollup.add(epoch, cpu, mem)
+
+    def append(self, epoch: int, cpu: float, mem: float):
+        with self._lock:
+            self._ensure_loaded()
+            epoch = max(epoch, self._last_epoch)
+            with open(self.path, "ab") as f:
+                f.write(_RECORD.pack(epoch, cpu, mem))
+            self._count += 1
+            self._remember(epoch, cpu, mem)
+            self._compact_if_needed()
+
+    def _read_range(self, start: Optional[float]) -> List[Dict]:
+        if not self._count:
+            return []
+        with open(self.path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            count = len(data) // _RECORD.size
+            lo = bisect_left(_RecordEpochs(data, count), start) if start is not None else 0
+            stride = max(1, (count - lo) // MAX_POINTS)
+            return [_point(*_RECORD.unpack_from(data, i * _RECORD.size)) for i in range(lo, count, stride)]
+
+    def history(self, range_name: str, now: Optional[float] = None) -> List[Dict]:
+        """Points for a UI range ("1h" ... "30d"); anything else returns all, thinned."""
+        now = datetime.now().timestamp() if now is None else now
+        with self._lock:
+            self._ensure_loaded()
+            rollup = self._rollups.get(range_name)
+            if rollup is not None:
+                return rollup.points(now)
+            seconds = RANGE_SECONDS.get(range_name)
+            return self._read_range(now - seconds if seconds else None)
+
+
+SYSTEM_METRICS_STORE = SystemMetricsStore(
+    SYSTEM_METRICS_STORE_FILE, SYSTEM_METRICS_FILE, SYSTEM_METRICS_MAX_POINTS, SYSTEM_METRICS_PERSIST_INTERVAL,
+)
@@ -1,80 +1,281 @@
 """Background async tasks: metrics sampling, log maintenance, system metrics persistence."""
 
 import asyncio
-import json
+import time
 from collections import deque
 from datetime import datetime
-from typing import Dict, List
-
-import psutil
+from typing import Deque, Dict, Optional, Set, Tuple
 
 from .config import (
     LOGS_DIR, logger,
     load_config, get_all_services,
-    METRICS_HISTORY, METRICS_LAST_IO_READ, METRICS_LAST_IO_WRITE,
-    MAX_METRICS_POINTS, METRICS_INTERVAL_SECONDS,
-    SYSTEM_METRICS_FILE, SYSTEM_METRICS_PERSIST_INTERVAL, SYSTEM_METRICS_MAX_POINTS,
+    METRICS_HISTORY, METRICS_LAST_IO_READ, METRICS_LAST_IO_WRITE, METRICS_LAST_COUNTERS,
+    MAX_METRICS_POINTS, METRICS_INTERVAL_SECONDS, METRICS_COMPACT_INTERVAL, METRICS_ROLLUP_SAVE_INTERVAL,
+    SYSTEM_METRICS_PERSIST_INTERVAL,
+    DASHBOARD_REFRESH_SECONDS, SYSTEM_METRICS_SAMPLE_INTERVAL,
 )
-from .services import get_pid, _get_process_tree_metrics
+from .services import get_pid, _get_process_tree_metrics, sample_system_metrics, get_system_metrics
+from .snapshot import DASHBOARD_SNAPSHOT
+from .proctable import get_process_table
 from .logs import rotate_log_if_needed, enforce_total_log_size
+from .metricstore import MetricsHistory
+from .metricsarchive import METRICS_ARCHIVE
+from .systemstore import SYSTEM_METRICS_STORE
+from .broadcast import METRICS_BROADCAST
+from .alerts import ALERT_ENGINE
+
+
+class SamplerStats:
+    """Timing of recent metrics_sampler ticks, for /api/metrics/sampler."""
+
+    WINDOW = 60
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.ticks = 0
+        self.missed_ticks = 0
+        self.errors = 0
+        self.last_tick_at: Optional[str] = None
+        self.durations: Deque[float] = deque(maxlen=self.WINDOW)
+        self.lags: Deque[float] = deque(maxlen=self.WINDOW)
+        self.scan_seconds = 0.0
+        self.service_seconds: Dict[str, float] = {}
 
+    def record(self, duration: float, lag: float, scan_seconds: float, service_seconds: Dict[str, float]):
+        self.ticks += 1
+        self.last_tick_at = datetime.now().isoformat()
+        self.durations.append(duration)
+        self.lags.append(lag)
+        self.scan_seconds = scan_seconds
+        self.service_seconds = service_seconds
 
-def _init_metrics_history(config: dict):
-    global METRICS_HISTORY
+    def as_dict(self) -> Dict:
+        durations = sorted(self.durations)
+        avg = sum(durations) / len(durations) if durations else 0.0
+        ms = lambda seconds: round(seconds * 1000, 2)
+        return {
+            "interval_seconds": self.interval,
+            "ticks": self.ticks,
+            "missed_ticks": self.missed_ticks,
+            "errors": self.errors,
+            "last_tick_at": self.last_tick_at,
+            "last_duration_ms": ms(self.durations[-1]) if self.durations else None,
+            "avg_duration_ms": ms(avg),
+            "p95_duration_ms": ms(durations[int(len(durations) * 0.95)]) if durations else None,
+            "max_duration_ms": ms(durations[-1]) if durations else None,
+            "max_lag_ms": ms(max(self.lags)) if self.lags else None,
+            "utilization": round(avg / self.interval, 4),
+            "scan_ms": ms(self.scan_seconds),
+            "services_ms": {name: ms(cost) for name, cost in
+                            sorted(self.service_seconds.items(), key=lambda item: item[1], reverse=True)},
+        }
+
+
+SAMPLER_STATS = SamplerStats(METRICS_INTERVAL_SECONDS)
+
+
+# (cumulative counter from the tree metrics, per-second history field)
+_RATE_COUNTERS = (
+    ("major_faults", "major_faults_s"),
+    ("voluntary_ctx_switches", "voluntary_ctx_switches_s"),
+    ("involuntary_ctx_switches", "involuntary_ctx_switches_s"),
+)
+
+
+def _sample_services() -> Tuple[Dict[str, Dict[str, float]], Set[str], float, Dict[str, float]]:
+    """One sampling pass (worker thread): values per service, running services, scan time, per-service cost."""
+    config = load_config()
+    started = time.perf_counter()
+    proc_table = get_process_table(max_age=0)
+    scan_seconds = time.perf_counter() - started
+    samples: Dict[str, Dict[str, float]] = {}
+    running: Set[str] = set()
+    costs: Dict[str, float] = {}
     for svc in config.get("services", []):
         name = svc.get("name")
-        if name:
-            METRICS_HISTORY.setdefault(name, deque(maxlen=MAX_METRICS_POINTS))
+        if not name:
+            continue
+        started = time.perf_counter()
+        pid = get_pid(LOGS_DIR / f"{name}.pid")
+        if pid:
+            m = _get_process_tree_metrics(pid, proc_table, name)
+            if pid in proc_table:
+                running.add(name)
+        else:
+            m = {"cpu_percent": 0.0, "memory_mb": 0.0, "read_bytes": 0, "write_bytes": 0}
+        last_read = METRICS_LAST_IO_READ.get(name, m["read_bytes"])
+        last_write = METRICS_LAST_IO_WRITE.get(name, m["write_bytes"])
+        delta_read = max(m["read_bytes"] - last_read, 0)
+        delta_write = max(m["write_bytes"] - last_write, 0)
+        METRICS_LAST_IO_READ[name] = m["read_bytes"]
+        METRICS_LAST_IO_WRITE[name] = m["write_bytes"]
+        samples[name] = {
+            "cpu_percent": m["cpu_percent"],
+            "memory_mb": m["memory_mb"],
+            "read_mb_s": round(delta_read / (1024 * 1024 * METRICS_INTERVAL_SECONDS), 3),
+            "write_mb_s": round(delta_write / (1024 * 1024 * METRICS_INTERVAL_SECONDS), 3),
+            "open_fds": m.get("open_fds", 0),
+            "threads": m.get("threads", 0),
+            "tcp_connections": m.get("tcp_connections", 0),
+        }
+        # Cumulative counters become per-second rates; a stopped service starts
+        # from a fresh baseline so its restart does not show as a spike.
+        last = METRICS_LAST_COUNTERS.setdefault(name, {}) if pid else METRICS_LAST_COUNTERS.pop(name, {})
+        for counter, field in _RATE_COUNTERS:
+            value = m.get(counter, 0)
+            samples[name][field] = round(max(value - last.get(counter, value), 0) / METRICS_INTERVAL_SECONDS, 2)
+            last[counter] = value
+        costs[name] = time.perf_counter() - started
+    return samples, running, scan_seconds, costs
 
 
 async def metrics_sampler():
+    """Sample every service in a worker thread on absolute deadlines.
+
+    Ticks are scheduled at start + n * interval, so a slow pass does not push
+    later ones back; a pass that overruns whole intervals counts them as
+    missed and realigns instead of bursting.
+    """
+    loop = asyncio.get_running_loop()
+    next_tick = loop.time()
     while True:
+        started = loop.time()
         try:
-            config = load_config()
-            if not METRICS_HISTORY:
-                _init_metrics_history(config)
-            timestamp = datetime.now().isoformat()
-            for svc in config.get("services", []):
-                name = svc.get("name")
-                if not name:
-                    continue
-                pid = get_pid(LOGS_DIR / f"{name}.pid")
-                if pid:
-                    m = _get_process_tree_metrics(pid)
-                else:
-                    m = {"cpu_percent": 0.0, "memory_mb": 0.0, "read_bytes": 0, "write_bytes": 0}
-                last_read = METRICS_LAST_IO_READ.get(name, m["read_bytes"])
-                last_write = METRICS_LAST_IO_WRITE.get(name, m["write_bytes"])
-                delta_read = max(m["read_bytes"] - last_read, 0)
-                delta_write = max(m["write_bytes"] - last_write, 0)
-                METRICS_LAST_IO_READ[name] = m["read_bytes"]
-                METRICS_LAST_IO_WRITE[name] = m["write_bytes"]
-                METRICS_HISTORY.setdefault(name, deque(maxlen=MAX_METRICS_POINTS)).append({
-                    "timestamp": timestamp,
-                    "cpu_percent": m["cpu_percent"],
-                    "memory_mb": m["memory_mb"],
-                    "read_mb_s": round(delta_read / (1024 * 1024 * METRICS_INTERVAL_SECONDS), 3),
-                    "write_mb_s": round(delta_write / (1024 * 1024 * METRICS_INTERVAL_SECONDS), 3)
-                })
+            epoch = int(datetime.now().timestamp())
+            samples, running, scan_seconds, costs = await asyncio.to_thread(_sample_services)
+            points = {}
+            for name, values in samples.items():
+                history = METRICS_HISTORY.get(name)
+                if history is None:
+                    history = METRICS_HISTORY[name] = MetricsHistory(MAX_METRICS_POINTS, METRICS_INTERVAL_SECONDS)
+                history.append(epoch, values)
+                METRICS_ARCHIVE.append(name, history.raw.last_epoch(), values)
+                points[name] = history.last()
+            METRICS_BROADCAST.publish(points)
+            ALERT_ENGINE.evaluate(epoch, samples, running)
+            SAMPLER_STATS.record(loop.time() - started, started - next_tick, scan_seconds, costs)
         except Exception as e:
+            SAMPLER_STATS.errors += 1
             logger.warning(f"Metrics sampler error: {e}")
-        await asyncio.sleep(METRICS_INTERVAL_SECONDS)
+        next_tick += METRICS_INTERVAL_SECONDS
+        delay = next_tick - loop.time()
+        if delay < 0:
+            missed = int(-delay // METRICS_INTERVAL_SECONDS) + 1
+            SAMPLER_STATS.missed_ticks += missed
+            next_tick += missed * METRICS_INTERVAL_SECONDS
+            delay = next_tick - loop.time()
+        await asyncio.sleep(delay)
+
+
+# Services whose saved tiers restore_metrics_history has yet to read back (or
+# failed to); saving them would overwrite those tiers with what was sampled
+# since startup. Services added to the config later are never in here.
+_ROLLUPS_UNREAD: Set[str] = set()
+
+
+def _load_archived_history(service: str, now: float) -> Optional[MetricsHistory]:
+    """The raw window from the archive plus the saved rollup tiers (worker thread)."""
+    history = MetricsHistory(MAX_METRICS_POINTS, METRICS_INTERVAL_SECONDS)
+    saved = METRICS_ARCHIVE.load_rollups(service)
+    if saved is not None:
+        try:
+            history.load_rollups(saved[1])
+        except ValueError as e:
+            logger.warning(f"Ignoring saved metrics rollups of {service}: {e}")
+            history, saved = MetricsHistory(MAX_METRICS_POINTS, METRICS_INTERVAL_SECONDS), None
+    if saved is None:
+        # Nothing saved yet (first start with rollups.bin): rebuild the tiers from the archive once
+        epochs, columns = METRICS_ARCHIVE.read(service)
+        history.extend(epochs, columns)
+    else:
+        epochs, columns = METRICS_ARCHIVE.read(service, start=now - MAX_METRICS_POINTS * METRICS_INTERVAL_SECONDS)
+        history.extend(epochs, columns, rolled_up_to=saved[0])
+    if not len(history) and not any(len(tier) for tier in history.tiers):
+        return None
+    return history
+
+
+async def restore_metrics_history():
+    """Reload archived per-service history in the background, one service at a time."""
+    now = datetime.now().timestamp()
+    names = [svc.get("name") for svc in load_config().get("services", []) if svc.get("name")]
+    _ROLLUPS_UNREAD.update(names)
+    for name in names:
+        try:
+            restored = await asyncio.to_thread(_load_archived_history, name, now)
+        except Exception as e:
+            logger.warning(f"Metrics history restore for {name} failed: {e}")
+            continue
+        _ROLLUPS_UNREAD.discard(name)
+        if restored is None:
+            continue
+        live = METRICS_HISTORY.get(name)
+        if live is not None and len(live):
+            # Samples taken while loading may already be on disk; replay only newer ones
+            since = restored.raw.last_epoch()
+            for index in live.raw.range_indices(since + 1 if since is not None else None):
+                epoch, _, fields = live.raw.row(index)
+                restored.append(epoch, {field: values[3] for field, values in fields.items()})
+        METRICS_HISTORY[name] = restored
+    logger.info("Metrics history restored from archive")
 
 
-def _load_system_metrics_history() -> List[Dict]:
-    if not SYSTEM_METRICS_FILE.exists():
-        return []
-    try:
-        data = json.loads(SYSTEM_METRICS_FILE.read_text(encoding="utf-8"))
-        return data if isinstance(data, list) else []
-    except Exception:
-        return []
+async def save_metrics_rollups():
+    """Write the rollup tiers of every sampled service to the archive."""
+    for name, history in list(METRICS_HISTORY.items()):
+        rolled_up_to = history.raw.last_epoch()
+        if name in _ROLLUPS_UNREAD or rolled_up_to is None:
+            continue
+        # The image is taken on the loop so it matches rolled_up_to; only the write is offloaded
+        image = history.rollups_bytes()
+        try:
+            await asyncio.to_thread(METRICS_ARCHIVE.save_rollups, name, rolled_up_to, image)
+        except Exception as e:
+            logger.warning(f"Saving metrics rollups of {name} failed: {e}")
 
 
-def _save_system_metrics_history(entries: List[Dict]):
-    if len(entries) > SYSTEM_METRICS_MAX_POINTS:
-        entries = entries[-SYSTEM_METRICS_MAX_POINTS:]
-    SYSTEM_METRICS_FILE.write_text(json.dumps(entries, ensure_ascii=False), encoding="utf-8")
+async def metrics_archive_compactor():
+    loop = asyncio.get_running_loop()
+    saved_at = loop.time()
+    while True:
+        await asyncio.sleep(METRICS_COMPACT_INTERVAL)
+        try:
+            services = METRICS_ARCHIVE.rotate()
+            await asyncio.to_thread(METRICS_ARCHIVE.compact, services)
+        except Exception as e:
+            logger.warning(f"Metrics archive compaction error: {e}")
+        if loop.time() - saved_at >= METRICS_ROLLUP_SAVE_INTERVAL:
+            saved_at = loop.time()
+            await save_metrics_rollups()
+
+
+async def dashboard_producer():
+    logger.info("Dashboard snapshot producer started")
+    while True:
+        try:
+            await DASHBOARD_SNAPSHOT.refresh()
+        except Exception as e:
+            logger.warning(f"Dashboard snapshot error: {e}")
+        await DASHBOARD_SNAPSHOT.wait_refresh(DASHBOARD_REFRESH_SECONDS)
+
+
+async def system_metrics_sampler():
+    """Sample system metrics on a fixed cadence so rates cover equal windows."""
+    logger.info("System metrics sampler started")
+    loop = asyncio.get_running_loop()
+    next_tick = loop.time()
+    while True:
+        try:
+            await asyncio.to_thread(sample_system_metrics)
+        except Exception as e:
+            logger.warning(f"System metrics sampler error: {e}")
+        next_tick += SYSTEM_METRICS_SAMPLE_INTERVAL
+        delay = next_tick - loop.time()
+        if delay < 0:
+            # Fell behind (e.g. a slow sample); realign instead of bursting
+            next_tick = loop.time()
+            delay = 0
+        await asyncio.sleep(delay)
 
 
 async def system_metrics_persist_loop():
@@ -82,12 +283,9 @@ async def system_metrics_persist_loop():
     while True:
         await asyncio.sleep(SYSTEM_METRICS_PERSIST_INTERVAL)
         try:
-            cpu = psutil.cpu_percent(interval=0)
-            mem = psutil.virtual_memory()
-            point = {"t": datetime.now().isoformat(), "c": round(cpu, 1), "m": round(mem.percent, 1)}
-            entries = _load_system_metrics_history()
-            entries.append(point)
-            _save_system_metrics_history(entries)
+            metrics = get_system_metrics()
+            epoch = int(datetime.now().timestamp())
+            await asyncio.to_thread(SYSTEM_METRICS_STORE.append, epoch, metrics.cpu_percent, metrics.memory_percent)
         except Exception as e:
             logger.warning(f"System metrics persist error: {e}")
 
@@ -102,6 +300,3 @@ async def log_maintenance():
             logger.warning(f"Log maintenance error: {exc}")
         await asyncio.sleep(300)
 
-
-# Re-export for routes
-load_system_metrics_history = _load_system_metrics_history
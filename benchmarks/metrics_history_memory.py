@@ -0,0 +1,90 @@
+"""Memory per service of a full 24 h metrics history: deque of dicts vs. ring buffer.
+
+Also reports the raw ring plus all rollup tiers filled to their retention.
+
+Usage (from the repository root):
+    python benchmarks/metrics_history_memory.py [--points N] [--services N]
+"""
+
+import argparse
+import gc
+import os
+import random
+import sys
+import time
+import tracemalloc
+from collections import deque
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from backend.metricstore import METRIC_FIELDS, MetricsHistory, MetricsRingBuffer, ROLLUP_TIERS  # noqa: E402
+
+DEFAULT_POINTS = 24 * 3600 // 10
+
+
+def _samples(points: int):
+    rng = random.Random(42)
+    start = int(time.time()) - points * 10
+    for i in range(points):
+        yield start + i * 10, {field: round(rng.uniform(0, 400), 2) for field in METRIC_FIELDS}
+
+
+def build_deque(points: int) -> deque:
+    history = deque(maxlen=points)
+    for epoch, values in _samples(points):
+        history.append({"timestamp": datetime.fromtimestamp(epoch).isoformat(), **values})
+    return history
+
+
+def build_ring(points: int) -> MetricsRingBuffer:
+    history = MetricsRingBuffer(points)
+    for epoch, values in _samples(points):
+        history.append(epoch, values)
+    return history
+
+
+def build_full_history(points: int) -> MetricsHistory:
+    """Raw ring of `points` plus rollup tiers filled to their full retention."""
+    history = MetricsHistory(points, 10)
+    for epoch, values in _samples(points):
+        history.raw.append(epoch, values)
+    # One sample per bucket is enough to size a tier: bucket memory does not
+    # depend on how many raw points were folded into it.
+    for tier in history.tiers:
+        for i, (_, values) in enumerate(_samples(tier.capacity)):
+            tier.add(i * tier.step_seconds, values)
+    return history
+
+
+def measure(builder, points: int, services: int) -> float:
+    """Average traced bytes per service for `services` histories of `points` points."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = [builder(points) for _ in range(services)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return (after - before) / services
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--points", type=int, default=DEFAULT_POINTS)
+    parser.add_argument("--services", type=int, default=3)
+    args = parser.parse_args()
+
+    old = measure(build_deque, args.points, args.services)
+    new = measure(build_ring, args.points, args.services)
+    print(f"points per service: {args.points}")
+    print(f"deque of dicts : {old / 1024 / 1024:8.2f} MiB/service ({old / args.points:6.1f} B/point)")
+    print(f"ring buffer    : {new / 1024 / 1024:8.2f} MiB/service ({new / args.points:6.1f} B/point)")
+    print(f"reduction      : {old / new:8.1f}x")
+    full = measure(build_full_history, args.points, 1)
+    tiers = ", ".join(name for _, _, name in ROLLUP_TIERS)
+    print(f"ring + rollups : {full / 1024 / 1024:8.2f} MiB/service (raw 24 h + {tiers} tiers at full retention)")
+
+
+if __name__ == "__main__":
+    main()
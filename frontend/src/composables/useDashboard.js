@@ -1,6 +1,7 @@
 import { ref } from 'vue'
+import { useSubscriptions } from './useSubscriptions'
 
-export function useDashboard({ authorizedFetch, showNotification, t, servicesStatus, mergeServicesData } = {}) {
+export function useDashboard({ authorizedFetch, showNotification, t, servicesStatus, mergeServicesData, metricAlerts } = {}) {
   const systemMetrics = ref({
     cpu_percent: 0,
     cpu_count: 0,
@@ -24,31 +25,46 @@ export function useDashboard({ authorizedFetch, showNotification, t, servicesSta
   const statusTicker = ref(0)
   const isConnected = ref(false)
   let statusInterval = null
-  let dashboardEventSource = null
+  let unsubscribeDashboard = null
+  let unsubscribeAlerts = null
+  let removeDisconnectListener = null
+  const { subscribe, resubscribe, onDisconnect } = useSubscriptions()
   let statusUptimeInterval = null
 
+  // ETags of the last 200 responses; unchanged snapshots come back as 304
+  const etags = {}
+
+  const fetchSnapshot = async (url) => {
+    const headers = etags[url] ? { 'If-None-Match': etags[url] } : {}
+    const response = await authorizedFetch(url, { headers, cache: 'no-store' })
+    if (response.status === 304) return null
+    if (!response.ok) throw new Error('Failed to fetch status')
+    etags[url] = response.headers.get('ETag')
+    return response.json()
+  }
+
   const refreshStatus = async () => {
     try {
-      const response = await authorizedFetch('/api/dashboard')
-      if (!response.ok) throw new Error('Failed to fetch status')
-      const data = await response.json()
-      mergeServicesData(Array.isArray(data.services) ? data.services : [])
-      systemMetrics.value = data.metrics
-      lastUpdated.value = data.timestamp
-      statusFetchedAt.value = Date.now()
-      statusTicker.value = Date.now()
+      const data = await fetchSnapshot('/api/dashboard')
+      if (data) {
+        mergeServicesData(Array.isArray(data.services) ? data.services : [])
+        systemMetrics.value = data.metrics
+        lastUpdated.value = data.timestamp
+        statusFetchedAt.value = Date.now()
+        statusTicker.value = Date.now()
+      }
       isConnected.value = true
     } catch (error) {
       if (error.message === 'Unauthorized') return
       console.error('Error refreshing status:', error)
       try {
-        const response = await authorizedFetch('/api/status')
-        if (!response.ok) throw new Error('Failed to fetch status')
-        const data = await response.json()
-        mergeServicesData(Array.isArray(data.services) ? data.services : [])
-        lastUpdated.value = data.timestamp
-        statusFetchedAt.value = Date.now()
-        statusTicker.value = Date.now()
+        const data = await fetchSnapshot('/api/status')
+        if (data) {
+          mergeServicesData(Array.isArray(data.services) ? data.services : [])
+          lastUpdated.value = data.timestamp
+          statusFetchedAt.value = Date.now()
+          statusTicker.value = Date.now()
+        }
         isConnected.value = true
       } catch (fallbackError) {
         if (fallbackError.message === 'Unauthorized') return
@@ -58,28 +74,109 @@ export function useDashboard({ authorizedFetch, showNotification, t, servicesSta
     }
   }
 
-  const startDashboardSSE = (authToken, buildApiUrl) => {
-    if (dashboardEventSource) dashboardEventSource.close()
-    if (!authToken?.value) return
-    dashboardEventSource = new EventSource(buildApiUrl(`/api/dashboard/sse?token=${encodeURIComponent(authToken.value)}`))
-    dashboardEventSource.onmessage = (event) => {
-      try {
-        const data = JSON.parse(event.data)
-        mergeServicesData(Array.isArray(data.services) ? data.services : [])
-        systemMetrics.value = data.metrics
-        lastUpdated.value = data.timestamp
-        statusFetchedAt.value = Date.now()
-        statusTicker.value = Date.now()
-        isConnected.value = true
-      } catch (e) {}
+  // Delta protocol state: the last applied snapshot and its sequence number
+  let dashboardSnapshot = null
+  let dashboardSeq = 0
+
+  const applyDashboardData = (data) => {
+    mergeServicesData(Array.isArray(data.services) ? data.services : [])
+    systemMetrics.value = data.metrics
+    lastUpdated.value = data.timestamp
+    statusFetchedAt.value = Date.now()
+    statusTicker.value = Date.now()
+    isConnected.value = true
+  }
+
+  const applyKeyframe = (msg) => {
+    const now = Date.now()
+    dashboardSnapshot = {
+      ...msg.data,
+      services: (msg.data.services || []).map(s => ({ ...s, _uptime_at: now })),
+    }
+    dashboardSeq = msg.seq
+    applyDashboardData(dashboardSnapshot)
+  }
+
+  const applyDelta = (msg) => {
+    const now = Date.now()
+    const byName = new Map(dashboardSnapshot.services.map(s => [s.name, s]))
+    for (const [name, fields] of Object.entries(msg.services || {})) {
+      const prev = byName.get(name)
+      if (!prev) continue
+      const next = { ...prev, ...fields }
+      if ('uptime_seconds' in fields) next._uptime_at = now
+      byName.set(name, next)
+    }
+    for (const svc of msg.added || []) byName.set(svc.name, { ...svc, _uptime_at: now })
+    for (const name of msg.removed || []) byName.delete(name)
+    const order = msg.order || dashboardSnapshot.services.map(s => s.name)
+    dashboardSnapshot = {
+      ...dashboardSnapshot,
+      status: msg.status,
+      timestamp: msg.timestamp,
+      services: order.map(name => byName.get(name)).filter(Boolean),
+      metrics: msg.metrics ? { ...dashboardSnapshot.metrics, ...msg.metrics } : dashboardSnapshot.metrics,
+    }
+    dashboardSeq = msg.seq
+    applyDashboardData(dashboardSnapshot)
+  }
+
+  const stopFallbackPolling = () => {
+    if (statusInterval) {
+      clearInterval(statusInterval)
+      statusInterval = null
+    }
+  }
+
+  const handleDashboardMessage = (msg) => {
+    if (msg.type === 'keyframe') {
+      applyKeyframe(msg)
+      stopFallbackPolling()
+    } else if (msg.type === 'delta') {
+      if (dashboardSnapshot && msg.seq <= dashboardSeq) return
+      if (!dashboardSnapshot || msg.prev !== dashboardSeq) {
+        // Missed an update — ask for a fresh keyframe
+        resubscribe('dashboard')
+        return
+      }
+      applyDelta(msg)
     }
-    dashboardEventSource.onerror = () => {
-      dashboardEventSource.close()
-      dashboardEventSource = null
+  }
+
+  // Live updates arrive over the shared subscription socket; while it is down
+  // the dashboard falls back to conditional polling.
+  const startDashboardSSE = (authToken) => {
+    stopDashboardStream()
+    dashboardSnapshot = null
+    dashboardSeq = 0
+    unsubscribeDashboard = subscribe(authToken, 'dashboard', handleDashboardMessage)
+    if (metricAlerts) {
+      unsubscribeAlerts = subscribe(authToken, 'alerts', (msg) => {
+        metricAlerts.value = (msg.active || []).filter(alert => alert.state === 'firing')
+      })
+    }
+    removeDisconnectListener = onDisconnect(() => {
       isConnected.value = false
-      if (!dashboardEventSource && !statusInterval) {
+      dashboardSnapshot = null
+      dashboardSeq = 0
+      if (!statusInterval) {
         statusInterval = setInterval(refreshStatus, 5000)
       }
+    })
+  }
+
+  const stopDashboardStream = () => {
+    if (unsubscribeDashboard) {
+      unsubscribeDashboard()
+      unsubscribeDashboard = null
+    }
+    if (unsubscribeAlerts) {
+      unsubscribeAlerts()
+      unsubscribeAlerts = null
+    }
+    if (removeDisconnectListener) {
+      removeDisconnectListener()
+      removeDisconnectListener = null
     }
   }
 
@@ -91,14 +188,8 @@ export function useDashboard({ authorizedFetch, showNotification, t, servicesSta
   }
 
   const cleanupDashboard = () => {
-    if (dashboardEventSource) {
-      dashboardEventSource.close()
-      dashboardEventSource = null
-    }
-    if (statusInterval) {
-      clearInterval(statusInterval)
-      statusInterval = null
-    }
+    stopDashboardStream()
+    stopFallbackPolling()
     if (statusUptimeInterval) {
       clearInterval(statusUptimeInterval)
       statusUptimeInterval = null
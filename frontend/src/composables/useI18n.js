@@ -31,6 +31,8 @@ const translations = {
     heartbeat_invalid_url: '心跳地址无效',
     heartbeat_http_error: '心跳返回 HTTP {code}',
     heartbeat_mock_failed: '心跳模拟失败',
+    heartbeat_pending: '等待首次心跳检测',
+    heartbeat_stale: '心跳结果已过期',
     active_services: '运行服务',
     cpu_usage: 'CPU 使用率',
     memory_usage: '内存使用率',
@@ -371,6 +373,8 @@ const translations = {
     heartbeat_invalid_url: 'Heartbeat URL invalid',
     heartbeat_http_error: 'Heartbeat returned HTTP {code}',
     heartbeat_mock_failed: 'Heartbeat mock failed',
+    heartbeat_pending: 'Waiting for first heartbeat probe',
+    heartbeat_stale: 'Heartbeat result is stale',
     active_services: 'Active Services',
     cpu_usage: 'CPU Usage',
     memory_usage: 'Memory Usage',
@@ -1,4 +1,5 @@
 import { ref, computed, nextTick, watch } from 'vue'
+import { useSubscriptions } from './useSubscriptions'
 
 export function useLogs({
   authorizedFetch,
@@ -9,6 +10,7 @@ export function useLogs({
   authToken,
   openConfirmDialog,
 }) {
+  const { subscribe } = useSubscriptions()
   const logs = ref({})
   const logsLoading = ref({})
   const logsMeta = ref({})
@@ -212,58 +214,52 @@ export function useLogs({
     }
   }
 
-  let logSocket = null
   let logSocketService = null
-  let logSocketReconnectTimer = null
+  let unsubscribeLogs = null
+
+  // Lines received while paused are held back and appended on resume
+  let pausedLiveLines = []
+
+  const appendLiveLogs = (service, lines) => {
+    if (logMode.value !== 'live' || !lines.length) return
+    if (logPaused.value) {
+      pausedLiveLines.push(...lines)
+      if (pausedLiveLines.length > LIVE_LOG_LIMIT) pausedLiveLines.splice(0, pausedLiveLines.length - LIVE_LOG_LIMIT)
+      return
+    }
+    const meta = logsMeta.value[service]
+    const offset = meta ? (meta.offset || 0) : 0
+    const arr = [...(logs.value[service] || [])]
+    for (const line of lines) {
+      arr.push({ type: 'log', service, ...line, line: offset + arr.length + 1 })
+    }
+    if (arr.length > LIVE_LOG_LIMIT) arr.splice(0, arr.length - LIVE_LOG_LIMIT)
+    logs.value[service] = arr
+    if (logsMeta.value[service]) {
+      logsMeta.value[service].total = offset + arr.length
+    } else {
+      logsMeta.value[service] = { total: offset + arr.length, offset }
+    }
+    if (followLogs.value && !logPaused.value) nextTick(scrollLogsToBottom)
+  }
 
   const connectLogWebSocket = (service) => {
     if (!service) return
     if (authToken && !authToken.value) return
+    cleanupLogsSocket()
     logSocketService = service
-    if (logSocketReconnectTimer) {
-      clearTimeout(logSocketReconnectTimer)
-      logSocketReconnectTimer = null
-    }
-    if (logSocket) logSocket.close()
-  const token = authToken?.value ? encodeURIComponent(authToken.value) : ''
-  const wsUrl = buildWsUrl(`/api/ws/logs/${service}?token=${token}`)
-    logSocket = new WebSocket(wsUrl)
-    logSocket.onmessage = (event) => {
-      const data = JSON.parse(event.data)
-      if (data.type === 'log') {
-        if (logMode.value !== 'live') return
-        const meta = logsMeta.value[service]
-        const offset = meta ? (meta.offset || 0) : 0
-        const curLen = logs.value[service]?.length || 0
-        data.line = offset + curLen + 1
-        const arr = [...(logs.value[service] || []), data]
-        if (arr.length > LIVE_LOG_LIMIT) arr.splice(0, arr.length - LIVE_LOG_LIMIT)
-        logs.value[service] = arr
-        if (logsMeta.value[service]) {
-          logsMeta.value[service].total = offset + arr.length
-        } else {
-          logsMeta.value[service] = { total: offset + arr.length, offset }
-        }
-        if (followLogs.value && !logPaused.value) nextTick(scrollLogsToBottom)
-      }
-    }
-    logSocket.onclose = () => {
-      if (selectedService.value && logSocketService === selectedService.value && service === selectedService.value) {
-        logSocketReconnectTimer = setTimeout(() => connectLogWebSocket(service), 2000)
-      }
-    }
+    pausedLiveLines = []
+    unsubscribeLogs = subscribe(authToken, `logs:${service}`, (data) => {
+      if (data.type === 'logs') appendLiveLogs(service, data.lines || [])
+    })
   }
 
   const cleanupLogsSocket = () => {
-    if (logSocketReconnectTimer) {
-      clearTimeout(logSocketReconnectTimer)
-      logSocketReconnectTimer = null
-    }
-    if (logSocket) {
-      logSocket.close()
-      logSocket = null
-      logSocketService = null
+    if (unsubscribeLogs) {
+      unsubscribeLogs()
+      unsubscribeLogs = null
     }
+    logSocketService = null
   }
 
   const logLevelCounts = ref({ ERROR: 0, WARNING: 0, INFO: 0, DEBUG: 0 })
@@ -309,7 +305,7 @@ export function useLogs({
       logsMeta.value[svc] = { total: 0, offset: 0 }
       connectLogWebSocket(svc)
     } else {
-      if (logSocket) { logSocket.close(); logSocket = null; logSocketService = null }
+      cleanupLogsSocket()
       logPaused.value = false
       followLogs.value = false
       loadLogs(svc)
@@ -712,8 +708,10 @@ export function useLogs({
   const togglePause = async () => {
     if (logMode.value !== 'live') return
     logPaused.value = !logPaused.value
-    if (logSocket && logSocket.readyState === 1) {
-      logSocket.send(JSON.stringify({ action: logPaused.value ? 'pause' : 'resume' }))
+    if (!logPaused.value && logSocketService) {
+      const held = pausedLiveLines
+      pausedLiveLines = []
+      appendLiveLogs(logSocketService, held)
     }
     if (logPaused.value) {
       followLogs.value = false
@@ -763,9 +761,7 @@ export function useLogs({
       logHasMorePrev.value[service] = false
       logHasMoreNext.value[service] = false
       logLevelFilter.value = 'ALL'
-      if (logSocket && logSocket.readyState === 1) {
-        logSocket.send(JSON.stringify({ action: 'clear' }))
-      }
+      pausedLiveLines = []
       showNotification(t('clear_logs_success'), 'success')
     }
     if (openConfirmDialog) {
@@ -1,4 +1,5 @@
 import { ref, computed, watch, nextTick } from 'vue'
+import { useSubscriptions } from './useSubscriptions'
 
 let echartsModule = null
 const loadEcharts = async () => {
@@ -21,7 +22,8 @@ export function useMetrics({
   const metricsHistory = ref({})
   const metricsLoading = ref(false)
   const metricsRangeHours = ref(24)
-  let metricsEventSource = null
+  let unsubscribeMetrics = null
+  const { subscribe } = useSubscriptions()
   let cpuChart = null
   let memoryChart = null
   let diskChart = null
@@ -206,13 +208,9 @@ export function useMetrics({
 
   const setupMetricsSSE = (service) => {
     if (!authToken?.value) return
-    if (metricsEventSource) metricsEventSource.close()
-    metricsEventSource = new EventSource(
-      buildApiUrl(`/api/metrics/sse?service=${service}&token=${encodeURIComponent(authToken.value || '')}`)
-    )
-    metricsEventSource.onmessage = (event) => {
+    cleanupMetricsStream()
+    unsubscribeMetrics = subscribe(authToken, `metrics:${service}`, (point) => {
       try {
-        const point = JSON.parse(event.data)
         const history = metricsHistory.value[service] || []
         const last = history[history.length - 1]
         if (last && last.timestamp === point.timestamp) {
@@ -222,7 +220,7 @@ export function useMetrics({
         }
         metricsHistory.value[service] = history
 
-        // Throttled chart update — avoid redrawing on every SSE message
+        // Throttled chart update — avoid redrawing on every pushed point
         if (!_metricsUpdatePending) {
           _metricsUpdatePending = true
           requestAnimationFrame(() => {
@@ -231,7 +229,7 @@ export function useMetrics({
           })
         }
       } catch (e) {}
-    }
+    })
   }
 
   const openMetrics = async (service) => {
@@ -245,9 +243,9 @@ export function useMetrics({
   }
 
   const cleanupMetricsStream = () => {
-    if (metricsEventSource) {
-      metricsEventSource.close()
-      metricsEventSource = null
+    if (unsubscribeMetrics) {
+      unsubscribeMetrics()
+      unsubscribeMetrics = null
     }
   }
 
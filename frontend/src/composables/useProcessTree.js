@@ -1,31 +1,27 @@
 import { ref, onUnmounted } from 'vue'
+import { useSubscriptions } from './useSubscriptions'
 
-export function useProcessTree({ authorizedFetch, showNotification, t }) {
+export function useProcessTree({ authorizedFetch, showNotification, t, authToken }) {
   const showPidTree = ref(false)
   const pidTreeService = ref('')
   const pidTreeData = ref(null)
   const pidTreeLoading = ref(false)
-  let _pollTimer = null
-  const POLL_INTERVAL = 5000 // 5 seconds
+  let _unsubscribe = null
+  const { subscribe } = useSubscriptions()
 
+  // Live updates are pushed over the shared subscription socket
   const _startPolling = () => {
     _stopPolling()
-    _pollTimer = setInterval(async () => {
-      if (!showPidTree.value || !pidTreeService.value) return
-      try {
-        const resp = await authorizedFetch(`/api/process-tree?service=${encodeURIComponent(pidTreeService.value)}`)
-        if (!resp.ok) throw new Error(`HTTP ${resp.status}`)
-        pidTreeData.value = await resp.json()
-      } catch (e) {
-        // silent — don't clear existing data on poll failure
-      }
-    }, POLL_INTERVAL)
+    const service = pidTreeService.value
+    _unsubscribe = subscribe(authToken, `process-tree:${service}`, (data) => {
+      if (showPidTree.value && pidTreeService.value === service) pidTreeData.value = data
+    })
   }
 
   const _stopPolling = () => {
-    if (_pollTimer) {
-      clearInterval(_pollTimer)
-      _pollTimer = null
+    if (_unsubscribe) {
+      _unsubscribe()
+      _unsubscribe = null
     }
   }
 
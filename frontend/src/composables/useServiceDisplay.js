@@ -15,7 +15,9 @@ export const useServiceDisplay = ({ lang, statusFetchedAt }) => {
   const getServiceUptimeDisplay = (service) => {
     const base = service?.uptime_seconds
     if (base == null) return service?.uptime || '—'
-    const elapsed = Math.floor((Date.now() - statusFetchedAt.value) / 1000)
+    // Delta updates stamp each service with when its uptime was last sent
+    const fetchedAt = service?._uptime_at ?? statusFetchedAt.value
+    const elapsed = Math.floor((Date.now() - fetchedAt) / 1000)
     return formatDuration(base + Math.max(elapsed, 0))
   }
 
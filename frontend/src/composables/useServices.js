@@ -136,6 +136,8 @@ export function useServices({ authorizedFetch, showNotification, t, currentUser,
     if (reason === 'connection_error') return t('heartbeat_connection_error')
     if (reason === 'invalid_url') return t('heartbeat_invalid_url')
     if (reason === 'mock_fail') return t('heartbeat_mock_failed')
+    if (reason === 'pending') return t('heartbeat_pending')
+    if (reason === 'stale') return t('heartbeat_stale')
     if (typeof reason === 'string' && reason.startsWith('http_status_')) {
       const code = reason.replace('http_status_', '') || 'unknown'
       return t('heartbeat_http_error', { code })
@@ -167,6 +169,9 @@ export function useServices({ authorizedFetch, showNotification, t, currentUser,
   const getServiceHealthTextClass = (service) => getHealthTextClass(getHealthState(service))
   const getServiceBorderClass = (service) => getHealthBorderClass(getHealthState(service))
 
+  // Firing server-side alert rules, fed by the 'alerts' subscription
+  const metricAlerts = ref([])
+
   const statusAlerts = computed(() => {
     const items = []
     servicesStatus.value.forEach((service) => {
@@ -176,6 +181,16 @@ export function useServices({ authorizedFetch, showNotification, t, currentUser,
       }
     })
 
+    const ruleAlerts = metricAlerts.value
+      .filter(alert => isCardVisible('service:' + alert.service))
+      .map(alert => ({
+        key: `alert:${alert.service}/${alert.rule}`,
+        name: alert.service,
+        level: alert.severity === 'critical' ? 'critical' : 'warning',
+        title: t('alert_metrics'),
+        message: `${alert.service} · ${alert.rule} (${alert.metric} ${alert.value})`
+      }))
+
     return items
       .map((item) => {
         const isStopped = item.health === 'stopped'
@@ -186,6 +201,7 @@ export function useServices({ authorizedFetch, showNotification, t, currentUser,
           message: `${item.name} (${isStopped ? t('stopped') : t('abnormal')})`
         }
       })
+      .concat(ruleAlerts)
       .sort((a, b) => {
         if (a.level === b.level) return 0
         return a.level === 'critical' ? -1 : 1
@@ -401,6 +417,7 @@ export function useServices({ authorizedFetch, showNotification, t, currentUser,
     getServiceHealthTextClass,
     getServiceBorderClass,
     statusAlerts,
+    metricAlerts,
     statusAlertVisibility,
     focusedAlertKey,
     focusAlertTarget,
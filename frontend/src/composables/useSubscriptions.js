@@ -0,0 +1,103 @@
+import { useApi } from './useApi'
+
+// One WebSocket per tab, shared by every live view. Topics are
+// 'dashboard', 'alerts', 'metrics:<svc>', 'logs:<svc>' and 'process-tree:<svc>'.
+const { buildWsUrl } = useApi()
+
+let socket = null
+let socketToken = ''
+let reconnectTimer = null
+const handlers = new Map()          // topic -> Set(handler)
+const disconnectListeners = new Set()
+
+const send = (msg) => {
+  if (socket && socket.readyState === WebSocket.OPEN) socket.send(JSON.stringify(msg))
+}
+
+const closeSocket = () => {
+  if (reconnectTimer) {
+    clearTimeout(reconnectTimer)
+    reconnectTimer = null
+  }
+  if (socket) {
+    const s = socket
+    socket = null
+    s.onclose = null
+    s.close()
+  }
+}
+
+const connect = () => {
+  if (socket || !socketToken) return
+  socket = new WebSocket(buildWsUrl(`/api/ws?token=${encodeURIComponent(socketToken)}`))
+  socket.onopen = () => {
+    for (const topic of handlers.keys()) send({ action: 'subscribe', topic })
+  }
+  socket.onmessage = (event) => {
+    let msg
+    try {
+      msg = JSON.parse(event.data)
+    } catch (e) {
+      return
+    }
+    if (!msg.topic || !('data' in msg)) return
+    for (const handler of handlers.get(msg.topic) || []) {
+      try {
+        handler(msg.data)
+      } catch (e) {}
+    }
+  }
+  socket.onclose = () => {
+    socket = null
+    disconnectListeners.forEach(fn => fn())
+    if (handlers.size && socketToken) {
+      reconnectTimer = setTimeout(() => {
+        reconnectTimer = null
+        connect()
+      }, 2000)
+    }
+  }
+}
+
+export function useSubscriptions() {
+  // Returns an unsubscribe function.
+  const subscribe = (authToken, topic, handler) => {
+    const token = authToken?.value || ''
+    if (!token) return () => {}
+    if (token !== socketToken) {
+      closeSocket()
+      socketToken = token
+    }
+    let set = handlers.get(topic)
+    if (!set) {
+      set = new Set()
+      handlers.set(topic, set)
+      send({ action: 'subscribe', topic })
+    }
+    set.add(handler)
+    connect()
+    return () => {
+      const current = handlers.get(topic)
+      if (!current || !current.delete(handler) || current.size) return
+      handlers.delete(topic)
+      send({ action: 'unsubscribe', topic })
+      if (!handlers.size) {
+        closeSocket()
+        socketToken = ''
+      }
+    }
+  }
+
+  // Ask the server to restart a topic for this socket (e.g. a fresh dashboard keyframe).
+  const resubscribe = (topic) => {
+    send({ action: 'unsubscribe', topic })
+    send({ action: 'subscribe', topic })
+  }
+
+  const onDisconnect = (fn) => {
+    disconnectListeners.add(fn)
+    return () => disconnectListeners.delete(fn)
+  }
+
+  return { subscribe, resubscribe, onDisconnect }
+}
@@ -0,0 +1,19 @@
+from backend.alerts import build_rule
+
+
+def _feed(rule, samples, interval=10):
+    return [rule.evaluate(i * interval, value) for i, value in enumerate(samples)]
+
+
+def test_pending_resets_when_trigger_stops_holding():
+    rule = build_rule("svc", {"metric": "cpu_percent", "above": 95, "clear": 80, "for": 120})
+    # One sample above the bound, then two minutes inside the hysteresis band
+    events = _feed(rule, [96] + [85] * 13)
+    assert "firing" not in events
+    assert rule.state == "ok"
+
+
+def test_firing_holds_until_clear_level():
+    rule = build_rule("svc", {"metric": "cpu_percent", "above": 95, "clear": 80, "for": 20})
+    events = _feed(rule, [96, 97, 98, 85, 85, 79])
+    assert events == [None, None, "firing", None, None, "resolved"]
@@ -0,0 +1,46 @@
+from backend.metricsarchive import SEGMENT_SECONDS, MetricsArchive
+from backend.metricstore import METRIC_FIELDS, MetricsHistory
+
+
+def _fill(archive, service, epochs, compact_every=500):
+    for n, epoch in enumerate(epochs, 1):
+        archive.append(service, epoch, {field: float(epoch % 97) for field in METRIC_FIELDS})
+        if n % compact_every == 0:
+            archive.compact(archive.rotate(), now=epoch)
+    archive.compact(archive.rotate(), now=epochs[-1])
+    archive.append(service, epochs[-1] + 10, {field: 1.0 for field in METRIC_FIELDS})
+
+
+def test_limited_read_matches_tail_of_full_read(tmp_path):
+    archive = MetricsArchive(tmp_path, retention_days=30)
+    start = 10 * SEGMENT_SECONDS
+    _fill(archive, "svc", list(range(start, start + 3 * SEGMENT_SECONDS, 60)))
+    for lo, hi, limit in [(None, None, 7), (start + 3600, start + 2 * SEGMENT_SECONDS, 2000), (None, None, 10 ** 6)]:
+        epochs, columns = archive.read("svc", lo, hi)
+        limited, limited_columns = archive.read("svc", lo, hi, limit)
+        assert list(limited) == list(epochs[-limit:])
+        assert list(limited_columns["cpu_percent"]) == list(columns["cpu_percent"][-limit:])
+    archive.close()
+
+
+def test_saved_rollups_restore_without_old_raw_points(tmp_path):
+    archive = MetricsArchive(tmp_path, retention_days=30)
+    epochs = list(range(0, 3 * SEGMENT_SECONDS, 10))
+    values = {field: [float(e % 600) for e in epochs] for field in METRIC_FIELDS}
+    full = MetricsHistory(8640, 10)
+    full.extend(epochs, values)
+
+    split = 2 * SEGMENT_SECONDS
+    saved = MetricsHistory(8640, 10)
+    saved.extend(epochs[:split // 10], {f: v[:split // 10] for f, v in values.items()})
+    archive.save_rollups("svc", saved.raw.last_epoch(), saved.rollups_bytes())
+
+    rolled_up_to, image = archive.load_rollups("svc")
+    restored = MetricsHistory(8640, 10)
+    restored.load_rollups(image)
+    # Only the last day of raw points is replayed on top of the saved tiers
+    tail = split - SEGMENT_SECONDS // 2
+    restored.extend(epochs[tail // 10:], {f: v[tail // 10:] for f, v in values.items()}, rolled_up_to=rolled_up_to)
+    for ours, theirs in zip(restored.tiers, full.tiers):
+        assert len(ours) == len(theirs)
+        assert [ours.row(i) for i in range(len(ours))] == [theirs.row(i) for i in range(len(theirs))]
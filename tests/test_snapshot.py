@@ -0,0 +1,34 @@
+from backend.snapshot import content_fingerprint, settle_metrics
+
+
+def _metrics(cpu, memory_used, upload, timestamp):
+    return {
+        "cpu_percent": cpu, "cpu_count": 2, "cpu_percents": [cpu, cpu / 2],
+        "memory_percent": memory_used / 60, "memory_used": memory_used, "memory_total": 6000,
+        "disk_percent": 18.4, "disk_used": 17, "disk_total": 251, "disk_free": 79,
+        "net_upload_speed": upload, "net_download_speed": 0.0,
+        "run_disk_read_speed": 0.0, "run_disk_write_speed": 0.0,
+        "host_ip": "192.0.2.2", "timestamp": timestamp,
+    }
+
+
+def _etags(samples):
+    dump = {"status": "ok", "services": []}
+    settled, etags = None, []
+    for i, (cpu, memory_used, upload) in enumerate(samples):
+        settled = settle_metrics(settled, _metrics(cpu, memory_used, upload, f"t{i}"))
+        etags.append(content_fingerprint(dump, settled))
+    return etags
+
+
+def test_idle_jitter_keeps_dashboard_fingerprint():
+    # Hovering around 5 % cpu and a step boundary must not flap the ETag
+    samples = [(3.0, 380, 0.0), (6.1, 395, 0.04), (4.9, 371, 0.0), (7.5, 410, 0.09), (2.6, 388, 0.0)]
+    assert len(set(_etags(samples))) == 1
+
+
+def test_real_changes_move_dashboard_fingerprint():
+    base = (3.0, 380, 0.0)
+    for changed in [(9.0, 380, 0.0), (3.0, 500, 0.0), (3.0, 380, 1.5)]:
+        first, second = _etags([base, changed])
+        assert first != second